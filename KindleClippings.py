@@ -2,11 +2,27 @@ from __future__ import print_function
 import re
 import io
 import os
-import argparse
+import sys
+from collections import OrderedDict
+from pathlib import Path
+from typing import TYPE_CHECKING
 
-from loguru import logger
-from fpdf import FPDF
-import docx
+from src.clippings import Bookmark, Highlight, extract_positions
+from src.dedupe import collapse_near_duplicates
+from src.index import ClippingIndex
+from src.manifest import Manifest, digest_text
+from src.profiling import active as active_profiler, run_profiled_jobs
+from src.scanner import RecordScanner
+
+# fpdf and docx are imported by the functions that create pdf and docx files, so that
+# the default txt run does not load them
+if TYPE_CHECKING:
+    from src.pdf import StreamingPDF
+
+MANIFEST_FILE_NAME = ".manifest.json"
+INDEX_FILE_NAME = ".index"
+# remove_chars drops parentheses, so no book file can have this name
+COMBINED_PDF_NAME = "All Books (combined).pdf"
 
 
 def remove_chars(s, end_directory=""):
@@ -32,66 +48,32 @@ def remove_chars(s, end_directory=""):
     return s
 
 
-def insert_line_break_in_pdf(pdf_file: FPDF, num_breaks: int = 1) -> FPDF:
-    """
-    Inserts a line break in a pdf for num_breaks times
-    """
-    while num_breaks != 0:
-        pdf_file.multi_cell(0, 5, "", 0)
-        num_breaks -= 1
-
-    return pdf_file
-
-
-def insert_bar_separator_in_pdf(pdf_file: FPDF):
+def clipping_position(clip_meta):
     """
-    Inserts a bar separator in a pdf, useful to separate highlights
+    Returns the position of a clipping from its metadata line, None if it has none
     """
-    pdf_file = insert_line_break_in_pdf(pdf_file)
-    pdf_file.set_draw_color(191, 191, 191)
-    pdf_file.line(40, pdf_file.y, 150, pdf_file.y)
-    pdf_file = insert_line_break_in_pdf(pdf_file)
-
-    return pdf_file
+    meta_parts = clip_meta.split(" | ")
+    if len(meta_parts) < 2:
+        return None
+    try:
+        return extract_positions(meta_parts[-2])
+    except ValueError:
+        return None
 
 
 def prepare_pdf_document(
     highlights: str, include_clip_meta=False, title: str = "Your Notes And Highlights"
-) -> FPDF:
+) -> "StreamingPDF":
     """
-    Will create pdf document from the notes
+    Will create pdf document from the notes, in memory
 
     :param highlights:
     :return: FPDF
     """
-    pdf_file = FPDF()
-    pdf_file.add_page()
-    pdf_file.add_font("lisboa", '', 'media/Lisboa.ttf', uni=True)
-    pdf_file.set_font("lisboa", '', 22)
-    pdf_file.set_margins(25, 40, 25)
-    pdf_file = insert_line_break_in_pdf(pdf_file, 3)
-    pdf_file.multi_cell(0, 5, title, align="C")
-    pdf_file = insert_line_break_in_pdf(pdf_file, 2)
-
-    meta_regex_pattern = r"(Your.*\| Added on)"
-    for highlight_line in highlights:
-        # create muti-cell pdf object and add text to it
-        if re.search(meta_regex_pattern, highlight_line):
-            pdf_file.set_font("lisboa", '', 11)
-            pdf_file.set_text_color(77, 77, 77)
-            pdf_file.multi_cell(0, 5, highlight_line, 0)
-            pdf_file = insert_bar_separator_in_pdf(pdf_file)
-        elif len(highlight_line) < 10:
-            if not include_clip_meta and highlight_line == "...":
-                pdf_file = insert_bar_separator_in_pdf(pdf_file)
-            else:
-                continue
-        else:
-            pdf_file.set_font("lisboa", '', 15)
-            pdf_file.set_text_color(0, 0, 0)
-            pdf_file.multi_cell(0, 5, highlight_line, 0)
+    from src.pdf import StreamingPDF, add_book
 
-    return pdf_file
+    with active_profiler().stage("prepare_pdf"):
+        return add_book(StreamingPDF(), highlights, include_clip_meta, title)
 
 
 def convert_to_format(path, file_name, format, include_clip_meta=False):
@@ -108,12 +90,17 @@ def convert_to_format(path, file_name, format, include_clip_meta=False):
 
         paragraph = txt_file.read().split("\n")
         if format == "pdf":
-            pdf_file = prepare_pdf_document(
-                paragraph, include_clip_meta, file_name[:-4]
+            from src.pdf import write_pdf
+
+            write_pdf(
+                Path(path + output_file_name),
+                [(file_name[:-4], paragraph)],
+                include_clip_meta,
             )
-            pdf_file.output(path + output_file_name)
 
         elif format == "docx":
+            import docx
+
             docx_file = docx.Document()
             docx_file.add_heading(file_name[0:-4], 0)
 
@@ -125,31 +112,128 @@ def convert_to_format(path, file_name, format, include_clip_meta=False):
     return output_file_name
 
 
-def create_file_by_type(end_directory, format, include_clip_meta=False):
+def create_file_by_type(end_directory, format, include_clip_meta=False, jobs=1):
     """
     Will iterate over all text files and will convert and create file with specified format
     Currently Only pdf and docx are supported
+    Text files that did not change since their last conversion are skipped
 
     :param end_directory:
     :param format:
+    :param jobs: number of processes the files are converted in
     :return: list of output filenames
     """
     output_files = []
+    manifest_file = Path(end_directory + MANIFEST_FILE_NAME)
+    manifest = Manifest.load(manifest_file)
 
     # get files in and directory
     files = [f for f in os.listdir(end_directory) if os.path.isfile(end_directory + f)]
 
-    for file in files:
-        if file[-3:] == "txt":
-            output_files.append(
-                convert_to_format(end_directory, file, format, include_clip_meta)
-            )
+    profiler = active_profiler()
+    pending = []
+    skipped = 0
+    with profiler.stage("digest"):
+        for file in sorted(files):
+            if file[-3:] == "txt":
+                output_path = Path(end_directory + file[0:-4] + "." + format)
+                with open(end_directory + file, "r", encoding="utf8") as txt_file:
+                    digest = digest_text(
+                        txt_file.read(),
+                        format=format,
+                        include_clip_meta=include_clip_meta,
+                    )
+                if manifest.is_current(output_path, digest):
+                    output_files.append(output_path.name)
+                    skipped += 1
+                else:
+                    pending.append((file, output_path, digest))
+    profiler.count("manifest_hits", skipped)
+    profiler.count("manifest_misses", len(pending))
+
+    results = run_profiled_jobs(
+        convert_to_format,
+        [(end_directory, file, format, include_clip_meta) for file, _, _ in pending],
+        jobs,
+        [file[:-4] for file, _, _ in pending],
+    )
+
+    errors = []
+    for (file, output_path, digest), (output_file_name, error) in zip(pending, results):
+        if error is not None:
+            errors.append((file, error))
+        else:
+            output_files.append(output_file_name)
+            manifest.update(output_path, digest)
+    manifest.save(manifest_file)
+
+    print(
+        f"\nConverted {len(pending) - len(errors)} files to {format}, "
+        f"skipped {skipped} unchanged, "
+        f"{len(errors)} failed"
+    )
+    for file, error in errors:
+        print(f"Failed to convert {file}: {error!r}")
 
     return output_files
 
 
+def create_combined_pdf(end_directory, include_clip_meta=False):
+    """
+    Will write all text files into one pdf, every book starting on a new page with an
+    entry in the outline. The pdf is only written again if a text file changed
+
+    :param end_directory:
+    :return: name of the file created
+    """
+    manifest_file = Path(end_directory + MANIFEST_FILE_NAME)
+    manifest = Manifest.load(manifest_file)
+    output_path = Path(end_directory + COMBINED_PDF_NAME)
+    file_names = sorted(
+        f
+        for f in os.listdir(end_directory)
+        if f[-3:] == "txt" and os.path.isfile(end_directory + f)
+    )
+
+    digests = []
+    for file in file_names:
+        with open(end_directory + file, "r", encoding="utf8") as txt_file:
+            digests.append(file + "\0" + digest_text(txt_file.read()))
+    digest = digest_text(
+        "\n".join(digests), format="pdf", include_clip_meta=include_clip_meta
+    )
+    profiler = active_profiler()
+    if manifest.is_current(output_path, digest):
+        profiler.count("manifest_hits")
+        print(f"\nSkipped the unchanged {COMBINED_PDF_NAME}")
+        return output_path.name
+    profiler.count("manifest_misses")
+
+    from src.pdf import write_pdf
+
+    def books():
+        # the books are read one at a time while the pdf is written
+        for file in file_names:
+            with open(end_directory + file, "r", encoding="utf8") as txt_file:
+                yield file[:-4], txt_file.read().split("\n")
+
+    with profiler.stage("combined_pdf"):
+        write_pdf(output_path, books(), include_clip_meta)
+    manifest.update(output_path, digest)
+    manifest.save(manifest_file)
+    print(f"\nCombined {len(file_names)} books into {COMBINED_PDF_NAME}")
+    return output_path.name
+
+
 def parse_clippings(
-    source_file, end_directory, encoding="utf-8", format="txt", include_clip_meta=True
+    source_file,
+    end_directory,
+    encoding="utf-8",
+    format="txt",
+    include_clip_meta=True,
+    jobs=1,
+    collapse_duplicates=True,
+    combined_pdf=False,
 ):
     """
     Each clipping always consists of 5 lines:
@@ -162,6 +246,10 @@ def parse_clippings(
 
     :param end_directory: the output directory where all of organised highlights will go
     :type end_directory: str
+    :param jobs: number of processes the pdf or docx files are created in
+    :param collapse_duplicates: only keep the longest version of highlights that were
+        extended or adjusted
+    :param combined_pdf: also write all books into one pdf with an outline
     :return: organises kindle highlights by book .
     """
 
@@ -177,14 +265,47 @@ def parse_clippings(
     output_files = set()
     title = ""
 
-    # Open clippings textfile and read data in lines
-    with io.open(source_file, "r", encoding=encoding, errors="ignore") as f:
-        # Individual highlights within clippings are separated by ==========
-        for highlight in f.read().split("=========="):
+    # Group the clippings by output file first, so that every book file is touched once
+    clippings_by_file = OrderedDict()
+
+    # The index remembers where the clippings of every book are, so only the books with
+    # new clippings and the ones whose text file is missing have to be read
+    index_file = Path(end_directory + INDEX_FILE_NAME)
+    profiler = active_profiler()
+    with profiler.stage("index"):
+        index = ClippingIndex.load(index_file) or ClippingIndex()
+        offset = index.checkpoint.offset
+        first_new = index.update(source_file)
+    existing_files = set(os.listdir(end_directory))
+    file_names = [
+        remove_chars(index.title(book, encoding), end_directory) + ".txt"
+        for book in range(len(index.titles))
+    ]
+    needed_books = index.book_ids(first_new) | {
+        book for book, name in enumerate(file_names) if name not in existing_files
+    }
+    # the files are written from all clippings of their books, also of the books
+    # whose titles give the same file name
+    needed_files = {file_names[book] for book in needed_books}
+    needed_books |= {
+        book for book, name in enumerate(file_names) if name in needed_files
+    }
+
+    # Individual highlights within clippings are separated by ==========; the scanner
+    # finds them on the raw bytes and only the ones with a body get decoded
+    records = 0
+    with (
+        profiler.stage("parse"),
+        RecordScanner(source_file, encoding, errors="ignore") as scanner,
+    ):
+        for record in index.find(books=needed_books):
+            records += 1
+            if record.kind is Bookmark:
+                continue
             # For each highlight, we split it into the lines
-            lines = highlight.split("\n")[1:]
+            lines = scanner.text(record).split("\n")
             # Don't try to write if we have no body
-            if len(lines) < 3 or lines[3] == "":
+            if len(lines) < 4 or lines[3] == "":
                 continue
             # Set title and trim the hex character
             title = lines[0]
@@ -193,67 +314,116 @@ def parse_clippings(
 
             # Remove characters and create path
             outfile_name = remove_chars(title, end_directory) + ".txt"
-            path = end_directory + "/" + outfile_name
-
-            # If we haven't seen title yet, set mode to write. Else, set to append.
-            if outfile_name not in (list(output_files) + os.listdir(end_directory)):
-                mode = "w"
-                output_files.add(outfile_name)
-                current_text = ""
-            else:
-                # If the title exists, read it as text so that we won't append duplicates
-                mode = "a"
-                with io.open(path, "r", encoding=encoding, errors="ignore") as textfile:
-                    current_text = textfile.read()
 
             clipping_text = lines[3]
             clip_meta = lines[1]
+            clippings_by_file.setdefault(outfile_name, []).append(
+                (clipping_text, clip_meta, record.kind)
+            )
+
+    profiler.count("records_parsed", records)
+    profiler.count("bytes_read", index.checkpoint.offset - (offset if first_new else 0))
+
+    for outfile_name, clippings in clippings_by_file.items():
+        path = end_directory + "/" + outfile_name
+        if collapse_duplicates:
+            # only highlights are extended or adjusted, a note that quotes its
+            # highlight is no shorter version of it
+            highlights = [
+                (i, clipping)
+                for i, clipping in enumerate(clippings)
+                if clipping[2] is Highlight
+            ]
+            kept = {
+                i
+                for i, _ in collapse_near_duplicates(
+                    highlights,
+                    text=lambda item: item[1][0],
+                    position=lambda item: clipping_position(item[1][1]),
+                )
+            }
+            clippings = [
+                clipping
+                for i, clipping in enumerate(clippings)
+                if clipping[2] is not Highlight or i in kept
+            ]
+
+        if outfile_name not in existing_files:
+            output_files.add(outfile_name)
+
+        # The file is written again from all clippings of its book, so a highlight
+        # that was extended since the last run replaces its shorter version
+        seen_texts = set()
+        new_text = []
+        for clipping_text, clip_meta, _ in clippings:
+            # Write out the the clippings text if it's not already there
+            if clipping_text in seen_texts:
+                continue
+            seen_texts.add(clipping_text)
+            new_text.append(clipping_text + "\n")
+            if include_clip_meta:
+                new_text.append(clip_meta + "\n")
+            new_text.append("\n...\n\n")
 
-            with io.open(path, mode, encoding=encoding, errors="ignore") as outfile:
-                # Write out the the clippings text if it's not already there
-                if clipping_text not in current_text:
-                    outfile.write(clipping_text + "\n")
-                    if include_clip_meta:
-                        outfile.write(clip_meta + "\n")
-                    outfile.write("\n...\n\n")
+        with io.open(path, "w", encoding=encoding, errors="ignore") as outfile:
+            outfile.write("".join(new_text))
+
+    index.save(index_file)
 
     # create additional file based on format
     if format in ["pdf", "docx"]:
         formatted_out_files = create_file_by_type(
-            end_directory, format, include_clip_meta
+            end_directory, format, include_clip_meta, jobs
         )
         output_files.update(formatted_out_files)
-    else:
+        if format == "pdf" and combined_pdf:
+            output_files.add(create_combined_pdf(end_directory, include_clip_meta))
+    elif format != "txt":
         print("Invalid format mentioned. Only txt file will be created")
-        args.format = "txt"
 
     print("\nExported titles:\n")
     for i in output_files:
         print(i)
 
 
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser(
-        description="Extract kindle clippings into a folder with nice text files"
-    )
-    parser.add_argument("-source", type=str, default="/Volumes/Kindle/documents/")
-    parser.add_argument("-destination", type=str, default="./")
-    parser.add_argument("-encoding", type=str, default="utf8")
-    parser.add_argument("-format", type=str, default="txt")
-    parser.add_argument("-include_clip_meta", action="store_true")
-    args = parser.parse_args()
-    logger.debug(args)
-
-    if args.source[-4:] == ".txt":
-        source_file = args.source
+def main(
+    source,
+    destination,
+    encoding="utf-8",
+    format="txt",
+    include_clip_meta=False,
+    jobs=1,
+    collapse_duplicates=True,
+    combined_pdf=False,
+):
+    """
+    Exports the clippings file in source, or the My Clippings.txt in the directory
+    source, into the KindleClippings directory in destination
+    """
+    if source[-4:] == ".txt":
+        source_file = source
     else:
-        source_file = args.source + "/My Clippings.txt"
+        source_file = source + "/My Clippings.txt"
 
-    if args.destination[-1] == "/":
-        destination = args.destination + "KindleClippings/"
+    if destination[-1] == "/":
+        destination = destination + "KindleClippings/"
     else:
-        destination = args.destination + "/KindleClippings/"
+        destination = destination + "/KindleClippings/"
 
     parse_clippings(
-        source_file, destination, args.encoding, args.format, args.include_clip_meta
+        source_file,
+        destination,
+        encoding,
+        format,
+        include_clip_meta,
+        jobs,
+        collapse_duplicates,
+        combined_pdf,
     )
+
+
+if __name__ == "__main__":
+    # the options are defined once, by the export command of src.cli
+    from src.cli import main as cli_main
+
+    cli_main(["export", *sys.argv[1:]])
@@ -0,0 +1,85 @@
+"""
+Benchmarks of the parsing and rendering pipeline on synthetic clippings files.
+
+    pytest benchmarks
+    BENCHMARK_SIZES=1000,100000,1000000 pytest benchmarks --benchmark-autosave
+    pytest benchmarks --benchmark-compare --benchmark-compare-fail=mean:10%
+
+BENCHMARK_SIZES is the comma separated list of clippings counts to run at.
+The comparison options need pytest-benchmark (pip install pytest-benchmark); without
+it every benchmark prints the time of each round.
+"""
+
+import os
+import time
+
+import pytest
+
+from benchmarks.generate import write_clippings_file
+from src.reader import iter_file_records
+
+SIZES = [int(size) for size in os.environ.get("BENCHMARK_SIZES", "1000").split(",")]
+CLIPPINGS_PER_BOOK = 100
+# the number of words of text_clippings_file, used with the frequencies of real texts
+VOCABULARY = 50000
+
+try:
+    import pytest_benchmark  # noqa: F401
+except ImportError:
+
+    class SimpleBenchmark:
+        """
+        Stands in for the benchmark fixture of pytest-benchmark.
+        """
+
+        def __init__(self, name: str):
+            self.name = name
+
+        def __call__(self, function, *args, **kwargs):
+            return self.pedantic(function, args, kwargs)
+
+        def pedantic(self, function, args=(), kwargs=None, setup=None, rounds=1, **_):
+            for _ in range(rounds):
+                if setup is not None:
+                    setup()
+                start = time.perf_counter()
+                result = function(*args, **(kwargs or {}))
+                print(f"\n{self.name}: {time.perf_counter() - start:.4f}s")
+            return result
+
+    @pytest.fixture
+    def benchmark(request):
+        return SimpleBenchmark(request.node.name)
+
+
+@pytest.fixture(scope="session", params=SIZES, ids=lambda size: f"{size}")
+def clippings_file(request, tmp_path_factory):
+    size = request.param
+    path = tmp_path_factory.mktemp(f"clippings_{size}") / "My Clippings.txt"
+    write_clippings_file(
+        path,
+        books=max(1, size // CLIPPINGS_PER_BOOK),
+        clippings_per_book=min(size, CLIPPINGS_PER_BOOK),
+    )
+    return path
+
+
+@pytest.fixture(scope="session", params=SIZES, ids=lambda size: f"{size}")
+def text_clippings_file(request, tmp_path_factory):
+    """
+    Like clippings_file, but with a realistic vocabulary for the full text search.
+    """
+    size = request.param
+    path = tmp_path_factory.mktemp(f"text_clippings_{size}") / "My Clippings.txt"
+    write_clippings_file(
+        path,
+        books=max(1, size // CLIPPINGS_PER_BOOK),
+        clippings_per_book=min(size, CLIPPINGS_PER_BOOK),
+        vocabulary=VOCABULARY,
+    )
+    return path
+
+
+@pytest.fixture(scope="session")
+def records(clippings_file):
+    return list(iter_file_records(clippings_file))
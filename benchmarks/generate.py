@@ -0,0 +1,204 @@
+"""
+Generates synthetic My Clippings.txt files for benchmarks.
+
+    python -m benchmarks.generate -books 100 -clippings_per_book 1000 -language en
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+
+from datetime import datetime, timedelta
+from typing import Iterator
+
+from src.clippings import MONTHS, WEEKDAYS
+
+SEPARATOR = "=========="
+SYLLABLES = "ba de fi go ku la me ni no pu ra se ti vo wa zu".split()
+
+WORDS = {
+    "de": (
+        "der die das und ist nicht ein eine zu wenn man sich auf mit dem den "
+        "immer wieder Zeit Leben Menschen Welt Macht Liebe Geschichte denken"
+    ).split(),
+    "en": (
+        "the a and is not to if one it on with of in always again time life "
+        "people world power love history think secret mind thoughts"
+    ).split(),
+}
+
+META = {
+    "de": {
+        "highlight": "- Deine Markierung {page}bei Position {start}-{end} | Hinzugefügt am {date}",
+        "note": "- Deine Notiz {page}bei Position {end} | Hinzugefügt am {date}",
+        "bookmark": "- Dein Lesezeichen {page}bei Position {start} | Hinzugefügt am {date}",
+        "page": "auf Seite {page} | ",
+        "no_page": "",
+    },
+    "en": {
+        "highlight": "- Your Highlight {page}location {start}-{end} | Added on {date}",
+        "note": "- Your Note {page}location {end} | Added on {date}",
+        "bookmark": "- Your Bookmark {page}location {start} | Added on {date}",
+        "page": "on page {page} | ",
+        "no_page": "at ",
+    },
+}
+
+
+def zipf_vocabulary(words: list[str], size: int) -> tuple[list[str], list[float]]:
+    """
+    Returns size words with cumulative weights that follow Zipf's law like the words
+    of real texts: the words come first, then made up words from SYLLABLES.
+    """
+    vocabulary = list(words)
+    number = 0
+    while len(vocabulary) < size:
+        number += 1
+        syllables, rest = [], number
+        while rest:
+            rest, syllable = divmod(rest, len(SYLLABLES))
+            syllables.append(SYLLABLES[syllable])
+        vocabulary.append("".join(syllables))
+    vocabulary = vocabulary[:size]
+
+    cum_weights, total = [], 0.0
+    for rank in range(1, size + 1):
+        total += 1 / rank
+        cum_weights.append(total)
+    return vocabulary, cum_weights
+
+
+def format_date(value: datetime, language: str) -> str:
+    weekday = WEEKDAYS[language][value.weekday()]
+    month = MONTHS[language][value.month - 1]
+    if language == "de":
+        return f"{weekday}, {value.day}. {month} {value.year} {value:%H:%M:%S}"
+    return f"{weekday}, {value.day} {month} {value.year} {value:%H:%M:%S}"
+
+
+def generate_clippings(
+    books: int = 10,
+    clippings_per_book: int = 100,
+    highlights: float = 0.7,
+    notes: float = 0.2,
+    bookmarks: float = 0.1,
+    language: str = "de",
+    bom: bool = True,
+    multiline: float = 0.1,
+    seed: int = 0,
+    vocabulary: int = 0,
+) -> Iterator[str]:
+    """
+    Yields the records of a synthetic clippings file, each ending with the separator.
+
+    The clippings of the books are interleaved in the order they were created, like on
+    a Kindle. highlights, notes and bookmarks are the weights of the clipping types;
+    every note is placed at the end of the highlight before it, so that it can be
+    matched. multiline is the share of clippings whose text spans several lines.
+    With a vocabulary size, the texts use that many words with the frequencies of
+    real texts instead of the few WORDS.
+    """
+    rng = random.Random(seed)
+    words = WORDS[language]
+    meta = META[language]
+    titles = [
+        f"{' '.join(rng.choices(words, k=3)).title()} {book} (Author {book % 97})"
+        for book in range(books)
+    ]
+    text_words, cum_weights = words, None
+    if vocabulary:
+        text_words, cum_weights = zipf_vocabulary(words, vocabulary)
+
+    def choose_words(count: int) -> str:
+        return " ".join(rng.choices(text_words, cum_weights=cum_weights, k=count))
+
+    positions = [0] * books
+    remaining = [clippings_per_book] * books
+    open_books = list(range(books))
+    created_at = datetime(2016, 3, 26, 14, 59, 39)
+
+    while open_books:
+        slot = rng.randrange(len(open_books))
+        book = open_books[slot]
+        remaining[book] -= 1
+        if remaining[book] == 0:
+            open_books[slot] = open_books[-1]
+            open_books.pop()
+
+        kind = rng.choices(
+            ["highlight", "note", "bookmark"], [highlights, notes, bookmarks]
+        )[0]
+        if kind != "note" or positions[book] == 0:
+            positions[book] += rng.randint(5, 200)
+        start = positions[book]
+        end = start + rng.randint(0, 8)
+        if kind == "highlight":
+            positions[book] = end
+        created_at += timedelta(seconds=rng.randint(1, 3600))
+        if rng.random() < 0.5:
+            page = meta["page"].format(page=start // 15 + 1)
+        else:
+            page = meta["no_page"]
+        meta_line = meta[kind].format(
+            page=page,
+            start=start,
+            end=positions[book] if kind == "note" else end,
+            date=format_date(created_at, language),
+        )
+
+        if kind == "bookmark":
+            text = ""
+        else:
+            text = choose_words(rng.randint(5, 40))
+            if rng.random() < multiline:
+                text += "\n" + choose_words(rng.randint(5, 20))
+            if kind == "highlight":
+                text = text[0].upper() + text[1:] + "."
+
+        title = ("\ufeff" if bom else "") + titles[book]
+        yield f"{title}\n{meta_line}\n\n{text}\n{SEPARATOR}\n"
+
+
+def write_clippings_file(path, **kwargs) -> int:
+    """
+    Writes a synthetic clippings file, see generate_clippings for the arguments.
+    Returns the number of clippings written.
+    """
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for record in generate_clippings(**kwargs):
+            f.write(record)
+            count += 1
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic clippings file")
+    parser.add_argument("-output", type=str, default="My Clippings.txt")
+    parser.add_argument("-books", type=int, default=10)
+    parser.add_argument("-clippings_per_book", type=int, default=100)
+    parser.add_argument("-highlights", type=float, default=0.7)
+    parser.add_argument("-notes", type=float, default=0.2)
+    parser.add_argument("-bookmarks", type=float, default=0.1)
+    parser.add_argument("-language", type=str, default="de", choices=sorted(META))
+    parser.add_argument("-no_bom", action="store_true")
+    parser.add_argument("-multiline", type=float, default=0.1)
+    parser.add_argument("-seed", type=int, default=0)
+    parser.add_argument("-vocabulary", type=int, default=0)
+    args = parser.parse_args()
+
+    count = write_clippings_file(
+        args.output,
+        books=args.books,
+        clippings_per_book=args.clippings_per_book,
+        highlights=args.highlights,
+        notes=args.notes,
+        bookmarks=args.bookmarks,
+        language=args.language,
+        bom=not args.no_bom,
+        multiline=args.multiline,
+        seed=args.seed,
+        vocabulary=args.vocabulary,
+    )
+    print(f"Wrote {count} clippings to {args.output}")
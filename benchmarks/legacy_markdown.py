@@ -0,0 +1,105 @@
+"""
+The markdown renderer of parse_clippings.py before it wrote the files itself, built
+on mdutils. It is kept to compare the output and the speed of the two.
+"""
+
+from pathlib import Path
+
+import mdutils  # type: ignore
+from loguru import logger
+
+import parse_clippings
+from src.clippings import Clipping, Highlight, Note, format_datetime
+from src.dedupe import collapse_near_duplicates
+
+
+def add_properties_mdutils(md_file: mdutils.MdUtils, author: str) -> mdutils.MdUtils:
+    md_file.new_line("---")
+    md_file.new_line("tags:")
+    md_file.new_line("  - book")
+    md_file.new_line("status: read")
+    md_file.new_line(f"author: {author}")
+    md_file.new_line("---\n")
+
+
+def save_book_with_mdutils(
+    clippings: list[Clipping], collapse_duplicates: bool = True
+) -> Path | None:
+    """
+    The renderer parse_clippings.save_book_clippings_to_file replaced.
+    """
+    book_title = clippings[0].book_title
+    author = clippings[0].author
+
+    #  make sure that all clippings have the same book title and author
+    for clipping in clippings:
+        assert clipping.book_title == book_title
+        if not clipping.author == author:
+            print(
+                f"Clipping author {clipping.author} does not match the book title {book_title} author {author}"
+            )
+    # Replace forward slashes and colons in the author to avoid file path issues
+    safe_author = author.replace("/", "-").replace(":", " -")
+    file_path = parse_clippings.book_file_path(book_title)
+    if file_path.exists():
+        file_path.unlink()
+    # create a new file
+    md_file = mdutils.MdUtils(file_name=str(file_path))
+    logger.debug(f'\n"{md_file.get_md_text()}"')
+    # add the clippings to the file
+
+    add_properties_mdutils(md_file=md_file, author=safe_author)
+
+    notes = [clipping for clipping in clippings if isinstance(clipping, Note)]
+
+    highlights = [clipping for clipping in clippings if isinstance(clipping, Highlight)]
+    if collapse_duplicates:
+        highlights = collapse_near_duplicates(highlights)
+
+    matched_notes_and_highlights, unmatched_notes, unmatched_highlights = (
+        parse_clippings.match_notes_and_hightlights(notes, highlights)
+    )
+    if len(unmatched_notes) > 0:
+        logger.warning(
+            f"did not match {len(unmatched_notes)} with highlights in {book_title} by {author}"
+        )
+    if len(matched_notes_and_highlights) == 0:
+        return None
+
+    sorted_highlights_with_matched_notes = sorted(
+        matched_notes_and_highlights
+        + [(None, highlight) for highlight in unmatched_highlights],
+        key=lambda x: x[1].position[0],
+    )
+
+    for note, highlight in sorted_highlights_with_matched_notes:
+        if highlight.page:
+            md_file.new_line(f"S {highlight.page}")
+        else:
+            md_file.new_line(f"P {highlight.position[0]}")
+
+        md_file.new_line(format_datetime(highlight.created_at))
+        md_file.new_paragraph(f"{highlight.text}", bold_italics_code="i")
+        if note:
+            md_file.new_line(f"\n{note.text}")
+        md_file.new_line("\n---\n")
+
+    if unmatched_notes:
+        md_file.new_line(f"## Unmatched Notes ({len(unmatched_notes)})\n")
+        # add the unmatched notes to the file
+        for note in unmatched_notes:
+            if note.page:
+                md_file.new_line(f"S {note.page}")
+            else:
+                md_file.new_line(f"P {note.position}")
+            md_file.new_line(format_datetime(note.created_at))
+            md_file.new_line(note.text)
+            md_file.new_line("\n---\n")
+
+    # save the file
+    file = md_file.create_md_file()
+    data = md_file.get_md_text()
+    # delete the first 3 lines
+    data = "\n".join(data.split("\n")[4:])
+    file.rewrite_all_file(data=data)
+    return file_path
@@ -0,0 +1,56 @@
+"""
+The pdf renderer of KindleClippings.py before src.pdf, which builds every document in
+memory with a plain FPDF and embeds the font anew each time. It is kept to compare the
+speed and the memory use of the two.
+"""
+
+from fpdf import FPDF
+
+from src.pdf import FONT_FILE, META_PATTERN
+
+
+def insert_line_break_in_pdf(pdf_file: FPDF, num_breaks: int = 1) -> FPDF:
+    while num_breaks != 0:
+        pdf_file.multi_cell(0, 5, "", 0)
+        num_breaks -= 1
+    return pdf_file
+
+
+def insert_bar_separator_in_pdf(pdf_file: FPDF):
+    pdf_file = insert_line_break_in_pdf(pdf_file)
+    pdf_file.set_draw_color(191, 191, 191)
+    pdf_file.line(40, pdf_file.y, 150, pdf_file.y)
+    pdf_file = insert_line_break_in_pdf(pdf_file)
+    return pdf_file
+
+
+def prepare_pdf_document_fpdf(
+    highlights, include_clip_meta=False, title: str = "Your Notes And Highlights"
+) -> FPDF:
+    pdf_file = FPDF()
+    pdf_file.add_page()
+    # the old renderer loaded 'media/Lisboa.ttf' relative to the working directory
+    pdf_file.add_font("lisboa", "", str(FONT_FILE), uni=True)
+    pdf_file.set_font("lisboa", "", 22)
+    pdf_file.set_margins(25, 40, 25)
+    pdf_file = insert_line_break_in_pdf(pdf_file, 3)
+    pdf_file.multi_cell(0, 5, title, align="C")
+    pdf_file = insert_line_break_in_pdf(pdf_file, 2)
+
+    for highlight_line in highlights:
+        if META_PATTERN.search(highlight_line):
+            pdf_file.set_font("lisboa", "", 11)
+            pdf_file.set_text_color(77, 77, 77)
+            pdf_file.multi_cell(0, 5, highlight_line, 0)
+            pdf_file = insert_bar_separator_in_pdf(pdf_file)
+        elif len(highlight_line) < 10:
+            if not include_clip_meta and highlight_line == "...":
+                pdf_file = insert_bar_separator_in_pdf(pdf_file)
+            else:
+                continue
+        else:
+            pdf_file.set_font("lisboa", "", 15)
+            pdf_file.set_text_color(0, 0, 0)
+            pdf_file.multi_cell(0, 5, highlight_line, 0)
+
+    return pdf_file
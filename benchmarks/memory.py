@@ -0,0 +1,41 @@
+"""
+Reports how much memory the parsed clippings take.
+
+    python -m benchmarks.memory [number of clippings]
+"""
+
+import sys
+import tracemalloc
+
+from src.clippings import parse_clipping
+
+example_clipping = """Die 24 Gesetze der Verführung (Robert Greene)
+- Deine Markierung auf Seite 139 | bei Position 2120-2128 | Hinzugefügt am Donnerstag, 10. Oktober 2024 08:40:08
+
+Interessant, vielleicht immer mal wieder oasch sein
+"""
+
+
+def measure(count: int) -> int:
+    """
+    Returns the number of bytes allocated for count parsed clippings.
+    """
+    texts = [
+        example_clipping.replace("2120-2128", f"{i}-{i + 8}") for i in range(count)
+    ]
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    clippings = [parse_clipping(text) for text in texts]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    assert len(clippings) == count
+    return after - before
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    size = measure(count)
+    print(
+        f"{count} clippings: {size / 1024 / 1024:.1f} MiB, "
+        f"{size / count:.0f} bytes each"
+    )
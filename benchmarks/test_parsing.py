@@ -0,0 +1,91 @@
+import pytest
+
+from src.clippings import Highlight, Note, group_clippings_by_book, parse_clipping
+from src.dedupe import collapse_near_duplicates
+from src.matching import match_notes_and_highlights
+from src.reader import iter_file_records
+from src.scanner import RecordScanner
+
+
+def test_iter_file_records(benchmark, clippings_file):
+    benchmark(lambda: sum(1 for _ in iter_file_records(clippings_file)))
+
+
+def test_parse_clipping(benchmark, records):
+    clippings = benchmark(lambda: [parse_clipping(record) for record in records])
+    assert len(clippings) == len(records)
+
+
+def test_group_clippings_by_book(benchmark, records):
+    clippings = [parse_clipping(record) for record in records]
+    benchmark(group_clippings_by_book, clippings)
+
+
+def test_match_notes_and_highlights(benchmark, records):
+    clippings_by_book = group_clippings_by_book(
+        parse_clipping(record) for record in records
+    )
+    books = [
+        (
+            [clipping for clipping in clippings if isinstance(clipping, Note)],
+            [clipping for clipping in clippings if isinstance(clipping, Highlight)],
+        )
+        for clippings in clippings_by_book.values()
+    ]
+
+    def match_all():
+        for notes, highlights in books:
+            match_notes_and_highlights(notes, highlights)
+
+    benchmark(match_all)
+
+
+def test_kindle_clippings_parse_clippings(benchmark, clippings_file, tmp_path):
+    for module in ["loguru", "fpdf", "docx"]:
+        pytest.importorskip(module)
+    import KindleClippings
+
+    end_directory = str(tmp_path / "KindleClippings") + "/"
+
+    def clear_output():
+        # the txt files are only appended to, so every round starts from scratch
+        tmp_path.joinpath("KindleClippings").mkdir(exist_ok=True)
+        for path in tmp_path.joinpath("KindleClippings").iterdir():
+            path.unlink()
+
+    benchmark.pedantic(
+        KindleClippings.parse_clippings,
+        args=(str(clippings_file), end_directory),
+        setup=clear_output,
+        rounds=3,
+    )
+
+
+def test_collapse_near_duplicates(benchmark, records):
+    clippings_by_book = group_clippings_by_book(
+        parse_clipping(record) for record in records
+    )
+    books = [
+        [clipping for clipping in clippings if isinstance(clipping, Highlight)]
+        for clippings in clippings_by_book.values()
+    ]
+
+    def collapse_all():
+        for highlights in books:
+            collapse_near_duplicates(highlights)
+
+    benchmark(collapse_all)
+
+
+def test_scan_records(benchmark, clippings_file):
+    with RecordScanner(clippings_file) as scanner:
+        benchmark(lambda: sum(1 for _ in scanner.records()))
+
+
+def test_scan_and_parse_highlights(benchmark, clippings_file):
+    with RecordScanner(clippings_file) as scanner:
+        benchmark(
+            lambda: [
+                scanner.parse(record) for record in scanner.records(kinds=[Highlight])
+            ]
+        )
@@ -0,0 +1,157 @@
+import os
+import shutil
+
+import pytest
+
+from benchmarks.generate import generate_clippings
+from src.clippings import group_clippings_by_book, parse_clipping
+from src.manifest import Manifest
+
+LIBRARY_BOOKS = int(os.environ.get("BENCHMARK_LIBRARY_BOOKS", "5000"))
+PDF_LIBRARY_BOOKS = int(os.environ.get("BENCHMARK_PDF_LIBRARY_BOOKS", "50"))
+
+
+@pytest.fixture(scope="module", params=["pdf", "docx"])
+def txt_directory(request, clippings_file, tmp_path_factory):
+    for module in ["loguru", "fpdf", "docx"]:
+        pytest.importorskip(module)
+    import KindleClippings
+
+    end_directory = tmp_path_factory.mktemp("KindleClippings")
+    KindleClippings.parse_clippings(str(clippings_file), str(end_directory) + "/")
+    return request.param, end_directory
+
+
+def test_convert_to_format(benchmark, txt_directory):
+    format, end_directory = txt_directory
+    import KindleClippings
+
+    def remove_manifest():
+        end_directory.joinpath(KindleClippings.MANIFEST_FILE_NAME).unlink(
+            missing_ok=True
+        )
+
+    benchmark.pedantic(
+        KindleClippings.create_file_by_type,
+        args=(str(end_directory) + "/", format),
+        setup=remove_manifest,
+        rounds=3,
+    )
+
+
+def test_save_books(benchmark, records, tmp_path, monkeypatch):
+    for module in ["loguru", "mdutils"]:
+        pytest.importorskip(module)
+    monkeypatch.chdir(tmp_path)
+    import parse_clippings
+
+    monkeypatch.setattr(parse_clippings, "OUTOUT_DIR", tmp_path / "output")
+    clippings_by_book = group_clippings_by_book(
+        parse_clipping(record) for record in records
+    )
+
+    def clear_output():
+        shutil.rmtree(tmp_path / "output", ignore_errors=True)
+        (tmp_path / "output").mkdir()
+
+    benchmark.pedantic(
+        parse_clippings.save_books,
+        args=(clippings_by_book, Manifest()),
+        setup=clear_output,
+        rounds=3,
+    )
+
+
+@pytest.fixture(scope="module")
+def library():
+    """
+    The clippings of a library of LIBRARY_BOOKS books, by book.
+    """
+    return list(
+        group_clippings_by_book(
+            parse_clipping(record)
+            for record in generate_clippings(books=LIBRARY_BOOKS, clippings_per_book=20)
+        ).values()
+    )
+
+
+@pytest.mark.parametrize("renderer", ["single_write", "mdutils"])
+def test_save_library(benchmark, library, tmp_path, monkeypatch, renderer):
+    for module in ["loguru", "mdutils"]:
+        pytest.importorskip(module)
+    monkeypatch.chdir(tmp_path)
+    import parse_clippings
+    from benchmarks.legacy_markdown import save_book_with_mdutils
+
+    monkeypatch.setattr(parse_clippings, "OUTOUT_DIR", tmp_path / "output")
+    if renderer == "mdutils":
+        save_book = save_book_with_mdutils
+    else:
+        save_book = parse_clippings.save_book_clippings_to_file
+
+    def clear_output():
+        shutil.rmtree(tmp_path / "output", ignore_errors=True)
+        (tmp_path / "output").mkdir()
+
+    def save_library():
+        for book_clippings in library:
+            save_book(book_clippings)
+
+    benchmark.pedantic(save_library, setup=clear_output, rounds=3)
+
+
+def pdf_books(books: int) -> list[tuple[str, list[str]]]:
+    """
+    The (title, lines) of the text files of a library of books, as they are rendered.
+    """
+    library = group_clippings_by_book(
+        parse_clipping(record)
+        for record in generate_clippings(books=books, clippings_per_book=50)
+    )
+    return [
+        (
+            f"{title} - {author}",
+            [
+                line
+                for clipping in clippings
+                if clipping.text
+                for line in [clipping.text, "..."]
+            ],
+        )
+        for (title, author), clippings in library.items()
+    ]
+
+
+@pytest.fixture(scope="module")
+def pdf_library():
+    return pdf_books(PDF_LIBRARY_BOOKS)
+
+
+@pytest.mark.parametrize("renderer", ["streaming", "fpdf"])
+def test_render_pdf_library(benchmark, pdf_library, tmp_path, monkeypatch, renderer):
+    pytest.importorskip("fpdf")
+    from src.pdf import write_pdf
+
+    if renderer == "fpdf":
+        from benchmarks.legacy_pdf import prepare_pdf_document_fpdf
+
+        # keep the font metrics fpdf caches out of the repository
+        monkeypatch.setattr("fpdf.fpdf.FPDF_CACHE_MODE", 2)
+        monkeypatch.setattr("fpdf.fpdf.FPDF_CACHE_DIR", str(tmp_path))
+
+    def render_library():
+        for number, (title, lines) in enumerate(pdf_library):
+            path = tmp_path / f"{number}.pdf"
+            if renderer == "fpdf":
+                prepare_pdf_document_fpdf(lines, False, title).output(str(path))
+            else:
+                write_pdf(path, [(title, lines)])
+
+    benchmark.pedantic(render_library, rounds=3)
+
+
+def test_render_combined_pdf(benchmark, pdf_library, tmp_path):
+    pytest.importorskip("fpdf")
+    from src.pdf import write_pdf
+
+    benchmark.pedantic(write_pdf, args=(tmp_path / "all.pdf", pdf_library), rounds=3)
@@ -0,0 +1,30 @@
+import os
+
+import pytest
+
+from src.clippings import parse_clipping
+from src.reader import iter_file_records
+from src.sharding import parse_file_parallel
+
+JOBS = sorted({1, 2, 4, os.cpu_count() or 1})
+
+
+def test_parse_file_serial(benchmark, clippings_file):
+    clippings = benchmark(
+        lambda: [parse_clipping(record) for record in iter_file_records(clippings_file)]
+    )
+    assert clippings
+
+
+@pytest.mark.parametrize("jobs", JOBS)
+def test_parse_file_parallel(benchmark, clippings_file, records, jobs):
+    """
+    The speedup over test_parse_file_serial grows with the number of cores up to
+    jobs; on a single core the pool only adds the cost of starting the processes.
+    """
+    clippings = benchmark.pedantic(
+        parse_file_parallel, args=(clippings_file, jobs), rounds=3
+    )
+    assert [repr(clipping) for clipping in clippings] == [
+        repr(parse_clipping(record)) for record in records
+    ]
@@ -0,0 +1,59 @@
+from datetime import datetime
+
+import pytest
+
+from src.clippings import Highlight
+from src.store import ClippingStore
+
+
+@pytest.fixture(scope="module")
+def store(clippings_file, tmp_path_factory):
+    store = ClippingStore(tmp_path_factory.mktemp("store") / "clippings.db")
+    store.ingest_file(clippings_file)
+    yield store
+    store.close()
+
+
+def test_ingest_file(benchmark, clippings_file, tmp_path):
+    def ingest():
+        with ClippingStore(tmp_path / "clippings.db") as store:
+            store.ingest_file(clippings_file)
+
+    def remove_store():
+        (tmp_path / "clippings.db").unlink(missing_ok=True)
+
+    benchmark.pedantic(ingest, setup=remove_store, rounds=3)
+
+
+def test_highlights_of_a_month(benchmark, store):
+    benchmark(
+        store.clippings,
+        kind=Highlight,
+        since=datetime(2016, 4, 1),
+        until=datetime(2016, 5, 1),
+    )
+
+
+def test_books_by_author(benchmark, store):
+    books = benchmark(store.books, author="Author 1")
+    assert books
+
+
+@pytest.fixture(scope="module")
+def search_store(text_clippings_file, tmp_path_factory):
+    store = ClippingStore(tmp_path_factory.mktemp("search") / "clippings.db")
+    store.ingest_file(text_clippings_file)
+    yield store
+    store.close()
+
+
+@pytest.mark.parametrize(
+    "query",
+    ["der", "Liebe", '"immer wieder"', "Welt OR Macht", "Lie*", "gonifi"],
+)
+def test_search(benchmark, search_store, query):
+    benchmark(search_store.search, query)
+
+
+def test_search_limit_scan(benchmark, search_store):
+    benchmark(search_store.search, "der", limit_scan=1000)
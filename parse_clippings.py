@@ -1,52 +1,63 @@
+import json
+import shutil
+import sys
+import time
+
 from pathlib import Path
-from collections import OrderedDict
 
 from loguru import logger
-import mdutils  # type: ignore
 
-from src.clippings import parse_clipping, Clipping, Note, Highlight
+from src.clippings import (
+    parse_clipping,
+    group_clippings_by_book,
+    format_datetime,
+    Clipping,
+    Note,
+    Highlight,
+)
+from src.checkpoint import Checkpoint, scan_appended
+from src.dedupe import collapse_near_duplicates
+from src.index import ClippingIndex
+from src.manifest import Manifest, digest_clippings
+from src.matching import match_notes_and_highlights
+from src.profiling import active as active_profiler, run_profiled_jobs
+from src.quarantine import Quarantine, parse_records
+from src.reader import iter_file_records, record_title
+from src.scanner import RecordScanner
 
 OUTOUT_DIR = Path("output")
-if not OUTOUT_DIR.exists():
-    OUTOUT_DIR.mkdir(parents=True, exist_ok=True)
-
-
-# read the txt file
-file = Path("My Clippings.txt")
-
-file_content = file.read_text(encoding="utf-8")
-# split the content into clippings
-clippings = file_content.split("==========\n")
-# parse the clippings
-parsed_clippings = [parse_clipping(clipping) for clipping in clippings if clipping]
-# print the parsed clippings
-for clipping in parsed_clippings:
-    if not isinstance(clipping, Clipping):
-        raise ValueError("Clipping is not of type Clipping")
-
-    # get all the different book titles
-books = set(clipping.book_title for clipping in parsed_clippings)
+CHECKPOINT_FILE = OUTOUT_DIR / ".checkpoint.json"
+MANIFEST_FILE = OUTOUT_DIR / ".manifest.json"
+INDEX_FILE = OUTOUT_DIR / ".index"
+# the records the tolerant mode could not parse, one JSON object per line
+QUARANTINE_FILE = OUTOUT_DIR / "quarantine.jsonl"
+# the (book_title, author) of the books that failed to render from the store
+FAILED_FILE = OUTOUT_DIR / ".failed.json"
 
-logger.info(f"Number of Books found: {len(books)}")
 
-# divide the clippings into books
-clippings_by_book = OrderedDict()
-for book in books:
-    clippings_by_book[book] = [
-        clipping for clipping in parsed_clippings if clipping.book_title == book
-    ]
+def add_properties(lines: list[str], author: str):
+    lines.append("---")
+    lines.append("tags:")
+    lines.append("  - book")
+    lines.append("status: read")
+    lines.append(f"author: {author}")
+    lines.append("---\n")
 
 
-def add_properties(md_file: mdutils.MdUtils, author: str) -> mdutils.MdUtils:
-    md_file.new_line("---")
-    md_file.new_line("tags:")
-    md_file.new_line("  - book")
-    md_file.new_line("status: read")
-    md_file.new_line(f"author: {author}")
-    md_file.new_line("---\n")
+def book_file_path(book_title: str) -> Path:
+    # Replace forward slashes and colons in the title to avoid file path issues
+    safe_book_title = book_title.replace("/", "-").replace(":", " -")
+    return OUTOUT_DIR / f"{safe_book_title}.md"
 
 
-def save_book_clippings_to_file(clippings: list[Clipping]):
+def save_book_clippings_to_file(
+    clippings: list[Clipping], collapse_duplicates: bool = True
+) -> Path | None:
+    """
+    Renders the clippings of one book into its markdown file. With collapse_duplicates
+    only the longest version of highlights that were extended or adjusted is kept.
+    Returns the path of the file, or None if there was nothing to write.
+    """
     book_title = clippings[0].book_title
     author = clippings[0].author
 
@@ -57,33 +68,31 @@ def save_book_clippings_to_file(clippings: list[Clipping]):
             print(
                 f"Clipping author {clipping.author} does not match the book title {book_title} author {author}"
             )
-    # Replace forward slashes and colons in both title and author to avoid file path issues
-    safe_book_title = book_title.replace("/", "-").replace(":", " -")
+    # Replace forward slashes and colons in the author to avoid file path issues
     safe_author = author.replace("/", "-").replace(":", " -")
-    file_name = f"{safe_book_title}.md"
-    file_path = OUTOUT_DIR / file_name
+    file_path = book_file_path(book_title)
     if file_path.exists():
         file_path.unlink()
-    # create a new file
-    md_file = mdutils.MdUtils(file_name=str(file_path))
-    logger.debug(f'\n"{md_file.get_md_text()}"')
-    # add the clippings to the file
-
-    add_properties(md_file=md_file, author=safe_author)
+    # the lines of the file, which is written at once when they are complete
+    lines: list[str] = []
+    add_properties(lines=lines, author=safe_author)
 
     notes = [clipping for clipping in clippings if isinstance(clipping, Note)]
 
     highlights = [clipping for clipping in clippings if isinstance(clipping, Highlight)]
+    if collapse_duplicates:
+        highlights = collapse_near_duplicates(highlights)
 
-    matched_notes_and_highlights, unmatched_notes, unmatched_highlights = (
-        match_notes_and_hightlights(notes, highlights)
-    )
+    with active_profiler().stage("match"):
+        matched_notes_and_highlights, unmatched_notes, unmatched_highlights = (
+            match_notes_and_hightlights(notes, highlights)
+        )
     if len(unmatched_notes) > 0:
         logger.warning(
             f"did not match {len(unmatched_notes)} with highlights in {book_title} by {author}"
         )
     if len(matched_notes_and_highlights) == 0:
-        return
+        return None
 
     sorted_highlights_with_matched_notes = sorted(
         matched_notes_and_highlights
@@ -93,62 +102,415 @@ def save_book_clippings_to_file(clippings: list[Clipping]):
 
     for note, highlight in sorted_highlights_with_matched_notes:
         if highlight.page:
-            md_file.new_line(f"S {highlight.page}")
+            lines.append(f"S {highlight.page}")
         else:
-            md_file.new_line(f"P {highlight.position[0]}")
+            lines.append(f"P {highlight.position[0]}")
 
-        md_file.new_line(highlight.created_at.strftime("%A, %d. %B %Y %H:%M"))
-        md_file.new_paragraph(f"{highlight.text}", bold_italics_code="i")
+        lines.append(format_datetime(highlight.created_at))
+        # an italic paragraph
+        lines.append(f"\n*{highlight.text}*")
         if note:
-            md_file.new_line(f"\n{note.text}")
-        md_file.new_line("\n---\n")
+            lines.append(f"\n{note.text}")
+        lines.append("\n---\n")
 
     if unmatched_notes:
-        md_file.new_line(f"## Unmatched Notes ({len(unmatched_notes)})\n")
+        lines.append(f"## Unmatched Notes ({len(unmatched_notes)})\n")
         # add the unmatched notes to the file
         for note in unmatched_notes:
             if note.page:
-                md_file.new_line(f"S {note.page}")
+                lines.append(f"S {note.page}")
             else:
-                md_file.new_line(f"P {note.position}")
-            md_file.new_line(note.created_at.strftime("%A, %d. %B %Y %H:%M"))
-            md_file.new_line(note.text)
-            md_file.new_line("\n---\n")
+                lines.append(f"P {note.position}")
+            lines.append(format_datetime(note.created_at))
+            lines.append(note.text)
+            lines.append("\n---\n")
 
-    # save the file
-    file = md_file.create_md_file()
-    data = md_file.get_md_text()
-    # delete the first 3 lines
-    data = "\n".join(data.split("\n")[4:])
-    file.rewrite_all_file(data=data)
+    # save the file in a single write
+    with open(file_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines))
+    return file_path
 
 
 def match_notes_and_hightlights(notes: list[Note], highlights: list[Highlight]):
-    """match the notes and hightlights that belong togehter and return the in the tuple, return the rest of the highlights as a list, reutrn the rest of the notes as a list
-
-    Args:
-        notes (list[Note]): _description_
-        highlights (list[Highlight]): _description_
-
-    """
-    matched_notes_and_highlights = []
-    unmatched_notes = []
-    for note in notes:
-        # print(f"note: {note}\n position: {note.position}\n")
-        for highlight in highlights:
-            if note.position == highlight.position[1]:
-                matched_notes_and_highlights.append((note, highlight))
-                break
-                # highlights.remove(highlight)
+    """match the notes and hightlights that belong together, see
+    src.matching.match_notes_and_highlights for how a note is assigned to a highlight
+    """
+    return match_notes_and_highlights(notes, highlights)
+
+
+def save_books(
+    clippings_by_book: dict[tuple[str, str], list[Clipping]],
+    manifest: Manifest,
+    jobs: int = 1,
+    collapse_duplicates: bool = True,
+) -> list[tuple[str, str]]:
+    """
+    Saves the markdown file of every book whose clippings changed since it was last
+    rendered, in a pool of jobs processes. A book that fails is logged and does not stop
+    the others.
+    Returns the (book_title, author) of the books that failed.
+    """
+    profiler = active_profiler()
+    pending = []
+    with profiler.stage("digest"):
+        for book, book_clippings in clippings_by_book.items():
+            file_path = book_file_path(book_clippings[0].book_title)
+            digest = digest_clippings(
+                book_clippings, format="md", collapse_duplicates=collapse_duplicates
+            )
+            # skip the book if it is unchanged since it was last rendered
+            if not manifest.is_current(file_path, digest):
+                pending.append((book, book_clippings, digest, file_path))
+    profiler.count("manifest_hits", len(clippings_by_book) - len(pending))
+    profiler.count("manifest_misses", len(pending))
+
+    results = run_profiled_jobs(
+        save_book_clippings_to_file,
+        [(book_clippings, collapse_duplicates) for _, book_clippings, _, _ in pending],
+        jobs,
+        [book[0] for book, _, _, _ in pending],
+    )
+
+    failed = []
+    for (book, _, digest, file_path), (saved_path, error) in zip(pending, results):
+        if error is not None:
+            failed.append(book)
+            logger.error(f"Failed to save {book[0]}: {error!r}")
         else:
-            unmatched_notes.append(note)
-    matched_highlights = {highlight for note, highlight in matched_notes_and_highlights}
-    unmatched_highlights = set(highlights) - matched_highlights
-    return matched_notes_and_highlights, unmatched_notes, unmatched_highlights
+            # a book without anything to write is recorded too, so that it is
+            # skipped like the others until its clippings change
+            manifest.update(file_path, digest, empty=saved_path is None)
+
+    logger.info(
+        f"Saved {len(pending) - len(failed)} books, "
+        f"skipped {len(clippings_by_book) - len(pending)} unchanged, "
+        f"{len(failed)} failed"
+    )
+    return failed
+
+
+def load_failed_books() -> set[tuple[str, str]]:
+    if not FAILED_FILE.exists():
+        return set()
+    books = json.loads(FAILED_FILE.read_text(encoding="utf-8"))
+    return {(book_title, author) for book_title, author in books}
+
+
+def save_failed_books(failed: list[tuple[str, str]]):
+    if not failed:
+        FAILED_FILE.unlink(missing_ok=True)
+        return
+    tmp_path = FAILED_FILE.with_name(FAILED_FILE.name + ".tmp")
+    tmp_path.write_text(
+        json.dumps(sorted(failed), ensure_ascii=False), encoding="utf-8"
+    )
+    tmp_path.replace(FAILED_FILE)
+
+
+def parse_changed_books(
+    file: Path, jobs: int = 1, quarantine: Quarantine | None = None
+) -> tuple[dict[tuple[str, str], list[Clipping]], Checkpoint]:
+    """
+    Parses the clippings of the books that got new clippings since the checkpoint,
+    or of all books if there is no valid checkpoint, in which case the file is parsed
+    in jobs processes. With a quarantine the records that cannot be parsed are added
+    to it instead of stopping the run, and all books are parsed in this process.
+    Returns the clippings by book and the checkpoint for the current file.
+    """
+    profiler = active_profiler()
+    with profiler.stage("index"):
+        # the index is kept up to date on every run, so that it never has to be rebuilt
+        index = ClippingIndex.load(INDEX_FILE) or ClippingIndex()
+        indexed = index.checkpoint
+        first_new = index.update(file)
+        index.save(INDEX_FILE)
+        new_checkpoint = index.checkpoint
+        # My Clippings.txt is append-only, so only the records after the checkpoint
+        # are new. The update already checked that the file continues the indexed
+        # bytes, which end at the checkpoint unless books failed in the last run
+        checkpoint = Checkpoint.load(CHECKPOINT_FILE)
+        if checkpoint == new_checkpoint:
+            # nothing was appended since the checkpoint, so no book changed. This
+            # also holds when the index was rebuilt, which scan_appended would
+            # otherwise follow with a second hash of the whole file
+            profiler.count("checkpoint_hits")
+            profiler.count("records_parsed", 0)
+            profiler.count("bytes_read", 0)
+            logger.info("Number of Books with new clippings: 0")
+            return {}, new_checkpoint
+        if checkpoint is None:
+            start = 0
+        elif checkpoint == indexed and first_new > 0:
+            start = checkpoint.offset
+        else:
+            start, _ = scan_appended(file, checkpoint)
+    if start > 0:
+        profiler.count("checkpoint_hits")
+        changed_books = index.book_ids(index.first_record_at(start))
+        logger.info(f"Number of Books with new clippings: {len(changed_books)}")
+        # the books with new clippings are rendered again with all of their clippings,
+        # which the index points to without scanning the file
+        with profiler.stage("parse"), RecordScanner(file) as scanner:
+            parsed_clippings = parse_records(
+                scanner, index.find(books=changed_books), quarantine
+            )
+    elif quarantine is not None:
+        # the offsets of the quarantined records are the ones of the new file
+        quarantine.clear()
+        with profiler.stage("parse"), RecordScanner(file) as scanner:
+            parsed_clippings = parse_records(scanner, index.find(), quarantine)
+    elif jobs > 1:
+        from src.sharding import parse_file_parallel
+
+        # the file is split into shards on the separators, which are parsed in parallel
+        with profiler.stage("parse"):
+            parsed_clippings = parse_file_parallel(file, jobs)
+    else:
+        parse = profiler.timed_function("parse", parse_clipping)
+        parsed_clippings = [
+            parse(record) for record in profiler.timed("read", iter_file_records(file))
+        ]
+    profiler.count("records_parsed", len(parsed_clippings))
+    profiler.count("bytes_read", new_checkpoint.offset - start)
+
+    # print the parsed clippings
+    for clipping in parsed_clippings:
+        if not isinstance(clipping, Clipping):
+            raise ValueError("Clipping is not of type Clipping")
+
+    # divide the clippings into books
+    return group_clippings_by_book(parsed_clippings), new_checkpoint
+
+
+class IncrementalSync:
+    """
+    Parses and renders the books with new clippings like main, for a long running
+    watch. The index and the manifest are kept in memory between the runs, so a run
+    after an append only hashes the file, parses the records of the books with new
+    clippings and renders these books. Books that failed to render are rendered again
+    by the next run.
+    """
+
+    def __init__(
+        self,
+        file: Path,
+        jobs: int = 1,
+        collapse_duplicates: bool = True,
+        tolerant: bool = False,
+    ):
+        self.file = file
+        self.jobs = jobs
+        self.collapse_duplicates = collapse_duplicates
+        self.index: ClippingIndex | None = None
+        self.manifest = Manifest.load(MANIFEST_FILE)
+        self.quarantine = Quarantine.load(QUARANTINE_FILE) if tolerant else None
+        # the clippings of the books that failed to render, by (book_title, author)
+        self.failed: dict[tuple[str, str], list[Clipping]] = {}
+        OUTOUT_DIR.mkdir(parents=True, exist_ok=True)
+
+    def run(self) -> int:
+        """
+        Renders the books with clippings added since the last run and returns their
+        number.
+        """
+        try:
+            return self.sync()
+        except BaseException:
+            # the next run starts from the saved checkpoint again, which is behind
+            # the records of this run
+            self.index = None
+            raise
+
+    def sync(self) -> int:
+        if self.index is None:
+            # the first run starts from the checkpoint of the last run like main
+            clippings_by_book, checkpoint = parse_changed_books(
+                self.file, self.jobs, self.quarantine
+            )
+            self.index = ClippingIndex.load(INDEX_FILE)
+        else:
+            profiler = active_profiler()
+            # the index was last updated when the checkpoint was saved
+            offset = self.index.checkpoint.offset
+            with profiler.stage("index"):
+                first_new = self.index.update(self.file)
+            books = None if first_new == 0 else self.index.book_ids(first_new)
+            if first_new == 0 and self.quarantine is not None:
+                self.quarantine.clear()
+            with profiler.stage("parse"), RecordScanner(self.file) as scanner:
+                parsed_clippings = parse_records(
+                    scanner, self.index.find(books=books), self.quarantine
+                )
+            clippings_by_book = group_clippings_by_book(parsed_clippings)
+            checkpoint = self.index.checkpoint
+            profiler.count("records_parsed", len(parsed_clippings))
+            profiler.count(
+                "bytes_read", checkpoint.offset - (0 if first_new == 0 else offset)
+            )
+            self.index.save(INDEX_FILE)
+
+        # the books that failed last time are rendered with their latest clippings
+        clippings_by_book = {**self.failed, **clippings_by_book}
+        failed = save_books(
+            clippings_by_book, self.manifest, self.jobs, self.collapse_duplicates
+        )
+        self.failed = {book: clippings_by_book[book] for book in failed}
+        self.manifest.save(MANIFEST_FILE)
+        if self.quarantine is not None:
+            save_quarantine(self.quarantine)
+        # like main, the checkpoint is not moved past books that failed
+        if not failed:
+            checkpoint.save(CHECKPOINT_FILE)
+        return len(clippings_by_book)
+
+
+def save_quarantine(quarantine: Quarantine):
+    """
+    Saves the quarantine and reports how many records could not be parsed.
+    """
+    quarantine.save(QUARANTINE_FILE)
+    active_profiler().count("records_quarantined", len(quarantine))
+    if quarantine:
+        errors = ", ".join(
+            f"{count} {error}" for error, count in quarantine.error_counts().items()
+        )
+        logger.warning(
+            f"Could not parse {len(quarantine)} records ({errors}), "
+            f"they are in {QUARANTINE_FILE}"
+        )
+
+
+def reparse_quarantine(jobs: int = 1, collapse_duplicates: bool = True) -> int:
+    """
+    Parses the quarantined records again, e.g. after the parser learned their format,
+    and renders the books that got clippings back. Only the records of these books
+    are parsed, not the whole file.
+    Returns the number of records that could be parsed now.
+    """
+    file = Path("My Clippings.txt")
+    OUTOUT_DIR.mkdir(parents=True, exist_ok=True)
+    quarantine = Quarantine.load(QUARANTINE_FILE)
+    recovered = quarantine.reparse()
+    logger.info(
+        f"Parsed {len(recovered)} of {len(recovered) + len(quarantine)} records"
+    )
+
+    if recovered:
+        index = ClippingIndex.load(INDEX_FILE) or ClippingIndex()
+        index.update(file)
+        index.save(INDEX_FILE)
+        books = {index.book_id(record_title(record.text)) for record, _ in recovered}
+        clippings_by_offset = {
+            record.offset: clipping for record, clipping in recovered
+        }
+        clippings = []
+        with RecordScanner(file) as scanner:
+            # the other records of the books are parsed, the recovered ones are kept
+            for record in index.find(books=books - {None}):
+                if record.offset in clippings_by_offset:
+                    clippings.append(clippings_by_offset[record.offset])
+                else:
+                    clippings.extend(parse_records(scanner, [record], quarantine))
+        clippings_by_book = group_clippings_by_book(clippings)
+        manifest = Manifest.load(MANIFEST_FILE)
+        save_books(clippings_by_book, manifest, jobs, collapse_duplicates)
+        manifest.save(MANIFEST_FILE)
+
+    save_quarantine(quarantine)
+    return len(recovered)
+
+
+def watch_clippings(
+    source: Path,
+    jobs: int = 1,
+    collapse_duplicates: bool = True,
+    debounce: float = 0.05,
+    interval: float = 1.0,
+    polling: bool = False,
+    tolerant: bool = False,
+):
+    """
+    Watches the clippings file, e.g. on a Kindle that is not mounted yet, and
+    renders the books with new clippings whenever it changes, until interrupted.
+    A source other than My Clippings.txt is copied there first.
+    """
+    from src.watch import watch
+
+    file = Path("My Clippings.txt")
+    sync = IncrementalSync(file, jobs, collapse_duplicates, tolerant)
+
+    def on_change(path: Path):
+        start = time.perf_counter()
+        try:
+            if path.resolve() != file.resolve():
+                tmp_path = file.with_name(file.name + ".tmp")
+                shutil.copyfile(path, tmp_path)
+                tmp_path.replace(file)
+            books = sync.run()
+        except Exception:
+            # the next change syncs the records of the failed run again
+            logger.exception(f"Failed to sync {path}")
+            return
+        logger.info(
+            f"Synced {books} books in {(time.perf_counter() - start) * 1000:.0f} ms"
+        )
+
+    logger.info(f"Watching {source}")
+    try:
+        watch(source, on_change, debounce, interval, polling)
+    except KeyboardInterrupt:
+        pass
+
+
+def main(
+    jobs: int = 1,
+    store_path: Path | None = None,
+    collapse_duplicates: bool = True,
+    tolerant: bool = False,
+):
+    """
+    Renders the books with new clippings. In the tolerant mode the records that
+    cannot be parsed are kept in QUARANTINE_FILE instead of stopping the run.
+    """
+    # read the txt file
+    file = Path("My Clippings.txt")
+    OUTOUT_DIR.mkdir(parents=True, exist_ok=True)
+
+    new_checkpoint = None
+    quarantine = None
+    if store_path is not None:
+        from src.store import ClippingStore
+
+        # the store remembers the clippings, so only the new records are parsed
+        with ClippingStore(store_path) as store:
+            changed_books = store.ingest_file(file)
+            # the ingest already moved past the clippings of the books that failed
+            # to render, so they are rendered again from the store
+            changed_books |= load_failed_books()
+            clippings_by_book = store.clippings_by_book(sorted(changed_books))
+    else:
+        if tolerant:
+            quarantine = Quarantine.load(QUARANTINE_FILE)
+        clippings_by_book, new_checkpoint = parse_changed_books(file, jobs, quarantine)
+
+    logger.info(f"Number of Books found: {len(clippings_by_book)}")
+
+    manifest = Manifest.load(MANIFEST_FILE)
+    failed = save_books(clippings_by_book, manifest, jobs, collapse_duplicates)
+    manifest.save(MANIFEST_FILE)
+    if quarantine is not None:
+        save_quarantine(quarantine)
+    if store_path is not None:
+        save_failed_books(failed)
+
+    # the checkpoint stays behind the records of books that failed, so that the next
+    # run renders them again, the manifest skips the others
+    if new_checkpoint is not None and not failed:
+        new_checkpoint.save(CHECKPOINT_FILE)
 
 
-book_titles = list(clippings_by_book.keys())
+if __name__ == "__main__":
+    # the options are defined once, by the parse command of src.cli
+    from src.cli import main as cli_main
 
-for book_title in book_titles:
-    parsed_clippings = clippings_by_book[book_title]
-    save_book_clippings_to_file(parsed_clippings)
+    cli_main(["parse", *sys.argv[1:]])
@@ -0,0 +1,304 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+
+from datetime import datetime
+from pathlib import Path
+from typing import IO, Iterator
+
+INDEX_FILE_NAME = "snapshots.jsonl"
+DATA_FILE_NAME = "deltas.bin"
+CHUNK_SIZE = 1 << 20
+FIELDS = (
+    "name",
+    "created_at",
+    "parent",
+    "length",
+    "digest",
+    "delta_offset",
+    "delta_length",
+    "delta_digest",
+    "previous",
+)
+
+
+class Snapshot:
+    """
+    A copy of a clippings file in a SnapshotArchive. Only the bytes appended to its
+    parent snapshot are stored, at delta_offset in the data file. digest is the sha256
+    of the whole snapshot and previous the entry_digest of the snapshot added before,
+    so that every entry vouches for the history before it.
+    """
+
+    __slots__ = FIELDS
+
+    def __init__(
+        self,
+        name: str,
+        created_at: str,
+        parent: int | None,
+        length: int,
+        digest: str,
+        delta_offset: int,
+        delta_length: int,
+        delta_digest: str,
+        previous: str,
+    ):
+        self.name = name
+        self.created_at = created_at
+        self.parent = parent
+        self.length = length
+        self.digest = digest
+        self.delta_offset = delta_offset
+        self.delta_length = delta_length
+        self.delta_digest = delta_digest
+        self.previous = previous
+
+    def __repr__(self):
+        return f"Snapshot(name={self.name}, length={self.length}, parent={self.parent})"
+
+    def to_dict(self) -> dict:
+        return {field: getattr(self, field) for field in FIELDS}
+
+    @property
+    def entry_digest(self) -> str:
+        entry = json.dumps(self.to_dict(), sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(entry.encode("utf-8")).hexdigest()
+
+
+def prefix_digests(stream: IO[bytes], lengths: set[int]) -> dict[int, str]:
+    """
+    Reads the stream to the end and returns the sha256 of its first length bytes for
+    every length in lengths that is not larger than the stream.
+    """
+    hasher = hashlib.sha256()
+    digests = {}
+    if 0 in lengths:
+        digests[0] = hasher.hexdigest()
+    position = 0
+    boundaries = sorted(length for length in lengths if length > 0)
+    for boundary in boundaries:
+        while position < boundary:
+            chunk = stream.read(min(CHUNK_SIZE, boundary - position))
+            if not chunk:
+                return digests
+            hasher.update(chunk)
+            position += len(chunk)
+        digests[boundary] = hasher.hexdigest()
+    return digests
+
+
+class SnapshotArchive:
+    """
+    Keeps the snapshots of append-only clippings files, e.g. the copies
+    sync_kindle_clippings.sh takes on every sync, without storing them in full.
+
+    A new snapshot that starts with the content of an older one is stored as the
+    bytes appended to it; a file that continues none of them, e.g. of another Kindle,
+    is stored in full. The deltas are appended to one data file and the snapshots to
+    a JSON lines index, so adding a snapshot never rewrites what is stored.
+
+        archive = SnapshotArchive(Path(".sync"))
+        archive.add(Path("/Volumes/Kindle/documents/My Clippings.txt"))
+        archive.restore("My Clippings_20240101_120000.txt", Path("old.txt"))
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.index_file = directory / INDEX_FILE_NAME
+        self.data_file = directory / DATA_FILE_NAME
+        self.snapshots: list[Snapshot] = []
+        if self.index_file.exists():
+            with open(self.index_file, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        self.snapshots.append(Snapshot(**json.loads(line)))
+
+    def __len__(self) -> int:
+        return len(self.snapshots)
+
+    def find(self, name: str) -> int:
+        """
+        Returns the number of the snapshot with the name, "latest" is the last one.
+        """
+        if name == "latest" and self.snapshots:
+            return len(self.snapshots) - 1
+        for number, snapshot in enumerate(self.snapshots):
+            if snapshot.name == name:
+                return number
+        raise KeyError(f"No snapshot named {name}")
+
+    def add(
+        self,
+        source_file: Path,
+        name: str | None = None,
+        created_at: datetime | None = None,
+    ) -> Snapshot:
+        """
+        Adds a snapshot of the file. The name defaults to the file name with the time
+        of the snapshot, like the copies of sync_kindle_clippings.sh.
+        """
+        created_at = created_at or datetime.now()
+        if name is None:
+            name = f"{source_file.stem}_{created_at:%Y%m%d_%H%M%S}{source_file.suffix}"
+        if any(snapshot.name == name for snapshot in self.snapshots):
+            raise ValueError(f"There already is a snapshot named {name}")
+
+        with open(source_file, "rb") as f:
+            length = os.fstat(f.fileno()).st_size
+            digests = prefix_digests(
+                f, {snapshot.length for snapshot in self.snapshots} | {length}
+            )
+            # the parent is the longest snapshot the file continues
+            parent = None
+            for number, snapshot in enumerate(self.snapshots):
+                if digests.get(snapshot.length) == snapshot.digest and (
+                    parent is None or snapshot.length > self.snapshots[parent].length
+                ):
+                    parent = number
+            start = self.snapshots[parent].length if parent is not None else 0
+
+            self.directory.mkdir(parents=True, exist_ok=True)
+            f.seek(start)
+            delta_hasher = hashlib.sha256()
+            with open(self.data_file, "ab") as data:
+                delta_offset = data.tell()
+                while chunk := f.read(CHUNK_SIZE):
+                    delta_hasher.update(chunk)
+                    data.write(chunk)
+                delta_length = data.tell() - delta_offset
+                data.flush()
+                os.fsync(data.fileno())
+
+        if start + delta_length != length:
+            raise OSError(f"{source_file} changed while it was archived")
+        snapshot = Snapshot(
+            name=name,
+            created_at=created_at.isoformat(),
+            parent=parent,
+            length=length,
+            digest=digests[length],
+            delta_offset=delta_offset,
+            delta_length=delta_length,
+            delta_digest=delta_hasher.hexdigest(),
+            previous=self.snapshots[-1].entry_digest if self.snapshots else "",
+        )
+        # the index line is written after the delta, so a crash leaves no entry behind
+        with open(self.index_file, "a", encoding="utf-8") as f:
+            f.write(json.dumps(snapshot.to_dict(), ensure_ascii=False) + "\n")
+        self.snapshots.append(snapshot)
+        return snapshot
+
+    def heads(self) -> list[int]:
+        """
+        Returns the numbers of the snapshots that no other snapshot continues. Their
+        content holds the content of all snapshots of the same file before them.
+        """
+        parents = {snapshot.parent for snapshot in self.snapshots}
+        return [number for number in range(len(self)) if number not in parents]
+
+    def chain(self, number: int) -> list[Snapshot]:
+        """
+        Returns the snapshots whose deltas make up the snapshot, oldest first.
+        """
+        chain = []
+        current: int | None = number
+        while current is not None:
+            snapshot = self.snapshots[current]
+            chain.append(snapshot)
+            current = snapshot.parent
+        return chain[::-1]
+
+    def iter_content(self, number: int) -> Iterator[bytes]:
+        """
+        Yields the content of the snapshot in chunks.
+        """
+        with open(self.data_file, "rb") as data:
+            for snapshot in self.chain(number):
+                data.seek(snapshot.delta_offset)
+                left = snapshot.delta_length
+                while left > 0:
+                    chunk = data.read(min(CHUNK_SIZE, left))
+                    if not chunk:
+                        raise ValueError(f"The delta of {snapshot.name} is truncated")
+                    left -= len(chunk)
+                    yield chunk
+
+    def read(self, name: str) -> bytes:
+        return b"".join(self.iter_content(self.find(name)))
+
+    def restore(self, name: str, output_file: Path, check: bool = True):
+        """
+        Writes the snapshot to output_file. If check is set, the content is compared
+        with the digest of the snapshot first and nothing is written on a mismatch.
+        """
+        number = self.find(name)
+        snapshot = self.snapshots[number]
+        tmp_path = output_file.with_name(output_file.name + ".tmp")
+        hasher = hashlib.sha256()
+        with open(tmp_path, "wb") as f:
+            for chunk in self.iter_content(number):
+                hasher.update(chunk)
+                f.write(chunk)
+        if check and hasher.hexdigest() != snapshot.digest:
+            tmp_path.unlink()
+            raise ValueError(
+                f"The content of {snapshot.name} does not match its digest"
+            )
+        tmp_path.replace(output_file)
+
+    def verify(self) -> list[str]:
+        """
+        Checks the hash chain of the index, the deltas and the digest of every
+        snapshot, reading every delta once. Returns the problems found.
+        """
+        if not self.snapshots:
+            return []
+        if not self.data_file.exists():
+            return [f"{self.data_file} is missing"]
+
+        problems = []
+        previous = ""
+        # the hash state after every snapshot, parents always come before children
+        hashers: list = []
+        with open(self.data_file, "rb") as data:
+            for number, snapshot in enumerate(self.snapshots):
+                if snapshot.previous != previous:
+                    problems.append(f"{snapshot.name}: the hash chain is broken")
+                previous = snapshot.entry_digest
+
+                if snapshot.parent is None:
+                    hasher = hashlib.sha256()
+                elif snapshot.parent >= number:
+                    problems.append(f"{snapshot.name}: invalid parent")
+                    hashers.append(None)
+                    continue
+                elif hashers[snapshot.parent] is None:
+                    problems.append(f"{snapshot.name}: its parent is invalid")
+                    hashers.append(None)
+                    continue
+                else:
+                    hasher = hashers[snapshot.parent].copy()
+
+                delta_hasher = hashlib.sha256()
+                data.seek(snapshot.delta_offset)
+                left = snapshot.delta_length
+                while left > 0:
+                    chunk = data.read(min(CHUNK_SIZE, left))
+                    if not chunk:
+                        break
+                    left -= len(chunk)
+                    delta_hasher.update(chunk)
+                    hasher.update(chunk)
+
+                if left or delta_hasher.hexdigest() != snapshot.delta_digest:
+                    problems.append(f"{snapshot.name}: the delta is damaged")
+                    hashers.append(None)
+                elif hasher.hexdigest() != snapshot.digest:
+                    problems.append(f"{snapshot.name}: the content does not match")
+                    hashers.append(None)
+                else:
+                    hashers.append(hasher)
+        return problems
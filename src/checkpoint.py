@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import hashlib
+import json
+
+from pathlib import Path
+
+SEPARATOR = b"=========="
+CHUNK_SIZE = 1 << 20
+
+
+class Checkpoint:
+    """
+    Remembers how much of an append-only clippings file was already processed.
+    offset is the byte offset right after the last complete record and digest is the
+    sha256 of the bytes before it.
+    """
+
+    def __init__(self, offset: int = 0, digest: str = hashlib.sha256().hexdigest()):
+        self.offset = offset
+        self.digest = digest
+
+    def __repr__(self):
+        return f"Checkpoint(offset={self.offset}, digest={self.digest})"
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, Checkpoint)
+            and self.offset == other.offset
+            and self.digest == other.digest
+        )
+
+    @classmethod
+    def load(cls, path: Path) -> Checkpoint | None:
+        if not path.exists():
+            return None
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            return cls(offset=int(data["offset"]), digest=str(data["digest"]))
+        except (ValueError, KeyError, TypeError):
+            return None
+
+    def save(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        tmp_path.write_text(
+            json.dumps({"offset": self.offset, "digest": self.digest}),
+            encoding="utf-8",
+        )
+        tmp_path.replace(path)
+
+
+def scan_appended(
+    source_file: Path, checkpoint: Checkpoint | None
+) -> tuple[int, Checkpoint]:
+    """
+    Reads the clippings file once and checks whether it still starts with the bytes
+    the checkpoint was taken from.
+
+    Returns the byte offset from which records have to be parsed and the checkpoint
+    for the current content of the file. The offset is the one of the old checkpoint
+    when its prefix is unchanged and 0 when the file was edited or replaced, in which
+    case everything has to be parsed again.
+    """
+    hasher = hashlib.sha256()
+    start = 0
+    new_offset = 0
+    new_digest = hasher.hexdigest()
+    position = 0
+    # bytes since the last record boundary that are not yet part of the hash
+    pending = b""
+
+    with open(source_file, "rb") as f:
+        if checkpoint is not None and checkpoint.offset > 0:
+            prefix_left = checkpoint.offset
+            while prefix_left > 0:
+                chunk = f.read(min(CHUNK_SIZE, prefix_left))
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                prefix_left -= len(chunk)
+            position = f.tell()
+            if prefix_left == 0 and hasher.hexdigest() == checkpoint.digest:
+                start = new_offset = checkpoint.offset
+                new_digest = checkpoint.digest
+            else:
+                # the file does not continue the checkpoint, hash it from the start
+                hasher = hashlib.sha256()
+                f.seek(0)
+                position = 0
+
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            position += len(chunk)
+            pending += chunk
+            # a record ends with the separator and the line break that follows it
+            index = pending.rfind(SEPARATOR)
+            end = pending.find(b"\n", index) if index != -1 else -1
+            if end == -1:
+                # keep a possibly incomplete separator and line break for the next chunk
+                keep = len(SEPARATOR) + 2
+                if len(pending) > keep:
+                    hasher.update(pending[:-keep])
+                    pending = pending[-keep:]
+                continue
+            hasher.update(pending[: end + 1])
+            pending = pending[end + 1 :]
+            new_offset = position - len(pending)
+            new_digest = hasher.hexdigest()
+
+    return start, Checkpoint(offset=new_offset, digest=new_digest)
@@ -0,0 +1,497 @@
+"""
+Command line interface for the clippings tools.
+
+    python -m src.cli parse -jobs 4
+    python -m src.cli parse -watch -source "$KINDLE/documents/My Clippings.txt"
+    python -m src.cli export -source "My Clippings.txt" -format pdf
+    python -m src.cli parse -profile profile.json -profile_stats parse.pstats
+    python -m src.cli parse -tolerant
+    python -m src.cli parse -snapshot -source "$KINDLE/documents/My Clippings.txt"
+    python -m src.cli parse -reparse_quarantine
+    python -m src.cli obsidian output/*.md -vault ~/Documents/SyncedVault
+    python -m src.cli search "in love" -store clippings.db -source "My Clippings.txt"
+    python -m src.cli merge other/*.txt -archive .sync -output "My Clippings.txt"
+    python -m src.cli snapshot add "/Volumes/Kindle/documents/My Clippings.txt"
+"""
+
+from __future__ import annotations
+
+import argparse
+
+from pathlib import Path
+from typing import Callable
+
+# every command imports what it needs when it runs, so that starting the command line
+# does not load the renderers, sqlite3 or the process pool of the other commands
+
+DEFAULT_STORE = Path("clippings.db")
+DEFAULT_ARCHIVE = Path(".sync")
+# the exit status of parse -snapshot when the snapshot could not be added, so that
+# sync_kindle_clippings.sh can tell it from a failed parse
+SNAPSHOT_FAILED = 3
+# the value of -profile without a file, the report is then printed
+STDOUT = Path("-")
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "-profile",
+        "--profile",
+        type=Path,
+        nargs="?",
+        const=STDOUT,
+        default=None,
+        help="time the stages of the run and write a JSON report, to stdout without "
+        "a file",
+    )
+    parser.add_argument(
+        "-profile_log",
+        "--profile-log",
+        action="store_true",
+        help="also log the stages of the profile with loguru",
+    )
+    parser.add_argument(
+        "-profile_stats",
+        "--profile-stats",
+        type=Path,
+        default=None,
+        help="also run under cProfile and dump its stats to this file",
+    )
+
+
+def profiled(args: argparse.Namespace, run: Callable[[], object]):
+    """
+    Calls run, with profiling on if one of the profile options is given.
+    """
+    if args.profile is None and not args.profile_log and args.profile_stats is None:
+        run()
+        return
+
+    from src.profiling import profiling
+
+    with profiling(args.profile_stats) as profiler:
+        run()
+    if args.profile_log:
+        profiler.log()
+    if args.profile is not None:
+        profiler.write(None if args.profile == STDOUT else args.profile)
+
+
+def snapshot_source(source: Path, archive_directory: Path):
+    """
+    Adds a snapshot of the source to the archive and copies it to My Clippings.txt,
+    which is parsed next.
+    """
+    import shutil
+    import sys
+
+    from src.archive import SnapshotArchive
+
+    try:
+        added = SnapshotArchive(archive_directory).add(source)
+    except (OSError, ValueError) as error:
+        print(f"Could not add a snapshot of {source}: {error}", file=sys.stderr)
+        raise SystemExit(SNAPSHOT_FAILED)
+    print(f"Added {added.name}, stored {added.delta_length} new bytes")
+
+    file = Path("My Clippings.txt")
+    if source.resolve() != file.resolve():
+        tmp_path = file.with_name(file.name + ".tmp")
+        shutil.copyfile(source, tmp_path)
+        tmp_path.replace(file)
+
+
+def parse(args: argparse.Namespace):
+    import parse_clippings
+
+    if args.snapshot:
+        snapshot_source(args.source, args.archive)
+
+    if args.watch:
+        profiled(
+            args,
+            lambda: parse_clippings.watch_clippings(
+                args.source,
+                args.jobs,
+                not args.keep_near_duplicates,
+                args.debounce,
+                args.interval,
+                args.poll,
+                args.tolerant,
+            ),
+        )
+    elif args.reparse_quarantine:
+        profiled(
+            args,
+            lambda: parse_clippings.reparse_quarantine(
+                args.jobs, not args.keep_near_duplicates
+            ),
+        )
+    else:
+        profiled(
+            args,
+            lambda: parse_clippings.main(
+                args.jobs, args.store, not args.keep_near_duplicates, args.tolerant
+            ),
+        )
+
+
+def export(args: argparse.Namespace):
+    import KindleClippings
+
+    profiled(
+        args,
+        lambda: KindleClippings.main(
+            args.source,
+            args.destination,
+            args.encoding,
+            args.format,
+            args.include_clip_meta,
+            args.jobs,
+            not args.keep_near_duplicates,
+            args.combined_pdf,
+        ),
+    )
+
+
+def obsidian(args: argparse.Namespace):
+    from src.obsidian import export_notes
+
+    files = args.files or sorted(Path("output").glob("*.md"))
+    report = export_notes(files, args.vault, args.folder, args.workers)
+    for source, error in report.failed:
+        print(f"Failed to export {source}: {error}")
+    print(report.summary())
+    if report.failed:
+        raise SystemExit(1)
+
+
+def search(args: argparse.Namespace):
+    from src.store import ClippingStore
+
+    with ClippingStore(args.store) as store:
+        if args.source is not None:
+            # only the clippings appended since the last search are parsed
+            store.ingest_file(args.source)
+        results = store.search(
+            args.query,
+            book_title=args.book,
+            author=args.author,
+            limit=args.limit,
+            limit_scan=args.limit_scan,
+        )
+
+    for clipping, snippet in results:
+        if clipping.page:
+            location = f"S {clipping.page}"
+        elif isinstance(clipping.position, tuple):
+            location = f"P {clipping.position[0]}"
+        else:
+            location = f"P {clipping.position}"
+        print(f"{clipping.book_title} ({clipping.author}) {location}")
+        print(f"    {snippet}")
+    if not results:
+        print("No clippings found")
+    elif args.limit_scan is not None:
+        print(f"Only the newest {args.limit_scan} matches were ranked")
+
+
+def merge(args: argparse.Namespace):
+    import tempfile
+
+    from src.archive import SnapshotArchive
+    from src.merge import merge_sources
+    from src.reader import SEPARATOR
+    from src.store import ClippingStore
+
+    sources = list(args.sources)
+    with tempfile.TemporaryDirectory() as directory:
+        if args.archive is not None:
+            # the snapshots hold appended deltas, so the latest snapshot of every
+            # file is restored to be merged with the other sources
+            archive = SnapshotArchive(args.archive)
+            for number in archive.heads():
+                path = Path(directory) / f"{number}.txt"
+                archive.restore(archive.snapshots[number].name, path)
+                sources.append(path)
+
+        merged = merge_sources(sources)
+        if args.store is not None:
+            with ClippingStore(args.store) as store:
+                store.add(clipping for clipping, _ in merged)
+            target = args.store
+        else:
+            tmp_path = args.output.with_name(args.output.name + ".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for _, text in merged:
+                    f.write(text + SEPARATOR + "\n")
+            tmp_path.replace(args.output)
+            target = args.output
+    print(f"Merged {len(sources)} clippings files into {target}")
+
+
+def snapshot(args: argparse.Namespace):
+    from datetime import datetime
+
+    from src.archive import SnapshotArchive
+
+    archive = SnapshotArchive(args.archive)
+    if args.action == "add":
+        for source in args.files:
+            if args.keep_name:
+                # e.g. the full copies of older versions of sync_kindle_clippings.sh
+                created_at = datetime.fromtimestamp(source.stat().st_mtime)
+                added = archive.add(source, source.name, created_at)
+            else:
+                added = archive.add(source)
+            print(f"Added {added.name}, stored {added.delta_length} new bytes")
+    elif args.action == "list":
+        for entry in archive.snapshots:
+            print(f"{entry.name}  {entry.created_at}  {entry.length} bytes")
+    elif args.action == "restore":
+        name = archive.snapshots[archive.find(args.name)].name
+        archive.restore(name, args.output or Path(name))
+    elif args.action == "verify":
+        problems = archive.verify()
+        for problem in problems:
+            print(problem)
+        if problems:
+            raise SystemExit(1)
+        print(f"All {len(archive)} snapshots are intact")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Work with Kindle clippings")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    parse_parser = subparsers.add_parser(
+        "parse",
+        help="parse My Clippings.txt into a markdown file per book",
+        description="Parse My Clippings.txt into a markdown file per book",
+    )
+    parse_parser.add_argument(
+        "-jobs",
+        "--jobs",
+        type=int,
+        default=1,
+        help="number of parse and render processes",
+    )
+    parse_parser.add_argument(
+        "-keep_near_duplicates",
+        "--keep-near-duplicates",
+        action="store_true",
+        help="keep all versions of highlights that were extended or adjusted",
+    )
+    mode = parse_parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "-store",
+        "--store",
+        type=Path,
+        default=None,
+        help="SQLite database to keep the parsed clippings in",
+    )
+    mode.add_argument(
+        "-watch",
+        "--watch",
+        action="store_true",
+        help="keep running and sync whenever the source file changes",
+    )
+    mode.add_argument(
+        "-reparse_quarantine",
+        "--reparse-quarantine",
+        action="store_true",
+        help="parse the quarantined records again and render their books",
+    )
+    parse_parser.add_argument(
+        "-tolerant",
+        "--tolerant",
+        action="store_true",
+        help="quarantine the records that cannot be parsed instead of stopping",
+    )
+    parse_parser.add_argument(
+        "-source",
+        "--source",
+        type=Path,
+        default=Path("My Clippings.txt"),
+        help="clippings file to watch or snapshot, e.g. on the mounted Kindle",
+    )
+    parse_parser.add_argument(
+        "-snapshot",
+        "--snapshot",
+        action="store_true",
+        help="add a snapshot of the source to the archive and parse a copy of it",
+    )
+    parse_parser.add_argument(
+        "-archive", "--archive", type=Path, default=DEFAULT_ARCHIVE
+    )
+    parse_parser.add_argument(
+        "-debounce",
+        "--debounce",
+        type=float,
+        default=0.05,
+        help="seconds the source has to be unchanged before a sync",
+    )
+    parse_parser.add_argument(
+        "-interval",
+        "--interval",
+        type=float,
+        default=1.0,
+        help="seconds between checks of the source when polling",
+    )
+    parse_parser.add_argument(
+        "-poll",
+        "--poll",
+        action="store_true",
+        help="poll the source instead of using inotify",
+    )
+    add_profile_arguments(parse_parser)
+    parse_parser.set_defaults(function=parse)
+
+    export_parser = subparsers.add_parser(
+        "export",
+        help="export the clippings into a text, pdf or docx file per book",
+        description="Extract kindle clippings into a folder with nice text files",
+    )
+    export_parser.add_argument(
+        "-source", "--source", type=str, default="/Volumes/Kindle/documents/"
+    )
+    export_parser.add_argument("-destination", "--destination", type=str, default="./")
+    export_parser.add_argument("-encoding", "--encoding", type=str, default="utf8")
+    export_parser.add_argument("-format", "--format", type=str, default="txt")
+    export_parser.add_argument(
+        "-include_clip_meta", "--include-clip-meta", action="store_true"
+    )
+    export_parser.add_argument("-jobs", "--jobs", type=int, default=1)
+    export_parser.add_argument(
+        "-keep_near_duplicates", "--keep-near-duplicates", action="store_true"
+    )
+    export_parser.add_argument(
+        "-combined_pdf",
+        "--combined-pdf",
+        action="store_true",
+        help="also write all books into one pdf with an outline",
+    )
+    add_profile_arguments(export_parser)
+    export_parser.set_defaults(function=export)
+
+    obsidian_parser = subparsers.add_parser(
+        "obsidian",
+        help="copy the markdown files of the books into an Obsidian vault",
+        description="Copy the markdown files that changed into an Obsidian vault",
+    )
+    obsidian_parser.add_argument(
+        "files",
+        type=Path,
+        nargs="*",
+        help="markdown files to copy, by default all files in output",
+    )
+    obsidian_parser.add_argument(
+        "-vault",
+        "--vault",
+        type=Path,
+        required=True,
+        help="directory of the vault",
+    )
+    obsidian_parser.add_argument(
+        "-folder",
+        "--folder",
+        type=str,
+        default="",
+        help="folder in the vault to copy the files into",
+    )
+    obsidian_parser.add_argument(
+        "-workers",
+        "--workers",
+        type=int,
+        default=8,
+        help="number of files copied at the same time",
+    )
+    obsidian_parser.set_defaults(function=obsidian)
+
+    search_parser = subparsers.add_parser(
+        "search", help="full text search over the highlights and notes"
+    )
+    search_parser.add_argument(
+        "query", type=str, help='words, a "phrase" or an FTS5 query'
+    )
+    search_parser.add_argument("-store", "--store", type=Path, default=DEFAULT_STORE)
+    search_parser.add_argument(
+        "-source",
+        "--source",
+        type=Path,
+        default=None,
+        help="clippings file to add new clippings from before searching",
+    )
+    search_parser.add_argument("-book", "--book", type=str, default=None)
+    search_parser.add_argument("-author", "--author", type=str, default=None)
+    search_parser.add_argument("-limit", "--limit", type=int, default=20)
+    search_parser.add_argument(
+        "-limit_scan",
+        "--limit-scan",
+        type=int,
+        default=None,
+        help="only rank the newest N matches, faster for common words but older "
+        "matches can be missed",
+    )
+    search_parser.set_defaults(function=search)
+
+    merge_parser = subparsers.add_parser(
+        "merge", help="merge the clippings files of several devices and snapshots"
+    )
+    merge_parser.add_argument("sources", type=Path, nargs="*")
+    merge_parser.add_argument(
+        "-archive",
+        "--archive",
+        type=Path,
+        default=None,
+        help="snapshot archive to merge the latest snapshots of, e.g. .sync",
+    )
+    target = merge_parser.add_mutually_exclusive_group(required=True)
+    target.add_argument(
+        "-output", "--output", type=Path, help="clippings file to write the result to"
+    )
+    target.add_argument(
+        "-store", "--store", type=Path, help="SQLite database to add the result to"
+    )
+    merge_parser.set_defaults(function=merge)
+
+    snapshot_parser = subparsers.add_parser(
+        "snapshot", help="keep snapshots of clippings files as appended deltas"
+    )
+    snapshot_parser.add_argument("action", choices=["add", "list", "restore", "verify"])
+    snapshot_parser.add_argument(
+        "files", type=Path, nargs="*", help="clippings files to add"
+    )
+    snapshot_parser.add_argument(
+        "-archive", "--archive", type=Path, default=DEFAULT_ARCHIVE
+    )
+    snapshot_parser.add_argument(
+        "-name", "--name", type=str, default="latest", help="snapshot to restore"
+    )
+    snapshot_parser.add_argument("-output", "--output", type=Path, default=None)
+    snapshot_parser.add_argument(
+        "-keep_name",
+        "--keep-name",
+        action="store_true",
+        help="name the added snapshots after their files",
+    )
+    snapshot_parser.set_defaults(function=snapshot)
+
+    return parser
+
+
+def main(argv: list[str] | None = None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == "parse" and args.tolerant and args.store is not None:
+        parser.error("-tolerant cannot be used with -store")
+    if args.command == "parse" and args.snapshot:
+        if args.watch or args.reparse_quarantine:
+            parser.error("-snapshot cannot be used with -watch or -reparse_quarantine")
+    if args.command == "merge" and not args.sources and args.archive is None:
+        parser.error("merge needs clippings files or -archive")
+    args.function(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,89 @@
 from __future__ import annotations
 
 import re
-import locale
 
+from collections import defaultdict
 from datetime import datetime
+from typing import Iterable
 
 WORDS_FOR_BOOKMARK = ["Lesezeichen", "Bookmark", "Bookmarklet"]
 WORDS_FOR_HIGHLIGHT = ["Markierung", "Highlight"]
 WORDS_FOR_NOTE = ["Notiz", "Note", "Anmerkung", "Annotation"]
 
-locale.setlocale(locale.LC_ALL, "de_DE.UTF-8")
+# month and weekday names per language, so that parsing does not depend on the locale
+MONTHS = {
+    "de": [
+        "Januar",
+        "Februar",
+        "März",
+        "April",
+        "Mai",
+        "Juni",
+        "Juli",
+        "August",
+        "September",
+        "Oktober",
+        "November",
+        "Dezember",
+    ],
+    "en": [
+        "January",
+        "February",
+        "March",
+        "April",
+        "May",
+        "June",
+        "July",
+        "August",
+        "September",
+        "October",
+        "November",
+        "December",
+    ],
+}
+WEEKDAYS = {
+    "de": [
+        "Montag",
+        "Dienstag",
+        "Mittwoch",
+        "Donnerstag",
+        "Freitag",
+        "Samstag",
+        "Sonntag",
+    ],
+    "en": [
+        "Monday",
+        "Tuesday",
+        "Wednesday",
+        "Thursday",
+        "Friday",
+        "Saturday",
+        "Sunday",
+    ],
+}
+MONTH_NUMBERS = {
+    name.lower(): number
+    for names in MONTHS.values()
+    for number, name in enumerate(names, start=1)
+}
+MONTH_NUMBERS["jänner"] = 1
+
+DATETIME_PATTERN = (
+    # 25. September 2023 22:42:15 or 26 March 2016 14:59:39
+    r"(?:(?P<day>\d{1,2})\.? (?P<month>\w+) (?P<year>\d{4})"
+    # March 26, 2016 2:59:39 PM
+    r"|(?P<month_us>\w+) (?P<day_us>\d{1,2}), (?P<year_us>\d{4}))"
+    r" (?P<hour>\d{1,2}):(?P<minute>\d{2}):(?P<second>\d{2})(?: (?P<ampm>AM|PM))?"
+)
+PAGE_REGEX = re.compile(r"(\d+)")
+POSITION_REGEX = re.compile(r" (\d+)(?:-(\d+))?$")
+DATETIME_REGEX = re.compile(DATETIME_PATTERN)
+# the whole meta line: [page part |] position part | date part
+META_REGEX = re.compile(
+    r"^(?:[^|]*?(?P<page>\d+)[^|]*\| )?"
+    r"[^|]* (?P<start>\d+)(?:-(?P<end>\d+))? \| "
+    r"[^|]*?" + DATETIME_PATTERN + r"$"
+)
 
 
 def parse_clipping(text: str) -> Clipping:
@@ -28,11 +102,28 @@ def parse_clipping(text: str) -> Clipping:
         return Note.from_clipping(text)
 
     else:
-        print("first line:::", first_line.split())
         raise ValueError("Unknown clipping type. Cannot parse the text.")
 
 
+def group_clippings_by_book(
+    clippings: Iterable[Clipping],
+) -> dict[tuple[str, str], list[Clipping]]:
+    """
+    Groups the clippings by (book_title, author) in a single pass.
+    The books and the clippings of every book keep the order in which they were seen.
+    """
+    clippings_by_book: defaultdict[tuple[str, str], list[Clipping]] = defaultdict(list)
+    for clipping in clippings:
+        clippings_by_book[(clipping.book_title, clipping.author)].append(clipping)
+    return dict(clippings_by_book)
+
+
 class Clipping:
+    # slots instead of a __dict__ keep the many clippings of a library small
+    __slots__ = ("book_title", "created_at", "position", "page", "author", "text")
+    # the order of the fields in the repr
+    _repr_fields = __slots__
+
     def __init__(
         self,
         book_title: str,
@@ -51,7 +142,7 @@ class Clipping:
 
     def __repr__(self):
         class_name = self.__class__.__name__
-        return f"{class_name}({', '.join([f'{key}={value}' for key, value in self.__dict__.items()])})"
+        return f"{class_name}({', '.join([f'{key}={getattr(self, key)}' for key in self._repr_fields])})"
 
     @classmethod
     def from_clipping(cls, text: str):
@@ -61,16 +152,24 @@ class Clipping:
         author = title_and_author.split("(")[-1].replace(")", "")
         title = title_and_author.split("(" + author)[0].strip().replace("\ufeff", "")
         meta = lines[1]
-        meta_debugs = meta.split(" | ")
-
-        if len(meta_debugs) == 2:
-            first_meta, second_meta = meta_debugs
+        match = META_REGEX.match(meta)
+        if match:
+            page = int(match["page"]) if match["page"] else None
+            start = int(match["start"])
+            position = (start, int(match["end"])) if match["end"] else start
+            created_at = datetime_from_match(match)
         else:
-            page_meta, first_meta, second_meta = meta_debugs
-            page = extract_page(page_meta)
-
-        position = extract_positions(first_meta)
-        created_at = extract_datetime(second_meta)
+            # unusual meta lines are split into their parts, which tells what is wrong
+            meta_debugs = meta.split(" | ")
+            page = None
+            if len(meta_debugs) == 2:
+                first_meta, second_meta = meta_debugs
+            else:
+                page_meta, first_meta, second_meta = meta_debugs
+                page = extract_page(page_meta)
+
+            position = extract_positions(first_meta)
+            created_at = extract_datetime(second_meta)
         if len(lines) > 2:
             clipping_text = lines[2]
         else:
@@ -81,12 +180,16 @@ class Clipping:
             created_at=created_at,
             position=position,
             author=author,
-            page=page if "page" in locals() else None,
+            page=page,
             text=clipping_text,
         )
 
 
 class Note(Clipping):
+    __slots__ = ()
+    # the text of a note comes first in its repr
+    _repr_fields = ("text", "book_title", "created_at", "position", "page", "author")
+
     def __init__(
         self,
         book_title: str,
@@ -96,29 +199,22 @@ class Note(Clipping):
         author: str,
         page: int | None = None,
     ):
-        self.text = text
         super().__init__(book_title, created_at, position, author, page, text)
 
     @classmethod
     def from_clipping(cls, text: str) -> Note:
-        clipping = super().from_clipping(text)
-        position = clipping.position
+        # the base class already creates an instance of cls
+        note = super().from_clipping(text)
 
-        if not isinstance(position, int):
+        if not isinstance(note.position, int):
             raise ValueError("Position should be a single integer for notes.")
 
-        note = cls(
-            book_title=clipping.book_title,
-            created_at=clipping.created_at,
-            text=clipping.text,
-            position=position,
-            author=clipping.author,
-            page=clipping.page,
-        )
         return note
 
 
 class Bookmark(Clipping):
+    __slots__ = ()
+
     def __init__(
         self,
         book_title: str,
@@ -130,12 +226,10 @@ class Bookmark(Clipping):
     ):
         super().__init__(book_title, created_at, position, author, page)
 
-    def __repr__(self):
-        class_name = self.__class__.__name__
-        return f"{class_name}({', '.join([f'{key}={value}' for key, value in self.__dict__.items()])})"
-
 
 class Highlight(Clipping):
+    __slots__ = ()
+
     def __init__(
         self,
         position: tuple[int, int],
@@ -149,32 +243,58 @@ class Highlight(Clipping):
 
 
 def extract_page(text: str) -> int:
-    match = re.search(r"(\d+)", text)
+    match = PAGE_REGEX.search(text)
     if match:
         return int(match.group())
     else:
         raise ValueError("Invalid page")
 
 
+def datetime_from_match(match: re.Match) -> datetime:
+    if match["month"]:
+        day, month, year = match["day"], match["month"], match["year"]
+    else:
+        day, month, year = match["day_us"], match["month_us"], match["year_us"]
+    month_number = MONTH_NUMBERS.get(month.lower())
+    if month_number is None:
+        raise ValueError(f"Unknown month {month}")
+    hour = int(match["hour"])
+    if match["ampm"]:
+        hour = hour % 12 + (12 if match["ampm"] == "PM" else 0)
+    return datetime(
+        int(year),
+        month_number,
+        int(day),
+        hour,
+        int(match["minute"]),
+        int(match["second"]),
+    )
+
+
 def extract_datetime(text: str) -> datetime:
-    match = re.search(r"(\d{1,2}\. \w+ \d{4}) (\d{2}:\d{2}:\d{2})", text)
+    match = DATETIME_REGEX.search(text)
     if match:
-        date_str, time_str = match.groups()
-        return datetime.strptime(f"{date_str} {time_str}", "%d. %B %Y %H:%M:%S")
+        return datetime_from_match(match)
     else:
         raise ValueError("Invalid datetime")
 
 
+def format_datetime(value: datetime, language: str = "de") -> str:
+    """
+    Formats a datetime like strftime("%A, %d. %B %Y %H:%M") in the given language.
+    """
+    weekday = WEEKDAYS[language][value.weekday()]
+    month = MONTHS[language][value.month - 1]
+    return f"{weekday}, {value.day:02d}. {month} {value.year} {value:%H:%M}"
+
+
 def extract_positions(text: str) -> int | tuple[int, int]:
     """
     Extracts the start and end positions from the first meta part of the highlight"""
-    range_match = re.search(r" (\d+)-(\d+)$", text)
-    single_match = re.search(r" (\d+)$", text)
-    if range_match:
-        start, end = map(int, range_match.groups())
-        return start, end
-    elif single_match:
-        position = int(single_match.group(1))
-        return position
-    else:
+    match = POSITION_REGEX.search(text)
+    if match is None:
         raise ValueError("Invalid position")
+    start, end = match.groups()
+    if end is not None:
+        return int(start), int(end)
+    return int(start)
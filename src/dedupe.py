@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import heapq
+import random
+import zlib
+
+from collections import defaultdict
+from typing import Callable, Sequence, TypeVar
+
+T = TypeVar("T")
+
+SHINGLE_SIZE = 5
+NUM_PERMUTATIONS = 32
+BANDS = 8
+PRIME = (1 << 61) - 1
+
+_rng = random.Random(0)
+PERMUTATIONS = [
+    (_rng.randrange(1, PRIME), _rng.randrange(PRIME)) for _ in range(NUM_PERMUTATIONS)
+]
+
+
+def shingles(text: str) -> set[int]:
+    """
+    Returns the hashes of the character shingles of the normalized text.
+    """
+    normalized = " ".join(text.lower().split())
+    if len(normalized) <= SHINGLE_SIZE:
+        return {zlib.crc32(normalized.encode("utf-8"))}
+    return {
+        zlib.crc32(normalized[i : i + SHINGLE_SIZE].encode("utf-8"))
+        for i in range(len(normalized) - SHINGLE_SIZE + 1)
+    }
+
+
+def minhash(hashes: set[int]) -> tuple[int, ...]:
+    return tuple(min((a * h + b) % PRIME for h in hashes) for a, b in PERMUTATIONS)
+
+
+def overlap(first: set[int], second: set[int]) -> float:
+    """
+    Returns the share of the shingles of the shorter text that are in the other one,
+    which is 1 if a highlight was only extended.
+    """
+    return len(first & second) / min(len(first), len(second))
+
+
+def position_range(position) -> tuple[int, int] | None:
+    if position is None:
+        return None
+    if isinstance(position, tuple):
+        return position
+    return position, position
+
+
+def collapse_near_duplicates(
+    items: Sequence[T],
+    text: Callable[[T], str | None] = lambda item: item.text,
+    position: Callable[[T], int | tuple[int, int] | None] = lambda item: item.position,
+    threshold: float = 0.8,
+) -> list[T]:
+    """
+    Kindle stores a new clipping every time a highlight is extended or adjusted. This
+    keeps only the longest version of every group of such variants, in the original
+    order of the items; of equally long versions the last one is kept.
+
+    Two items are variants if their texts overlap by at least threshold and, if both
+    have a position, their position ranges overlap. Items with positions are compared
+    with the items whose range overlaps theirs, the others are paired up by locality
+    sensitive hashing of their MinHash signatures, so the work grows about linearly
+    with the number of items.
+    """
+    texts = [text(item) or "" for item in items]
+    # most highlights have no candidates, so the shingles are only built when needed
+    shingle_sets: dict[int, set[int]] = {}
+
+    def shingles_of(i: int) -> set[int]:
+        if i not in shingle_sets:
+            shingle_sets[i] = shingles(texts[i])
+        return shingle_sets[i]
+
+    ranges = [position_range(position(item)) for item in items]
+
+    parent = list(range(len(items)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def compare(i: int, j: int):
+        if find(i) != find(j) and overlap(shingles_of(i), shingles_of(j)) >= threshold:
+            parent[find(i)] = find(j)
+
+    # sweep over the position ranges, active holds (end, index) of the open ranges
+    active: list[tuple[int, int]] = []
+    for start, end, i in sorted(
+        (r[0], r[1], i) for i, r in enumerate(ranges) if r is not None
+    ):
+        while active and active[0][0] < start:
+            heapq.heappop(active)
+        for _, j in active:
+            compare(i, j)
+        heapq.heappush(active, (end, i))
+
+    # locality sensitive hashing for the items without a position
+    rows = NUM_PERMUTATIONS // BANDS
+    buckets: defaultdict[tuple, list[int]] = defaultdict(list)
+    for i, item_range in enumerate(ranges):
+        if item_range is not None:
+            continue
+        signature = minhash(shingles_of(i))
+        for band in range(BANDS):
+            buckets[(band, signature[band * rows : (band + 1) * rows])].append(i)
+    for bucket in buckets.values():
+        for index, i in enumerate(bucket):
+            for j in bucket[:index]:
+                compare(i, j)
+
+    # keep the longest, and of those the last, version of every group
+    kept: dict[int, int] = {}
+    for i, item_text in enumerate(texts):
+        root = find(i)
+        if root not in kept or len(item_text) >= len(texts[kept[root]]):
+            kept[root] = i
+    keep = set(kept.values())
+    return [item for i, item in enumerate(items) if i in keep]
@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import struct
+import sys
+
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable
+
+from src.checkpoint import Checkpoint, scan_appended
+from src.clippings import Bookmark, Clipping, Highlight, Note, extract_datetime
+from src.scanner import Record, RecordScanner
+
+MAGIC = b"KCINDEX1"
+# magic, checkpoint offset, checkpoint digest, number of books, number of records
+HEADER = struct.Struct("<8sQ64sII")
+TITLE_LENGTH = struct.Struct("<I")
+# the clipping classes by their code in the index, 0 is a record of unknown type
+KINDS: list[type[Clipping] | None] = [None, Highlight, Note, Bookmark]
+KIND_CODES = {kind: code for code, kind in enumerate(KINDS)}
+NO_TIMESTAMP = -1
+EPOCH = datetime(1970, 1, 1)
+
+
+def timestamp(meta: str) -> int:
+    """
+    Returns the time a clipping was added as seconds since 1970, read from its meta
+    line, or NO_TIMESTAMP if the line has no valid date.
+    """
+    try:
+        created_at = extract_datetime(meta.rpartition("|")[2])
+    except ValueError:
+        return NO_TIMESTAMP
+    return int((created_at - EPOCH).total_seconds())
+
+
+class ClippingIndex:
+    """
+    An index of the records of a clippings file, for reading the clippings of some
+    books or of a time span without scanning the whole file.
+
+    For every record it keeps the byte offset, the length, the type, the id of the
+    book and the time it was added, in columns in the order of the file. The book
+    ids number the title lines in the order the books first appear. update adds the
+    records appended since the last update, so the index is only built once.
+
+        index = ClippingIndex.load(path) or ClippingIndex()
+        index.update("My Clippings.txt")
+        index.save(path)
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.checkpoint = Checkpoint()
+        self.titles: list[bytes] = []
+        self.book_numbers: dict[bytes, int] = {}
+        self.offsets = array("Q")
+        self.lengths = array("I")
+        self.kinds = array("B")
+        self.books = array("I")
+        self.timestamps = array("q")
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def columns(self) -> list[array]:
+        return [self.offsets, self.lengths, self.kinds, self.books, self.timestamps]
+
+    @classmethod
+    def load(cls, path: Path) -> ClippingIndex | None:
+        """
+        Returns the index saved at path, or None if there is none or it is invalid.
+        """
+        if not path.exists():
+            return None
+        data = path.read_bytes()
+        if len(data) < HEADER.size:
+            return None
+        magic, offset, digest, book_count, record_count = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            return None
+
+        index = cls()
+        index.checkpoint = Checkpoint(offset, digest.decode("ascii"))
+        position = HEADER.size
+        try:
+            for book in range(book_count):
+                (length,) = TITLE_LENGTH.unpack_from(data, position)
+                position += TITLE_LENGTH.size
+                title = data[position : position + length]
+                position += length
+                index.titles.append(title)
+                index.book_numbers[title] = book
+            for column in index.columns():
+                size = column.itemsize * record_count
+                column.frombytes(data[position : position + size])
+                position += size
+        except (struct.error, ValueError):
+            return None
+        if position != len(data):
+            return None
+        if sys.byteorder == "big":
+            for column in index.columns():
+                column.byteswap()
+        return index
+
+    def save(self, path: Path):
+        parts = [
+            HEADER.pack(
+                MAGIC,
+                self.checkpoint.offset,
+                self.checkpoint.digest.encode("ascii"),
+                len(self.titles),
+                len(self),
+            )
+        ]
+        for title in self.titles:
+            parts.append(TITLE_LENGTH.pack(len(title)))
+            parts.append(title)
+        for column in self.columns():
+            if sys.byteorder == "big":
+                column = array(column.typecode, column)
+                column.byteswap()
+            parts.append(column.tobytes())
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        tmp_path.write_bytes(b"".join(parts))
+        tmp_path.replace(path)
+
+    def update(self, source_file: str | Path) -> int:
+        """
+        Adds the records appended to the clippings file since the last update. If the
+        file was edited or replaced, the index is built again.
+        Returns the number of the first new record.
+        """
+        start, checkpoint = scan_appended(Path(source_file), self.checkpoint)
+        if start == 0:
+            self.clear()
+        first_new = len(self)
+
+        with RecordScanner(source_file, errors="replace") as scanner:
+            for record in scanner.records(start):
+                # a record that is still being written is indexed once it is complete
+                if record.offset >= checkpoint.offset:
+                    break
+                title = scanner.title_key(record)
+                book = self.book_numbers.get(title)
+                if book is None:
+                    book = self.book_numbers[title] = len(self.titles)
+                    self.titles.append(title)
+                self.offsets.append(record.offset)
+                self.lengths.append(record.length)
+                self.kinds.append(KIND_CODES[record.kind])
+                self.books.append(book)
+                self.timestamps.append(timestamp(scanner.meta(record)))
+
+        self.checkpoint = checkpoint
+        return first_new
+
+    def title(self, book: int, encoding: str = "utf-8") -> str:
+        return self.titles[book].decode(encoding, "replace")
+
+    def book_id(self, title: str, encoding: str = "utf-8") -> int | None:
+        """
+        Returns the id of the book with the title line, e.g. "Sapiens (Yuval Harari)".
+        """
+        return self.book_numbers.get(title.encode(encoding))
+
+    def first_record_at(self, offset: int) -> int:
+        """
+        Returns the number of the first record that starts at or after the byte offset.
+        """
+        return bisect_left(self.offsets, offset)
+
+    def book_ids(self, start: int = 0) -> set[int]:
+        """
+        Returns the ids of the books of the records from record number start on.
+        """
+        return set(self.books[start:])
+
+    def record(self, number: int) -> Record:
+        return Record(
+            self.offsets[number], self.lengths[number], KINDS[self.kinds[number]]
+        )
+
+    def find(
+        self,
+        books: Iterable[int] | None = None,
+        kinds: Iterable[type[Clipping] | None] | None = None,
+        since: datetime | None = None,
+        until: datetime | None = None,
+    ) -> list[Record]:
+        """
+        Returns the records, in the order of the file, that match all given filters:
+        the ids of their books, their clipping classes and the time they were added,
+        where since is inclusive and until is exclusive.
+        """
+        numbers: Iterable[int] = range(len(self))
+        if books is not None:
+            books = set(books)
+            numbers = [i for i, book in enumerate(self.books) if book in books]
+        if kinds is not None:
+            codes = {KIND_CODES[kind] for kind in kinds}
+            numbers = [i for i in numbers if self.kinds[i] in codes]
+        if since is not None:
+            low = int((since - EPOCH).total_seconds())
+            numbers = [i for i in numbers if self.timestamps[i] >= low]
+        if until is not None:
+            high = int((until - EPOCH).total_seconds())
+            numbers = [
+                i
+                for i in numbers
+                if self.timestamps[i] != NO_TIMESTAMP and self.timestamps[i] < high
+            ]
+        return [self.record(i) for i in numbers]
@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+from typing import Any, Callable, Sequence
+
+
+def run_jobs(
+    function: Callable[..., Any], arguments: Sequence[tuple], jobs: int = 1
+) -> list[tuple[Any, Exception | None]]:
+    """
+    Calls function once for every tuple of arguments, in a pool of jobs processes if
+    jobs is larger than 1, else one after the other in this process.
+
+    An exception of one call does not stop the others. The result is a list of
+    (return value, exception) pairs in the order of the arguments, where the exception
+    is None for the calls that succeeded.
+    """
+    results: list[tuple[Any, Exception | None]] = []
+    if jobs <= 1 or len(arguments) <= 1:
+        for args in arguments:
+            try:
+                results.append((function(*args), None))
+            except Exception as error:
+                results.append((None, error))
+        return results
+
+    # imported here, so that the runs in one process do not pay for it at startup
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=min(jobs, len(arguments))) as executor:
+        futures = [executor.submit(function, *args) for args in arguments]
+        for future in futures:
+            try:
+                results.append((future.result(), None))
+            except Exception as error:
+                results.append((None, error))
+    return results
@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import hashlib
+import json
+
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable
+
+if TYPE_CHECKING:
+    from src.clippings import Clipping
+
+# marks the digests of books that had nothing to write, so that they have no file
+EMPTY_SUFFIX = ":empty"
+
+
+class Manifest:
+    """
+    Maps every output file to the digest of the content and render options it was
+    created from, so that books which did not change are neither rendered nor written.
+    """
+
+    def __init__(self, digests: dict[str, str] | None = None):
+        self.digests = digests if digests is not None else {}
+        self.changed = False
+
+    def __repr__(self):
+        return f"Manifest(digests={self.digests})"
+
+    @classmethod
+    def load(cls, path: Path) -> Manifest:
+        if not path.exists():
+            return cls()
+        try:
+            digests = json.loads(path.read_text(encoding="utf-8"))
+        except ValueError:
+            return cls()
+        if not isinstance(digests, dict):
+            return cls()
+        return cls({str(key): str(value) for key, value in digests.items()})
+
+    def save(self, path: Path):
+        if not self.changed:
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        tmp_path.write_text(
+            json.dumps(self.digests, indent=1, sort_keys=True), encoding="utf-8"
+        )
+        tmp_path.replace(path)
+        self.changed = False
+
+    def is_current(self, output_file: Path, digest: str) -> bool:
+        """
+        Returns True if output_file exists and was created from the same digest, or
+        does not exist because the same digest had nothing to write.
+        """
+        recorded = self.digests.get(output_file.name)
+        if recorded == digest + EMPTY_SUFFIX:
+            return not output_file.exists()
+        return recorded == digest and output_file.exists()
+
+    def update(self, output_file: Path, digest: str, empty: bool = False):
+        """
+        Records the digest output_file was created from. empty means that there was
+        nothing to write, so output_file does not exist.
+        """
+        if empty:
+            digest += EMPTY_SUFFIX
+        if self.digests.get(output_file.name) != digest:
+            self.digests[output_file.name] = digest
+            self.changed = True
+
+
+def digest_options(hasher, options: dict):
+    hasher.update(json.dumps(options, sort_keys=True, default=str).encode("utf-8"))
+    hasher.update(b"\0")
+
+
+def digest_clippings(clippings: Iterable[Clipping], **options) -> str:
+    """
+    Returns a digest of the clippings of a book and the options they are rendered with.
+    """
+    hasher = hashlib.sha256()
+    digest_options(hasher, options)
+    for clipping in clippings:
+        row = [
+            type(clipping).__name__,
+            clipping.book_title,
+            clipping.author,
+            clipping.position,
+            clipping.page,
+            clipping.created_at.isoformat(),
+            clipping.text,
+        ]
+        hasher.update(json.dumps(row, ensure_ascii=False).encode("utf-8"))
+        hasher.update(b"\n")
+    return hasher.hexdigest()
+
+
+def digest_text(text: str, **options) -> str:
+    """
+    Returns a digest of a text file and the options it is converted with.
+    """
+    hasher = hashlib.sha256()
+    digest_options(hasher, options)
+    hasher.update(text.encode("utf-8"))
+    return hasher.hexdigest()
@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+from heapq import heappop, heappush
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from src.clippings import Highlight, Note
+
+
+def match_notes_and_highlights(
+    notes: list[Note],
+    highlights: list[Highlight],
+    tolerance: int = 0,
+    match_inside: bool = True,
+) -> tuple[list[tuple[Note, Highlight]], list[Note], set[Highlight]]:
+    """match the notes and highlights that belong together using an index of highlights
+
+    A note belongs to the highlight that ends at the position of the note. If there is
+    none, the highlight whose end is closest to the note within tolerance positions is
+    used, and if match_inside is set, the highlight whose range contains the note.
+
+    Args:
+        notes (list[Note]): the notes of one book
+        highlights (list[Highlight]): the highlights of the same book
+        tolerance (int): how far the end of a highlight may be away from the note
+        match_inside (bool): also match notes that fall inside a highlight
+
+    Returns:
+        the matched (note, highlight) pairs, the unmatched notes and the unmatched
+        highlights
+    """
+    # first highlight for every end position, like the order of the plain scan
+    highlights_by_end: dict[int, Highlight] = {}
+    for highlight in highlights:
+        highlights_by_end.setdefault(highlight.position[1], highlight)
+
+    # the highlight that contains a note position and ends first, found by sweeping
+    # the positions in order with a heap of the highlights started so far by end
+    inside: dict[int, Highlight] = {}
+    if match_inside:
+        order = sorted(range(len(highlights)), key=lambda i: highlights[i].position[0])
+        started: list[tuple[int, int]] = []
+        j = 0
+        for position in sorted({note.position for note in notes}):
+            while j < len(order) and highlights[order[j]].position[0] <= position:
+                heappush(started, (highlights[order[j]].position[1], order[j]))
+                j += 1
+            # a highlight that ends before this position ends before the next ones too
+            while started and started[0][0] < position:
+                heappop(started)
+            if started:
+                inside[position] = highlights[started[0][1]]
+
+    def find_highlight(position: int) -> Highlight | None:
+        for distance in range(tolerance + 1):
+            for end in (position + distance, position - distance):
+                if end in highlights_by_end:
+                    return highlights_by_end[end]
+
+        return inside.get(position)
+
+    matched_notes_and_highlights = []
+    unmatched_notes = []
+    for note in notes:
+        highlight = find_highlight(note.position)
+        if highlight is None:
+            unmatched_notes.append(note)
+        else:
+            matched_notes_and_highlights.append((note, highlight))
+
+    matched_highlights = {highlight for note, highlight in matched_notes_and_highlights}
+    unmatched_highlights = set(highlights) - matched_highlights
+    return matched_notes_and_highlights, unmatched_notes, unmatched_highlights
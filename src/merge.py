@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import hashlib
+import heapq
+import os
+
+from pathlib import Path
+from typing import Iterator, Sequence
+
+from src.clippings import Clipping
+from src.scanner import RecordScanner
+
+CHUNK_SIZE = 1 << 20
+
+
+def is_prefix_of(smaller: Path, larger: Path) -> bool:
+    """
+    Returns whether the content of smaller is the start of the content of larger.
+    Files of different devices differ within the first chunk, so usually only the
+    copies of the same device are read to the end.
+    """
+    if smaller.stat().st_size > larger.stat().st_size:
+        return False
+    with open(smaller, "rb") as small, open(larger, "rb") as large:
+        while True:
+            chunk = small.read(CHUNK_SIZE)
+            if not chunk:
+                return True
+            if large.read(len(chunk)) != chunk:
+                return False
+
+
+def latest_snapshots(paths: Sequence[str | os.PathLike]) -> list[Path]:
+    """
+    Drops the clippings files that are a prefix of another one. My Clippings.txt is
+    append-only, so these are older snapshots of the same device, whose clippings are
+    all in the newer snapshot. The other files keep their order.
+    """
+    files = [Path(path) for path in paths]
+    kept: list[Path] = []
+    for path in sorted(files, key=lambda path: path.stat().st_size, reverse=True):
+        if not any(is_prefix_of(path, larger) for larger in kept):
+            kept.append(path)
+    return [path for path in files if path in kept]
+
+
+def clipping_key(clipping: Clipping) -> int:
+    """
+    Returns a 64 bit hash of (book, position, text), which is the same for the copies
+    of a clipping on several devices or in several snapshots.
+    """
+    key = "\0".join(
+        [
+            clipping.book_title,
+            clipping.author,
+            str(clipping.position),
+            clipping.text or "",
+        ]
+    )
+    return int.from_bytes(
+        hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little"
+    )
+
+
+def iter_source(path: Path) -> Iterator[tuple[Clipping, str]]:
+    """
+    Yields the clippings of a clippings file with their record text, parsed lazily.
+    """
+    with RecordScanner(path) as scanner:
+        for record in scanner.records():
+            text = scanner.text(record)
+            yield scanner.parse(record), text
+
+
+def merge_sources(
+    paths: Sequence[str | os.PathLike],
+) -> Iterator[tuple[Clipping, str]]:
+    """
+    Merges the clippings of several clippings files, e.g. of several Kindles and their
+    snapshots in .sync, into one stream ordered by created_at and yields every
+    clipping once with its record text, the first copy of it that was added.
+
+    The files are read in a streaming k-way merge, which relies on every file being
+    in the order its clippings were added, like My Clippings.txt. Snapshots that are a
+    prefix of a newer one are skipped, so the memory used depends on the number of
+    devices and the 8 byte key of every distinct clipping, not on the number of
+    snapshots.
+    """
+    sources = [iter_source(path) for path in latest_snapshots(paths)]
+    seen: set[int] = set()
+    for clipping, text in heapq.merge(*sources, key=lambda item: item[0].created_at):
+        key = clipping_key(clipping)
+        if key in seen:
+            continue
+        seen.add(key)
+        yield clipping, text
@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import os
+import stat
+import tempfile
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable
+
+WRITTEN = "written"
+UNCHANGED = "unchanged"
+
+
+class ExportReport:
+    """
+    What export_notes did: the number of notes written, unchanged and failed, the
+    bytes written and the seconds it took.
+    """
+
+    __slots__ = ["written", "unchanged", "failed", "bytes_written", "seconds"]
+
+    def __init__(self):
+        self.written = 0
+        self.unchanged = 0
+        self.failed: list[tuple[Path, Exception]] = []
+        self.bytes_written = 0
+        self.seconds = 0.0
+
+    def __repr__(self):
+        return (
+            f"ExportReport(written={self.written}, unchanged={self.unchanged}, "
+            f"failed={len(self.failed)})"
+        )
+
+    @property
+    def notes(self) -> int:
+        return self.written + self.unchanged + len(self.failed)
+
+    def summary(self) -> str:
+        seconds = max(self.seconds, 1e-9)
+        return (
+            f"Exported {self.notes} notes in {self.seconds:.2f}s "
+            f"({self.notes / seconds:.0f} notes/s): {self.written} written, "
+            f"{self.unchanged} unchanged, {len(self.failed)} failed, "
+            f"{self.bytes_written / 1024 / 1024 / seconds:.1f} MiB/s written"
+        )
+
+
+def default_mode() -> int:
+    """
+    Returns the mode open gives a new file under the umask of the process.
+    """
+    # the umask can only be read by setting it, so this is not done per note
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+def write_note(source: Path, target: Path, mode: int | None = None) -> tuple[str, int]:
+    """
+    Copies the note to target unless target already has the same content. The note
+    is written to a hidden file next to target first and renamed, so Obsidian never
+    sees a partly written note. The note keeps the mode of target, a new note gets
+    mode, by default the one of a file created with open.
+    Returns WRITTEN or UNCHANGED and the number of bytes written.
+    """
+    content = source.read_bytes()
+    try:
+        target_stat = target.stat()
+    except FileNotFoundError:
+        target_stat = None
+    if target_stat is not None:
+        if target_stat.st_size == len(content) and target.read_bytes() == content:
+            return UNCHANGED, 0
+        mode = stat.S_IMODE(target_stat.st_mode)
+    elif mode is None:
+        mode = default_mode()
+
+    # mkstemp creates the file only readable by the owner
+    fd, tmp_name = tempfile.mkstemp(
+        dir=target.parent, prefix=f".{target.name}.", suffix=".tmp"
+    )
+    tmp_path = Path(tmp_name)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            os.fchmod(f.fileno(), mode)
+            f.write(content)
+        os.replace(tmp_path, target)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return WRITTEN, len(content)
+
+
+def export_notes(
+    sources: Iterable[Path], vault: Path, folder: str = "", workers: int = 8
+) -> ExportReport:
+    """
+    Copies the markdown notes into the folder of the Obsidian vault directory, in a
+    pool of workers threads. Notes whose content is already in the vault are not
+    written again, so Obsidian only reindexes the notes that changed. A note that
+    fails does not stop the others. Of sources with the same file name, the last one
+    is exported.
+    """
+    start = time.perf_counter()
+    target_dir = vault / folder if folder else vault
+    target_dir.mkdir(parents=True, exist_ok=True)
+
+    # the notes are copied by name, so two workers must never share a target
+    sources = list({source.name: source for source in sources}.values())
+    report = ExportReport()
+    mode = default_mode()
+
+    def export(source: Path):
+        try:
+            return write_note(source, target_dir / source.name, mode), None
+        except Exception as error:
+            return None, error
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for source, (result, error) in zip(sources, executor.map(export, sources)):
+            if error is not None:
+                report.failed.append((source, error))
+                continue
+            status, size = result
+            if status == WRITTEN:
+                report.written += 1
+                report.bytes_written += size
+            else:
+                report.unchanged += 1
+
+    report.seconds = time.perf_counter() - start
+    return report
@@ -0,0 +1,577 @@
+from __future__ import annotations
+
+import io
+import re
+import zlib
+
+from functools import lru_cache
+from pathlib import Path
+from types import SimpleNamespace
+from typing import IO, Iterable
+
+from fpdf import FPDF
+from fpdf.php import UTF8ToUTF16BE
+from fpdf.ttfonts import TTFontFile
+
+from src.profiling import active as active_profiler
+
+FONT_FILE = Path(__file__).resolve().parent.parent / "media" / "Lisboa.ttf"
+FONT_FAMILY = "lisboa"
+META_PATTERN = re.compile(r"(Your.*\| Added on)")
+# the code points of a font are subset in blocks of 256, so that documents with
+# similar text share one subset
+BLOCK_BITS = 8
+TO_UNICODE = (
+    "/CIDInit /ProcSet findresource begin\n"
+    "12 dict begin\n"
+    "begincmap\n"
+    "/CIDSystemInfo\n"
+    "<</Registry (Adobe)\n"
+    "/Ordering (UCS)\n"
+    "/Supplement 0\n"
+    ">> def\n"
+    "/CMapName /Adobe-Identity-UCS def\n"
+    "/CMapType 2 def\n"
+    "1 begincodespacerange\n"
+    "<0000> <FFFF>\n"
+    "endcodespacerange\n"
+    "1 beginbfrange\n"
+    "<0000> <FFFF> <0000>\n"
+    "endbfrange\n"
+    "endcmap\n"
+    "CMapName currentdict /CMap defineresource pop\n"
+    "end\n"
+    "end"
+)
+
+
+class CodePoints(set):
+    """
+    The code points a document uses of a font. fpdf appends every character it
+    writes to the subset of the font, a set keeps each of them once.
+    """
+
+    append = set.add
+
+
+class FontSubset:
+    """
+    The embedded parts of a TrueType font for a set of Unicode blocks.
+    """
+
+    __slots__ = ["fontstream", "size", "widths", "cid_to_gid"]
+
+    def __init__(self, fontstream: bytes, size: int, widths: str, cid_to_gid: bytes):
+        self.fontstream = fontstream
+        self.size = size
+        self.widths = widths
+        self.cid_to_gid = cid_to_gid
+
+
+@lru_cache(maxsize=None)
+def font_metrics(path: str) -> dict:
+    """
+    Returns the metrics of a TrueType font like FPDF.add_font, parsed once per
+    process instead of being cached in a .pkl file next to the font.
+    """
+    ttf = TTFontFile()
+    ttf.getMetrics(path)
+    desc = {
+        "Ascent": int(round(ttf.ascent, 0)),
+        "Descent": int(round(ttf.descent, 0)),
+        "CapHeight": int(round(ttf.capHeight, 0)),
+        "Flags": ttf.flags,
+        "FontBBox": "[%s %s %s %s]" % tuple(int(round(v, 0)) for v in ttf.bbox),
+        "ItalicAngle": int(ttf.italicAngle),
+        "StemV": int(round(ttf.stemV, 0)),
+        "MissingWidth": int(round(ttf.defaultWidth, 0)),
+    }
+    return {
+        "name": re.sub("[ ()]", "", ttf.fullName),
+        "type": "TTF",
+        "desc": desc,
+        "up": round(ttf.underlinePosition),
+        "ut": round(ttf.underlineThickness),
+        "ttffile": path,
+        "originalsize": Path(path).stat().st_size,
+        "cw": ttf.charWidths,
+    }
+
+
+@lru_cache(maxsize=None)
+def font_subset(path: str, blocks: frozenset[int]) -> FontSubset:
+    """
+    Returns the subset of the font with every code point of the blocks, made once
+    per process for every combination of blocks.
+    """
+    widths = font_metrics(path)["cw"]
+    codes = [
+        code
+        for block in sorted(blocks)
+        for code in range(block << BLOCK_BITS, (block + 1) << BLOCK_BITS)
+        if code
+    ]
+    ttf = TTFontFile()
+    ttfontstream = ttf.makeSubset(path, codes)
+
+    lines: list[str] = []
+    FPDF._putTTfontwidths(
+        SimpleNamespace(_out=lines.append),
+        {"unifilename": None, "cw": widths, "subset": set(codes)},
+        ttf.maxUni,
+    )
+
+    cid_to_gid = bytearray(256 * 256 * 2)
+    for code, glyph in ttf.codeToGlyph.items():
+        cid_to_gid[code * 2] = glyph >> 8
+        cid_to_gid[code * 2 + 1] = glyph & 0xFF
+    return FontSubset(
+        zlib.compress(ttfontstream),
+        len(ttfontstream),
+        "\n".join(lines),
+        zlib.compress(bytes(cid_to_gid)),
+    )
+
+
+class StreamingPDF(FPDF):
+    """
+    An FPDF document that is written to stream while it is laid out: every page is
+    compressed and written when it ends, only the fonts, the outline and the cross
+    reference table are written when the document is closed. TrueType fonts are
+    parsed and subset once per process and shared by all documents.
+
+    Page number aliases and internal links are not supported.
+
+        with open("book.pdf", "wb") as f:
+            pdf = StreamingPDF(f)
+            pdf.add_page()
+            pdf.add_font("lisboa", "", str(FONT_FILE), uni=True)
+            ...
+            pdf.close()
+    """
+
+    def __init__(self, stream: IO[bytes] | None = None, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stream = stream if stream is not None else io.BytesIO()
+        self.position = 0
+        self.page_parts: list[str] = []
+        self.page_objects: list[int] = []
+        # (title, level, page, y) of every bookmark
+        self.outlines: list[tuple[str, int, int, float]] = []
+
+    def _write(self, s: str):
+        data = s.encode("latin1") + b"\n"
+        self.stream.write(data)
+        self.position += len(data)
+
+    def _out(self, s):
+        if isinstance(s, bytes):
+            s = s.decode("latin1")
+        elif not isinstance(s, str):
+            s = str(s)
+        if self.state == 2:
+            self.page_parts.append(s)
+        else:
+            self._write(s)
+
+    def _newobj(self):
+        self.n += 1
+        self.offsets[self.n] = self.position
+        self._out(str(self.n) + " 0 obj")
+
+    def open(self):
+        super().open()
+        self._putheader()
+
+    def add_font(self, family, style="", fname="", uni=False):
+        """
+        Adds a unicode TrueType font from its metrics cached in this process.
+        """
+        if not uni:
+            return super().add_font(family, style, fname, uni)
+        fontkey = family.lower() + style.upper()
+        if fontkey in self.fonts:
+            return
+        path = str(Path(fname).resolve())
+        font = dict(font_metrics(path))
+        font.update(
+            i=len(self.fonts) + 1,
+            fontkey=fontkey,
+            subset=CodePoints(range(32)),
+            unifilename=None,
+        )
+        self.fonts[fontkey] = font
+        self.font_files[fontkey] = {
+            "length1": font["originalsize"],
+            "type": "TTF",
+            "ttffile": path,
+        }
+
+    def get_string_width(self, s):
+        if not self.unifontsubset:
+            return super().get_string_width(s)
+        widths = self.current_font["cw"]
+        try:
+            width = sum(map(widths.__getitem__, map(ord, s)))
+        except IndexError:
+            return super().get_string_width(s)
+        return width * self.font_size / 1000.0
+
+    def bookmark(self, title: str, level: int = 0, y: float = -1):
+        """
+        Adds an entry to the outline of the document that points to y on the current
+        page, the current position by default.
+        """
+        if y == -1:
+            y = self.y
+        self.outlines.append((title, level, self.page, y))
+
+    def _beginpage(self, orientation):
+        super()._beginpage(orientation)
+        # the content is kept in page_parts, see _out
+        del self.pages[self.page]
+
+    def _endpage(self):
+        if self.state != 2:
+            return
+        self.state = 1
+        if self.page in self.orientation_changes:
+            w_pt, h_pt = self.fh_pt, self.fw_pt
+        else:
+            w_pt, h_pt = self.fw_pt, self.fh_pt
+        content = ("\n".join(self.page_parts) + "\n").encode("latin1")
+        self.page_parts = []
+        if self.compress:
+            content = zlib.compress(content)
+            filter = "/Filter /FlateDecode "
+        else:
+            filter = ""
+
+        self._newobj()
+        self.page_objects.append(self.n)
+        self._out("<</Type /Page")
+        self._out("/Parent 1 0 R")
+        if self.page in self.orientation_changes:
+            self._out("/MediaBox [0 0 %.2f %.2f]" % (w_pt, h_pt))
+        self._out("/Resources 2 0 R")
+        if self.pdf_version > "1.3":
+            self._out("/Group <</Type /Group /S /Transparency /CS /DeviceRGB>>")
+        self._out("/Contents " + str(self.n + 1) + " 0 R>>")
+        self._out("endobj")
+        self._newobj()
+        self._out("<<" + filter + "/Length " + str(len(content)) + ">>")
+        self._putstream(content)
+        self._out("endobj")
+
+    def _putfonts(self):
+        fonts = self.fonts
+        truetype = {key: font for key, font in fonts.items() if font["type"] == "TTF"}
+        self.fonts = {key: font for key, font in fonts.items() if key not in truetype}
+        try:
+            super()._putfonts()
+        finally:
+            self.fonts = fonts
+        for font in truetype.values():
+            self._puttruetype(font)
+
+    def _puttruetype(self, font: dict):
+        """
+        Writes a TrueType font like FPDF._putfonts, with the subset of the blocks of
+        the code points the document uses.
+        """
+        blocks = frozenset(code >> BLOCK_BITS for code in font["subset"]) | {0}
+        subset = font_subset(font["ttffile"], blocks)
+        fontname = "MPDFAA+" + font["name"]
+        font["n"] = self.n + 1
+
+        self._newobj()
+        self._out("<</Type /Font")
+        self._out("/Subtype /Type0")
+        self._out("/BaseFont /" + fontname)
+        self._out("/Encoding /Identity-H")
+        self._out("/DescendantFonts [" + str(self.n + 1) + " 0 R]")
+        self._out("/ToUnicode " + str(self.n + 2) + " 0 R")
+        self._out(">>")
+        self._out("endobj")
+
+        self._newobj()
+        self._out("<</Type /Font")
+        self._out("/Subtype /CIDFontType2")
+        self._out("/BaseFont /" + fontname)
+        self._out("/CIDSystemInfo " + str(self.n + 2) + " 0 R")
+        self._out("/FontDescriptor " + str(self.n + 3) + " 0 R")
+        if font["desc"].get("MissingWidth"):
+            self._out("/DW %d" % font["desc"]["MissingWidth"])
+        self._out(subset.widths)
+        self._out("/CIDToGIDMap " + str(self.n + 4) + " 0 R")
+        self._out(">>")
+        self._out("endobj")
+
+        self._newobj()
+        self._out("<</Length " + str(len(TO_UNICODE)) + ">>")
+        self._putstream(TO_UNICODE)
+        self._out("endobj")
+
+        self._newobj()
+        self._out("<</Registry (Adobe)")
+        self._out("/Ordering (UCS)")
+        self._out("/Supplement 0")
+        self._out(">>")
+        self._out("endobj")
+
+        self._newobj()
+        self._out("<</Type /FontDescriptor")
+        self._out("/FontName /" + fontname)
+        for key in (
+            "Ascent",
+            "Descent",
+            "CapHeight",
+            "Flags",
+            "FontBBox",
+            "ItalicAngle",
+            "StemV",
+            "MissingWidth",
+        ):
+            value = font["desc"][key]
+            if key == "Flags":
+                # not symbolic
+                value = (value | 4) & ~32
+            self._out(" /%s %s" % (key, value))
+        self._out("/FontFile2 " + str(self.n + 2) + " 0 R")
+        self._out(">>")
+        self._out("endobj")
+
+        self._newobj()
+        self._out("<</Length " + str(len(subset.cid_to_gid)))
+        self._out("/Filter /FlateDecode")
+        self._out(">>")
+        self._putstream(subset.cid_to_gid)
+        self._out("endobj")
+
+        self._newobj()
+        self._out("<</Length " + str(len(subset.fontstream)))
+        self._out("/Filter /FlateDecode")
+        self._out("/Length1 " + str(subset.size))
+        self._out(">>")
+        self._putstream(subset.fontstream)
+        self._out("endobj")
+
+    def _putresources(self):
+        self._putfonts()
+        self._putimages()
+        self.offsets[2] = self.position
+        self._out("2 0 obj")
+        self._out("<<")
+        self._putresourcedict()
+        self._out(">>")
+        self._out("endobj")
+
+    def _putoutlines(self) -> int | None:
+        """
+        Writes the outline items and returns the number of the outline dictionary,
+        None if the document has no bookmarks.
+        """
+        if not self.outlines:
+            return None
+        count = len(self.outlines)
+        first = self.n + 1
+        parents: list[int | None] = [None] * count
+        previous: list[int | None] = [None] * count
+        following: list[int | None] = [None] * count
+        firsts: list[int | None] = [None] * count
+        lasts: list[int | None] = [None] * count
+        # the last item seen on every level
+        last_on_level: dict[int, int] = {}
+        level = 0
+        for i, (_, item_level, _, _) in enumerate(self.outlines):
+            if item_level > 0:
+                parent = last_on_level[item_level - 1]
+                parents[i] = parent
+                lasts[parent] = i
+                if item_level > level:
+                    firsts[parent] = i
+            if item_level <= level and i > 0 and item_level in last_on_level:
+                before = last_on_level[item_level]
+                following[before] = i
+                previous[i] = before
+            last_on_level[item_level] = i
+            level = item_level
+
+        root = first + count
+        for i, (title, _, page, y) in enumerate(self.outlines):
+            self._newobj()
+            self._out("<</Title " + self._textstring(UTF8ToUTF16BE(title)))
+            parent = parents[i]
+            self._out("/Parent %d 0 R" % (root if parent is None else first + parent))
+            for name, item in (
+                ("Prev", previous[i]),
+                ("Next", following[i]),
+                ("First", firsts[i]),
+                ("Last", lasts[i]),
+            ):
+                if item is not None:
+                    self._out("/%s %d 0 R" % (name, first + item))
+            self._out(
+                "/Dest [%d 0 R /XYZ 0 %.2f null]"
+                % (self.page_objects[page - 1], (self.h - y) * self.k)
+            )
+            self._out("/Count 0>>")
+            self._out("endobj")
+
+        self._newobj()
+        self._out("<</Type /Outlines /First %d 0 R" % first)
+        self._out("/Last %d 0 R>>" % (first + last_on_level[0]))
+        self._out("endobj")
+        return root
+
+    def _enddoc(self):
+        self.offsets[1] = self.position
+        self._out("1 0 obj")
+        self._out("<</Type /Pages")
+        self._out("/Kids [" + "".join(f"{n} 0 R " for n in self.page_objects) + "]")
+        self._out("/Count " + str(len(self.page_objects)))
+        self._out("/MediaBox [0 0 %.2f %.2f]" % (self.fw_pt, self.fh_pt))
+        self._out(">>")
+        self._out("endobj")
+        self._putresources()
+        outlines = self._putoutlines()
+
+        self._newobj()
+        self._out("<<")
+        self._putinfo()
+        self._out(">>")
+        self._out("endobj")
+
+        self._newobj()
+        self._out("<<")
+        self._putcatalog()
+        if outlines is not None:
+            self._out("/Outlines %d 0 R" % outlines)
+            if len(self.outlines) > 1:
+                self._out("/PageMode /UseOutlines")
+        self._out(">>")
+        self._out("endobj")
+
+        xref = self.position
+        self._out("xref")
+        self._out("0 " + str(self.n + 1))
+        self._out("0000000000 65535 f ")
+        for i in range(1, self.n + 1):
+            self._out("%010d 00000 n " % self.offsets[i])
+        self._out("trailer")
+        self._out("<<")
+        self._puttrailer()
+        self._out(">>")
+        self._out("startxref")
+        self._out(xref)
+        self._out("%%EOF")
+        self.state = 3
+
+    def output(self, name="", dest=""):
+        """
+        Closes the document. The document must have been written to memory for name
+        or dest "S".
+        """
+        self.close()
+        if not name and not dest:
+            return ""
+        if not isinstance(self.stream, io.BytesIO):
+            self.error("The document was written to a stream")
+        data = self.stream.getvalue()
+        if dest.upper() == "S":
+            return data.decode("latin1")
+        with open(name, "wb") as f:
+            f.write(data)
+        return ""
+
+
+def insert_line_break_in_pdf(pdf_file: FPDF, num_breaks: int = 1) -> FPDF:
+    """
+    Inserts a line break in a pdf for num_breaks times
+    """
+    while num_breaks != 0:
+        pdf_file.multi_cell(0, 5, "", 0)
+        num_breaks -= 1
+
+    return pdf_file
+
+
+def insert_bar_separator_in_pdf(pdf_file: FPDF):
+    """
+    Inserts a bar separator in a pdf, useful to separate highlights
+    """
+    pdf_file = insert_line_break_in_pdf(pdf_file)
+    pdf_file.set_draw_color(191, 191, 191)
+    pdf_file.line(40, pdf_file.y, 150, pdf_file.y)
+    pdf_file = insert_line_break_in_pdf(pdf_file)
+
+    return pdf_file
+
+
+def add_book(
+    pdf_file: FPDF,
+    highlights: Iterable[str],
+    include_clip_meta: bool = False,
+    title: str = "Your Notes And Highlights",
+) -> FPDF:
+    """
+    Adds the lines of a book text file on new pages, under its title, and a bookmark
+    to the title if the document supports them.
+    """
+    pdf_file.add_page()
+    pdf_file.add_font(FONT_FAMILY, "", str(FONT_FILE), uni=True)
+    pdf_file.set_font(FONT_FAMILY, "", 22)
+    pdf_file.set_margins(25, 40, 25)
+    pdf_file = insert_line_break_in_pdf(pdf_file, 3)
+    if isinstance(pdf_file, StreamingPDF):
+        pdf_file.bookmark(title)
+    pdf_file.multi_cell(0, 5, title, align="C")
+    pdf_file = insert_line_break_in_pdf(pdf_file, 2)
+
+    for highlight_line in highlights:
+        # create muti-cell pdf object and add text to it
+        if META_PATTERN.search(highlight_line):
+            pdf_file.set_font(FONT_FAMILY, "", 11)
+            pdf_file.set_text_color(77, 77, 77)
+            pdf_file.multi_cell(0, 5, highlight_line, 0)
+            pdf_file = insert_bar_separator_in_pdf(pdf_file)
+        elif len(highlight_line) < 10:
+            if not include_clip_meta and highlight_line == "...":
+                pdf_file = insert_bar_separator_in_pdf(pdf_file)
+            else:
+                continue
+        else:
+            pdf_file.set_font(FONT_FAMILY, "", 15)
+            pdf_file.set_text_color(0, 0, 0)
+            pdf_file.multi_cell(0, 5, highlight_line, 0)
+
+    return pdf_file
+
+
+def write_pdf(
+    path: Path,
+    books: Iterable[tuple[str, Iterable[str]]],
+    include_clip_meta: bool = False,
+):
+    """
+    Writes the (title, lines) of the books to one pdf at path, every book starting on
+    a new page with an entry in the outline. The file is replaced atomically.
+    """
+    cache_info = font_subset.cache_info()
+    tmp_path = path.with_name(path.name + ".tmp")
+    try:
+        with open(tmp_path, "wb") as f:
+            pdf_file = StreamingPDF(f)
+            for title, lines in books:
+                add_book(pdf_file, lines, include_clip_meta, title)
+            pdf_file.close()
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    tmp_path.replace(path)
+
+    profiler = active_profiler()
+    profiler.count("font_subset_hits", font_subset.cache_info().hits - cache_info.hits)
+    profiler.count(
+        "font_subset_misses", font_subset.cache_info().misses - cache_info.misses
+    )
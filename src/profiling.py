@@ -0,0 +1,285 @@
+from __future__ import annotations
+
+import json
+import time
+
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, Sequence
+
+from src.jobs import run_jobs
+
+
+class Stage:
+    """
+    Adds the time spent in a with block to a stage of the profiler.
+    """
+
+    __slots__ = ["profiler", "name", "start"]
+
+    def __init__(self, profiler: Profiler, name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.add(self.name, time.perf_counter() - self.start)
+
+
+class Profiler:
+    """
+    Collects the seconds and calls of the stages of a run, counters like the number
+    of parsed records or of outputs the manifest skipped, and the render time of
+    every book. A stage is timed as a whole, so stages can be part of other stages,
+    e.g. match is part of the render time of a book.
+    """
+
+    __slots__ = ["seconds", "calls", "counters", "books", "start"]
+    enabled = True
+
+    def __init__(self):
+        self.seconds: dict[str, float] = {}
+        self.calls: dict[str, int] = {}
+        self.counters: dict[str, int] = {}
+        self.books: dict[str, float] = {}
+        self.start = time.perf_counter()
+
+    def stage(self, name: str) -> Stage:
+        return Stage(self, name)
+
+    def add(self, name: str, seconds: float, calls: int = 1):
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+        self.calls[name] = self.calls.get(name, 0) + calls
+
+    def count(self, name: str, amount: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def book(self, name: str, seconds: float):
+        self.books[name] = self.books.get(name, 0.0) + seconds
+
+    def timed(self, name: str, iterable: Iterable) -> Iterator:
+        """
+        Yields the items of iterable and adds the time spent getting them to the stage.
+        """
+        iterator = iter(iterable)
+        seconds = 0.0
+        calls = 0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    seconds += time.perf_counter() - start
+                    return
+                seconds += time.perf_counter() - start
+                calls += 1
+                yield item
+        finally:
+            self.add(name, seconds, calls)
+
+    def timed_function(self, name: str, function: Callable) -> Callable:
+        """
+        Returns function, with the time of every call added to the stage.
+        """
+
+        def timed_call(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.add(name, time.perf_counter() - start)
+
+        return timed_call
+
+    def merge(self, other: Profiler):
+        for name, seconds in other.seconds.items():
+            self.add(name, seconds, other.calls[name])
+        for name, amount in other.counters.items():
+            self.count(name, amount)
+        for name, seconds in other.books.items():
+            self.book(name, seconds)
+
+    def report(self) -> dict[str, Any]:
+        total_seconds = time.perf_counter() - self.start
+        seconds = max(total_seconds, 1e-9)
+        return {
+            "total_seconds": total_seconds,
+            "stages": {
+                name: {"seconds": self.seconds[name], "calls": self.calls[name]}
+                for name in self.seconds
+            },
+            "counters": dict(self.counters),
+            "rates": {
+                "records_per_second": self.counters.get("records_parsed", 0) / seconds,
+                "bytes_per_second": self.counters.get("bytes_read", 0) / seconds,
+            },
+            # the slowest books first
+            "books": [
+                {"name": name, "seconds": book_seconds}
+                for name, book_seconds in sorted(
+                    self.books.items(), key=lambda item: item[1], reverse=True
+                )
+            ],
+        }
+
+    def write(self, path: Path | None = None):
+        """
+        Writes the report as JSON to path, or to stdout without a path.
+        """
+        text = json.dumps(self.report(), indent=2)
+        if path is None:
+            print(text)
+        else:
+            path.write_text(text + "\n", encoding="utf-8")
+
+    def log(self):
+        """
+        Logs every stage and the counters with loguru, with the numbers bound to the
+        records, so that a serializing sink keeps them as fields.
+        """
+        from loguru import logger
+
+        report = self.report()
+        for name, stage in report["stages"].items():
+            logger.bind(stage=name, **stage).info(
+                f"profile {name}: {stage['seconds'] * 1000:.1f} ms "
+                f"in {stage['calls']} calls"
+            )
+        logger.bind(
+            total_seconds=report["total_seconds"],
+            counters=report["counters"],
+            rates=report["rates"],
+        ).info(
+            f"profile total: {report['total_seconds']:.3f} s, "
+            f"{report['rates']['records_per_second']:.0f} records/s, "
+            f"{report['rates']['bytes_per_second'] / 1024 / 1024:.1f} MiB/s"
+        )
+
+
+class NullStage:
+    __slots__ = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+NULL_STAGE = NullStage()
+
+
+class NullProfiler:
+    """
+    The profiler while profiling is off. Its stages are a shared no-op and timed
+    returns what it is given, so the instrumented code runs as it would without it.
+    """
+
+    __slots__ = []
+    enabled = False
+
+    def stage(self, name: str) -> NullStage:
+        return NULL_STAGE
+
+    def add(self, name: str, seconds: float, calls: int = 1):
+        pass
+
+    def count(self, name: str, amount: int = 1):
+        pass
+
+    def book(self, name: str, seconds: float):
+        pass
+
+    def timed(self, name: str, iterable: Iterable) -> Iterable:
+        return iterable
+
+    def timed_function(self, name: str, function: Callable) -> Callable:
+        return function
+
+
+NULL_PROFILER = NullProfiler()
+# the profiler of the current run, None while profiling is off
+_profiler: Profiler | None = None
+
+
+def active() -> Profiler | NullProfiler:
+    return _profiler or NULL_PROFILER
+
+
+@contextmanager
+def profiling(stats_file: Path | None = None):
+    """
+    Turns profiling on for the with block and yields the profiler. With stats_file
+    the block also runs under cProfile, whose stats are dumped to stats_file for
+    pstats or snakeviz.
+    """
+    global _profiler
+    previous = _profiler
+    _profiler = Profiler()
+    profile = None
+    if stats_file is not None:
+        import cProfile
+
+        profile = cProfile.Profile()
+        profile.enable()
+    try:
+        yield _profiler
+    finally:
+        if profile is not None:
+            profile.disable()
+            profile.dump_stats(stats_file)
+        _profiler = previous
+
+
+class Profiled:
+    """
+    Calls function with its own profiler, also in a worker process, and returns the
+    result, the seconds of the call and the profiler.
+    """
+
+    __slots__ = ["function"]
+
+    def __init__(self, function: Callable):
+        self.function = function
+
+    def __call__(self, *args):
+        with profiling() as profiler:
+            start = time.perf_counter()
+            result = self.function(*args)
+            seconds = time.perf_counter() - start
+        return result, seconds, profiler
+
+
+def run_profiled_jobs(
+    function: Callable[..., Any],
+    arguments: Sequence[tuple],
+    jobs: int,
+    names: Sequence[str],
+    stage: str = "render",
+) -> list[tuple[Any, Exception | None]]:
+    """
+    Runs the jobs like src.jobs.run_jobs. While profiling, the time of every job is
+    added to the stage and to the book in names, and the stages and counters of the
+    jobs are merged into the profiler, also when they ran in other processes.
+    """
+    profiler = active()
+    if not profiler.enabled:
+        return run_jobs(function, arguments, jobs)
+
+    results = []
+    for name, (result, error) in zip(
+        names, run_jobs(Profiled(function), arguments, jobs)
+    ):
+        if error is not None:
+            results.append((None, error))
+            continue
+        result, seconds, job_profiler = result
+        profiler.add(stage, seconds)
+        profiler.book(name, seconds)
+        profiler.merge(job_profiler)
+        results.append((result, None))
+    return results
@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import json
+
+from collections import Counter
+from pathlib import Path
+from typing import Iterable
+
+from src.clippings import Clipping, parse_clipping
+from src.scanner import Record, RecordScanner
+
+# what parse_clipping and the extract_* functions raise for records they cannot read
+PARSE_ERRORS = (ValueError, IndexError)
+
+
+class QuarantinedRecord:
+    """
+    A record that could not be parsed: its byte offset and length in the clippings
+    file, the error and the text, which is kept so that the record can be parsed again
+    without the file.
+    """
+
+    __slots__ = ["offset", "length", "error", "text"]
+
+    def __init__(self, offset: int, length: int, error: str, text: str):
+        self.offset = offset
+        self.length = length
+        self.error = error
+        self.text = text
+
+    def __repr__(self):
+        return (
+            f"QuarantinedRecord(offset={self.offset}, length={self.length}, "
+            f"error={self.error!r})"
+        )
+
+
+class Quarantine:
+    """
+    The records of a clippings file that could not be parsed, by byte offset. It is
+    kept in a JSON Lines file with one record per line, which can be read to see what
+    the parser does not understand.
+    """
+
+    __slots__ = ["records"]
+
+    def __init__(self, records: Iterable[QuarantinedRecord] = ()):
+        self.records = {record.offset: record for record in records}
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __repr__(self):
+        return f"Quarantine({len(self)} records)"
+
+    @classmethod
+    def load(cls, path: Path) -> Quarantine:
+        if not path.exists():
+            return cls()
+        records = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                data = json.loads(line)
+                records.append(
+                    QuarantinedRecord(
+                        data["offset"], data["length"], data["error"], data["text"]
+                    )
+                )
+        return cls(records)
+
+    def save(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for offset in sorted(self.records):
+                record = self.records[offset]
+                data = {
+                    "offset": record.offset,
+                    "length": record.length,
+                    "error": record.error,
+                    "text": record.text,
+                }
+                f.write(json.dumps(data, ensure_ascii=False) + "\n")
+        tmp_path.replace(path)
+
+    def clear(self):
+        self.records.clear()
+
+    def add(self, record: Record, text: str, error: Exception):
+        self.records[record.offset] = QuarantinedRecord(
+            record.offset, record.length, f"{type(error).__name__}: {error}", text
+        )
+
+    def error_counts(self) -> Counter[str]:
+        """
+        Returns the number of records by the type of their error.
+        """
+        return Counter(record.error.split(":")[0] for record in self.records.values())
+
+    def reparse(self) -> list[tuple[QuarantinedRecord, Clipping]]:
+        """
+        Parses the quarantined records again, e.g. after the parser was fixed. The
+        records that can be parsed now are removed and returned with their clippings.
+        """
+        recovered = []
+        for offset, record in list(self.records.items()):
+            try:
+                clipping = parse_clipping(record.text)
+            except PARSE_ERRORS:
+                continue
+            del self.records[offset]
+            recovered.append((record, clipping))
+        return recovered
+
+
+def parse_records(
+    scanner: RecordScanner,
+    records: Iterable[Record],
+    quarantine: Quarantine | None = None,
+) -> list[Clipping]:
+    """
+    Parses the records with the scanner. Without a quarantine the first record that
+    cannot be parsed raises its error, with one it is added to the quarantine and the
+    parsing goes on with the next record.
+    """
+    if quarantine is None:
+        return [scanner.parse(record) for record in records]
+
+    clippings = []
+    for record in records:
+        try:
+            clippings.append(scanner.parse(record))
+        except PARSE_ERRORS as error:
+            quarantine.add(record, scanner.text(record), error)
+    return clippings
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import io
+import os
+
+from typing import IO, Iterator
+
+SEPARATOR = "=========="
+CHUNK_SIZE = 1 << 16
+
+
+def iter_records(
+    stream: IO[str], separator: str = SEPARATOR, chunk_size: int = CHUNK_SIZE
+) -> Iterator[str]:
+    """
+    Yields the records of a clippings file one at a time.
+
+    The stream is read in chunks of chunk_size characters, so memory use only depends on
+    the size of the largest record and not on the size of the file. The yielded pieces
+    are the same as the ones returned by stream.read().split(separator), including
+    separators that cross a chunk boundary and the trailing piece after the last one.
+    """
+    buffer = ""
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        buffer += chunk
+        start = 0
+        while True:
+            index = buffer.find(separator, start)
+            if index == -1:
+                break
+            yield buffer[start:index]
+            start = index + len(separator)
+        # keep the unfinished record, it may contain the start of a separator
+        buffer = buffer[start:]
+    yield buffer
+
+
+def iter_file_records(
+    path: str | os.PathLike,
+    offset: int = 0,
+    separator: str = SEPARATOR + "\n",
+    encoding: str = "utf-8",
+) -> Iterator[str]:
+    """
+    Yields the non-empty records of a clippings file, starting at the byte offset.
+    The offset has to be at the start of a record, e.g. the one of a Checkpoint.
+    """
+    with open(path, "rb") as raw:
+        raw.seek(offset)
+        with io.TextIOWrapper(raw, encoding=encoding) as f:
+            for record in iter_records(f, separator):
+                if record:
+                    yield record
+
+
+def record_title(record: str) -> str:
+    """
+    Returns the title line of a record, which holds the book title and the author.
+    """
+    for line in record.split("\n"):
+        if line:
+            return line.replace("\ufeff", "")
+    return ""
@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+import mmap
+import os
+
+from typing import Iterable, Iterator
+
+from src.clippings import (
+    WORDS_FOR_BOOKMARK,
+    WORDS_FOR_HIGHLIGHT,
+    WORDS_FOR_NOTE,
+    Bookmark,
+    Clipping,
+    Highlight,
+    Note,
+    parse_clipping,
+)
+
+SEPARATOR = b"=========="
+BOM = b"\xef\xbb\xbf"
+
+# in the order parse_clipping checks them
+KEYWORDS = [
+    (Bookmark, [word.encode("utf-8") for word in WORDS_FOR_BOOKMARK]),
+    (Highlight, [word.encode("utf-8") for word in WORDS_FOR_HIGHLIGHT]),
+    (Note, [word.encode("utf-8") for word in WORDS_FOR_NOTE]),
+]
+
+
+class Record:
+    """
+    The position of a record in a clippings file: the byte offset of its title line,
+    its length in bytes without the separator line, and the clipping class its meta
+    line names, or None if it names none.
+    """
+
+    __slots__ = ("offset", "length", "kind")
+
+    def __init__(self, offset: int, length: int, kind: type[Clipping] | None):
+        self.offset = offset
+        self.length = length
+        self.kind = kind
+
+    @property
+    def end(self) -> int:
+        return self.offset + self.length
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Record):
+            return NotImplemented
+        return (self.offset, self.length, self.kind) == (
+            other.offset,
+            other.length,
+            other.kind,
+        )
+
+    def __repr__(self):
+        kind = self.kind.__name__ if self.kind else None
+        return f"Record(offset={self.offset}, length={self.length}, kind={kind})"
+
+
+class RecordScanner:
+    """
+    Finds the records of a clippings file and their types on the bytes of a memory
+    map of the file, so that only the records that are needed get decoded.
+
+        with RecordScanner("My Clippings.txt") as scanner:
+            for record in scanner.records(kinds=(Highlight, Note)):
+                clipping = scanner.parse(record)
+    """
+
+    def __init__(
+        self, path: str | os.PathLike, encoding: str = "utf-8", errors: str = "strict"
+    ):
+        self.path = path
+        self.encoding = encoding
+        self.errors = errors
+        with open(path, "rb") as f:
+            # an empty file cannot be mapped
+            if os.fstat(f.fileno()).st_size:
+                self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self.buffer = b""
+
+    def __enter__(self) -> RecordScanner:
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+
+    def __len__(self) -> int:
+        return len(self.buffer)
+
+    def records(
+        self,
+        offset: int = 0,
+        kinds: Iterable[type[Clipping]] | None = None,
+    ) -> Iterator[Record]:
+        """
+        Yields the non-empty records from the byte offset on, which has to be at the
+        start of a record, the same ones iter_file_records yields. If kinds is given,
+        only the records of these clipping classes are yielded.
+        """
+        buffer = self.buffer
+        size = len(buffer)
+        if kinds is not None:
+            kinds = set(kinds)
+        start = offset
+        index = buffer.find(SEPARATOR, start)
+        while start < size:
+            if index == -1:
+                end = next_start = size
+            else:
+                # only a separator that fills its line ends a record
+                line_end = index + len(SEPARATOR)
+                if buffer[line_end : line_end + 1] == b"\n":
+                    next_start = line_end + 1
+                elif buffer[line_end : line_end + 2] == b"\r\n":
+                    next_start = line_end + 2
+                else:
+                    index = buffer.find(SEPARATOR, line_end)
+                    continue
+                end = index
+            if end > start:
+                record = Record(start, end - start, self.kind(start, end))
+                if kinds is None or record.kind in kinds:
+                    yield record
+            start = next_start
+            if index != -1:
+                index = buffer.find(SEPARATOR, start)
+
+    def kind(self, start: int, end: int) -> type[Clipping] | None:
+        """
+        Returns the clipping class named in the meta line of the record in the byte
+        range, which is searched for the WORDS_FOR_* keywords without decoding it.
+        """
+        buffer = self.buffer
+        meta_start = buffer.find(b"\n", start, end) + 1
+        if meta_start == 0:
+            return None
+        meta_end = buffer.find(b"\n", meta_start, end)
+        if meta_end == -1:
+            meta_end = end
+        for cls, keywords in KEYWORDS:
+            for keyword in keywords:
+                if buffer.find(keyword, meta_start, meta_end) != -1:
+                    return cls
+        return None
+
+    def title_key(self, record: Record) -> bytes:
+        """
+        Returns the undecoded title line of the record, without a BOM and line break,
+        for comparing the books of records.
+        """
+        end = self.buffer.find(b"\n", record.offset, record.end)
+        if end == -1:
+            end = record.end
+        line = self.buffer[record.offset : end]
+        if line.startswith(BOM):
+            line = line[len(BOM) :]
+        return line.rstrip(b"\r")
+
+    def title(self, record: Record) -> str:
+        """
+        Returns the title line of the record, like record_title.
+        """
+        return self.title_key(record).decode(self.encoding, self.errors)
+
+    def meta(self, record: Record) -> str:
+        """
+        Returns the meta line of the record, the one after the title line.
+        """
+        start = self.buffer.find(b"\n", record.offset, record.end) + 1
+        if start == 0:
+            return ""
+        end = self.buffer.find(b"\n", start, record.end)
+        if end == -1:
+            end = record.end
+        return self.buffer[start:end].decode(self.encoding, self.errors).rstrip("\r")
+
+    def text(self, record: Record) -> str:
+        """
+        Decodes the record with the line breaks translated to \\n, like a file opened
+        in text mode.
+        """
+        with memoryview(self.buffer) as view:
+            text = str(view[record.offset : record.end], self.encoding, self.errors)
+        if "\r" in text:
+            text = text.replace("\r\n", "\n").replace("\r", "\n")
+        return text
+
+    def parse(self, record: Record) -> Clipping:
+        if record.kind is None:
+            # raises the error of an unknown clipping type
+            return parse_clipping(self.text(record))
+        return record.kind.from_clipping(self.text(record))
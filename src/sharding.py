@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import io
+import mmap
+import os
+
+from src.clippings import Clipping, parse_clipping
+from src.jobs import run_jobs
+from src.reader import SEPARATOR, iter_records
+
+SEPARATOR_BYTES = SEPARATOR.encode("ascii")
+SHARDS_PER_JOB = 4
+
+
+def shard_ranges(path: str | os.PathLike, shards: int) -> list[tuple[int, int]]:
+    """
+    Splits a clippings file into at most shards byte ranges of about the same size.
+    Every range but the last ends right after a separator line, so every range
+    starts at the beginning of a record.
+    """
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+
+    boundaries = [0]
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        for shard in range(1, shards):
+            target = max(size * shard // shards, boundaries[-1])
+            index = m.find(SEPARATOR_BYTES, target)
+            if index == -1:
+                break
+            end = m.find(b"\n", index)
+            if end == -1:
+                break
+            if end + 1 > boundaries[-1]:
+                boundaries.append(end + 1)
+    if boundaries[-1] < size:
+        boundaries.append(size)
+    return list(zip(boundaries, boundaries[1:]))
+
+
+def parse_shard(
+    path: str | os.PathLike, start: int, end: int, encoding: str = "utf-8"
+) -> list[Clipping]:
+    """
+    Parses the records in the byte range [start, end) of a clippings file.
+    """
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        data = m[start:end]
+    with io.TextIOWrapper(io.BytesIO(data), encoding=encoding) as text:
+        return [
+            parse_clipping(record)
+            for record in iter_records(text, SEPARATOR + "\n")
+            if record
+        ]
+
+
+def parse_file_parallel(
+    path: str | os.PathLike, jobs: int, encoding: str = "utf-8"
+) -> list[Clipping]:
+    """
+    Parses a clippings file in a pool of jobs processes. The file is split into shards
+    on record boundaries and the clippings are returned in the order of the file, the
+    same as parsing the records one after the other.
+    """
+    ranges = shard_ranges(path, max(1, jobs * SHARDS_PER_JOB))
+    results = run_jobs(
+        parse_shard, [(path, start, end, encoding) for start, end in ranges], jobs
+    )
+
+    clippings: list[Clipping] = []
+    for shard_clippings, error in results:
+        if error is not None:
+            raise error
+        clippings.extend(shard_clippings)
+    return clippings
@@ -0,0 +1,313 @@
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable
+
+from src.checkpoint import Checkpoint, scan_appended
+from src.clippings import Bookmark, Clipping, Highlight, Note, parse_clipping
+from src.reader import iter_file_records
+
+CLIPPING_TYPES = {cls.__name__: cls for cls in (Highlight, Note, Bookmark)}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS clippings (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    book_title TEXT NOT NULL,
+    author TEXT NOT NULL,
+    position TEXT NOT NULL,
+    position_start INTEGER NOT NULL,
+    position_end INTEGER NOT NULL,
+    page INTEGER,
+    created_at TEXT NOT NULL,
+    text TEXT,
+    text_hash TEXT NOT NULL,
+    UNIQUE (book_title, author, position, text_hash)
+);
+CREATE INDEX IF NOT EXISTS clippings_book ON clippings (book_title, position_start);
+CREATE INDEX IF NOT EXISTS clippings_author ON clippings (author);
+CREATE INDEX IF NOT EXISTS clippings_created_at ON clippings (created_at);
+CREATE INDEX IF NOT EXISTS clippings_position ON clippings (position_start);
+CREATE TABLE IF NOT EXISTS sources (
+    path TEXT PRIMARY KEY,
+    offset INTEGER NOT NULL,
+    digest TEXT NOT NULL
+);
+"""
+
+# full text index of the clipping texts and of their book, kept up to date by triggers
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE clippings_fts USING fts5(
+    text, book, content='clippings', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER clippings_fts_insert AFTER INSERT ON clippings BEGIN
+    INSERT INTO clippings_fts (rowid, text, book) VALUES (new.id, new.text, new.book);
+END;
+CREATE TRIGGER clippings_fts_delete AFTER DELETE ON clippings BEGIN
+    INSERT INTO clippings_fts (clippings_fts, rowid, text, book)
+    VALUES ('delete', old.id, old.text, old.book);
+END;
+INSERT INTO clippings_fts (clippings_fts) VALUES ('rebuild');
+"""
+
+BOOK_COLUMN = """
+ALTER TABLE clippings ADD COLUMN book TEXT
+GENERATED ALWAYS AS (book_title || ' ' || author) VIRTUAL
+"""
+
+SEARCH = """
+SELECT clippings.*, snippet(clippings_fts, 0, '[', ']', '...', 16) AS snippet
+FROM clippings_fts JOIN clippings ON clippings.id = clippings_fts.rowid
+WHERE clippings_fts MATCH ?
+"""
+
+# the id of the oldest of the newest matches that limit_scan ranks
+OLDEST_RANKED = """
+SELECT rowid FROM clippings_fts WHERE clippings_fts MATCH ?
+ORDER BY rowid DESC LIMIT 1 OFFSET ?
+"""
+
+INSERT = """
+INSERT OR IGNORE INTO clippings (
+    kind, book_title, author, position, position_start, position_end, page,
+    created_at, text, text_hash
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def text_hash(text: str | None) -> str:
+    return hashlib.sha1((text or "").encode("utf-8")).hexdigest()
+
+
+def fts_phrase(text: str) -> str:
+    return '"' + text.replace('"', '""') + '"'
+
+
+def fts_query(query: str, book: list[str]) -> str:
+    """
+    Restricts the query to the clipping texts and, if given, to the clippings whose
+    book column contains the book title and author. The exact book is checked in SQL,
+    the FTS filter only makes sure that the matches of other books are never ranked.
+    """
+    fts = f"text : ({query})"
+    if book:
+        fts += " AND book : " + fts_phrase(" ".join(book))
+    return fts
+
+
+def clipping_row(clipping: Clipping) -> tuple:
+    if isinstance(clipping.position, tuple):
+        start, end = clipping.position
+        position = f"{start}-{end}"
+    else:
+        start = end = clipping.position
+        position = str(start)
+    return (
+        type(clipping).__name__,
+        clipping.book_title,
+        clipping.author,
+        position,
+        start,
+        end,
+        clipping.page,
+        clipping.created_at.isoformat(),
+        clipping.text,
+        text_hash(clipping.text),
+    )
+
+
+def row_clipping(row: sqlite3.Row) -> Clipping:
+    if "-" in row["position"]:
+        position = (row["position_start"], row["position_end"])
+    else:
+        position = row["position_start"]
+    return CLIPPING_TYPES[row["kind"]](
+        book_title=row["book_title"],
+        created_at=datetime.fromisoformat(row["created_at"]),
+        position=position,
+        author=row["author"],
+        page=row["page"],
+        text=row["text"],
+    )
+
+
+class ClippingStore:
+    """
+    A SQLite database of parsed clippings. Clippings are deduplicated on
+    (book_title, author, position, hash of the text), so ingesting the same
+    clippings file again only adds the clippings that are new.
+    """
+
+    def __init__(self, path: str | Path = ":memory:"):
+        self.path = path
+        self.connection = sqlite3.connect(str(path))
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(SCHEMA)
+        has_fts = self.connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'clippings_fts'"
+        ).fetchone()
+        if not has_fts:
+            # also indexes the clippings of stores created before the index existed
+            with self.connection:
+                self.connection.execute(BOOK_COLUMN)
+            self.connection.executescript(FTS_SCHEMA)
+
+    def __enter__(self) -> ClippingStore:
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def add(self, clippings: Iterable[Clipping]) -> set[tuple[str, str]]:
+        """
+        Adds the clippings that are not in the store yet.
+        Returns the (book_title, author) of the books that got new clippings.
+        """
+        changed_books = set()
+        with self.connection:
+            cursor = self.connection.cursor()
+            for clipping in clippings:
+                cursor.execute(INSERT, clipping_row(clipping))
+                if cursor.rowcount:
+                    changed_books.add((clipping.book_title, clipping.author))
+        return changed_books
+
+    def ingest_file(self, source_file: str | Path) -> set[tuple[str, str]]:
+        """
+        Adds the clippings of a clippings file. Only the records appended since the
+        last ingest of the same file are parsed, unless the file was edited or replaced.
+        Returns the (book_title, author) of the books that got new clippings.
+        """
+        key = str(Path(source_file).resolve())
+        row = self.connection.execute(
+            "SELECT offset, digest FROM sources WHERE path = ?", (key,)
+        ).fetchone()
+        checkpoint = Checkpoint(row["offset"], row["digest"]) if row else None
+        start, new_checkpoint = scan_appended(Path(source_file), checkpoint)
+
+        changed_books = self.add(
+            parse_clipping(record) for record in iter_file_records(source_file, start)
+        )
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO sources VALUES (?, ?, ?)",
+                (key, new_checkpoint.offset, new_checkpoint.digest),
+            )
+        return changed_books
+
+    def clippings(
+        self,
+        book_title: str | None = None,
+        author: str | None = None,
+        kind: type[Clipping] | None = None,
+        since: datetime | None = None,
+        until: datetime | None = None,
+    ) -> list[Clipping]:
+        """
+        Returns the clippings that match all given filters in the order they were
+        added. since is inclusive and until is exclusive.
+        """
+        conditions = []
+        parameters: list = []
+        if book_title is not None:
+            conditions.append("book_title = ?")
+            parameters.append(book_title)
+        if author is not None:
+            conditions.append("author = ?")
+            parameters.append(author)
+        if kind is not None:
+            conditions.append("kind = ?")
+            parameters.append(kind.__name__)
+        if since is not None:
+            conditions.append("created_at >= ?")
+            parameters.append(since.isoformat())
+        if until is not None:
+            conditions.append("created_at < ?")
+            parameters.append(until.isoformat())
+        query = "SELECT * FROM clippings"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY id"
+        return [row_clipping(row) for row in self.connection.execute(query, parameters)]
+
+    def search(
+        self,
+        query: str,
+        book_title: str | None = None,
+        author: str | None = None,
+        limit: int = 20,
+        limit_scan: int | None = None,
+    ) -> list[tuple[Clipping, str]]:
+        """
+        Full text search over the texts of the highlights and notes.
+
+        The query uses the FTS5 syntax, e.g. "in love" for a phrase or love NOT
+        thoughts; a query that is not valid FTS5 is searched as plain words.
+        Returns the best matching clippings with a snippet of their text in which the
+        matches are put in [brackets].
+
+        bm25 has to score every match before the best can be picked, which takes a
+        while for words that are in most clippings. limit_scan ranks only the newest
+        limit_scan matches instead, so older matches can be missed.
+        """
+        sql = SEARCH
+        if limit_scan is not None:
+            sql += " AND clippings_fts.rowid >= ?"
+        book = []
+        if book_title is not None:
+            sql += " AND clippings.book_title = ?"
+            book.append(book_title)
+        if author is not None:
+            sql += " AND clippings.author = ?"
+            book.append(author)
+        sql += " ORDER BY rank LIMIT ?"
+
+        def execute(fts: str) -> list[sqlite3.Row]:
+            parameters = [fts]
+            if limit_scan is not None:
+                oldest = self.connection.execute(
+                    OLDEST_RANKED, [fts, limit_scan - 1]
+                ).fetchone()
+                parameters.append(oldest[0] if oldest is not None else 0)
+            return self.connection.execute(sql, [*parameters, *book, limit]).fetchall()
+
+        try:
+            rows = execute(fts_query(query, book))
+        except sqlite3.OperationalError:
+            # quote every word, so that characters like ' or - are not syntax
+            words = " ".join(fts_phrase(word) for word in query.split())
+            if not words:
+                return []
+            rows = execute(fts_query(words, book))
+        return [(row_clipping(row), row["snippet"]) for row in rows]
+
+    def books(self, author: str | None = None) -> list[tuple[str, str, int]]:
+        """
+        Returns (book_title, author, number of clippings) of the books in the store.
+        """
+        query = "SELECT book_title, author, COUNT(*) FROM clippings"
+        parameters = []
+        if author is not None:
+            query += " WHERE author = ?"
+            parameters.append(author)
+        query += " GROUP BY book_title, author ORDER BY MIN(id)"
+        return [tuple(row) for row in self.connection.execute(query, parameters)]
+
+    def clippings_by_book(
+        self, books: Iterable[tuple[str, str]]
+    ) -> dict[tuple[str, str], list[Clipping]]:
+        """
+        Returns all clippings of the given (book_title, author) books.
+        """
+        return {
+            (book_title, author): self.clippings(book_title=book_title, author=author)
+            for book_title, author in books
+        }
@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import os
+import select
+import sys
+import threading
+import time
+
+from pathlib import Path
+from typing import Callable
+
+# the inotify events that can change the watched file or one of its directories
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+WATCH_MASK = (
+    IN_MODIFY
+    | IN_ATTRIB
+    | IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+    | IN_MOVE_SELF
+)
+READ_SIZE = 64 * 1024
+
+
+def file_signature(path: Path) -> tuple[int, int, int, int] | None:
+    """
+    Returns what changes when the file is written, replaced or mounted, or None if
+    it does not exist.
+    """
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+class PollingWatcher:
+    """
+    Notices changes of a file by comparing its signature every interval seconds. The
+    file and its directories may not exist yet, e.g. before a Kindle is mounted.
+    """
+
+    def __init__(self, path: Path, interval: float = 1.0):
+        self.path = path
+        self.interval = interval
+        self.signature = file_signature(path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        pass
+
+    def changed(self) -> bool:
+        signature = file_signature(self.path)
+        if signature == self.signature:
+            return False
+        self.signature = signature
+        return True
+
+    def sleep(self, timeout: float):
+        time.sleep(timeout)
+
+    def wait(self, timeout: float) -> bool:
+        """
+        Waits up to timeout seconds for the file to change. Returns whether it did.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            if self.changed():
+                return True
+            left = deadline - time.monotonic()
+            if left <= 0:
+                return False
+            self.sleep(min(self.interval, left))
+
+
+class InotifyWatcher(PollingWatcher):
+    """
+    Notices changes of a file through inotify on Linux. The deepest existing
+    directory on the path of the file is watched, so that the file is also noticed
+    when a volume is mounted or the file is created. The signature is still checked
+    every interval seconds, which catches the changes inotify does not report, e.g.
+    a volume mounted over a directory that already existed.
+    """
+
+    def __init__(self, path: Path, interval: float = 1.0):
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify is only available on Linux")
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.add_watch = libc.inotify_add_watch
+        self.rm_watch = libc.inotify_rm_watch
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.watched: Path | None = None
+        self.descriptor = -1
+        super().__init__(path, interval)
+        self.update_watch()
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+    def update_watch(self):
+        """
+        Moves the watch to the deepest existing directory on the path of the file.
+        """
+        directory = self.path.parent
+        while not directory.is_dir() and directory != directory.parent:
+            directory = directory.parent
+        if directory == self.watched:
+            return
+        if self.descriptor >= 0:
+            self.rm_watch(self.fd, self.descriptor)
+        self.descriptor = self.add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        self.watched = directory if self.descriptor >= 0 else None
+
+    def sleep(self, timeout: float):
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            self.update_watch()
+            return
+        # the events only wake the watcher up, the signature tells what changed
+        try:
+            while os.read(self.fd, READ_SIZE):
+                pass
+        except BlockingIOError:
+            pass
+        self.update_watch()
+
+
+def open_watcher(path: Path, interval: float = 1.0, polling: bool = False):
+    """
+    Returns an InotifyWatcher for the file where inotify is available, else a
+    PollingWatcher.
+    """
+    if not polling:
+        try:
+            return InotifyWatcher(path, interval)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(path, interval)
+
+
+def watch(
+    path: Path,
+    callback: Callable[[Path], object],
+    debounce: float = 0.05,
+    interval: float = 1.0,
+    polling: bool = False,
+    stop: threading.Event | None = None,
+):
+    """
+    Calls callback with the path once at the start if the file exists, and then
+    every time the file changed, until stop is set. A burst of changes, like the
+    writes of a copy, leads to one call once the file did not change for debounce
+    seconds. Exceptions of the callback end the watch.
+    """
+    stop = stop or threading.Event()
+    with open_watcher(path, interval, polling) as watcher:
+        if watcher.signature is not None:
+            callback(path)
+        while not stop.is_set():
+            if not watcher.wait(interval):
+                continue
+            while watcher.wait(debounce) and not stop.is_set():
+                pass
+            if watcher.signature is not None and not stop.is_set():
+                callback(path)
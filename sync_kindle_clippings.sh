@@ -2,7 +2,7 @@
 
 KINDLE_VOLUME="/Volumes/Kindle"
 CLIPPINGS_FILE="documents/My Clippings.txt"
-DESTINATION_DIR="$(dirname "$0")"
+DESTINATION_DIR="$(cd "$(dirname "$0")" && pwd)"
 SYNC_DIR="$DESTINATION_DIR/.sync"
 LOG_FILE="$SYNC_DIR/sync.log"
 
@@ -31,40 +31,29 @@ if [ -d "$KINDLE_VOLUME" ]; then
     if [ -f "$KINDLE_CLIPPINGS_PATH" ]; then
         log_message "✓ Found My Clippings.txt"
         
-        TIMESTAMP=$(date +"%Y%m%d_%H%M%S")
-        DESTINATION_FILE="$SYNC_DIR/My Clippings_${TIMESTAMP}.txt"
+        # Only the clippings added since the last sync are stored in the archive.
+        # One run of the command line adds the snapshot, copies the file to
+        # My Clippings.txt and parses it into individual book files
+        log_message "📚 Parsing clippings into individual book files..."
+        cd "$DESTINATION_DIR"
+        # unset VIRTUAL_ENV to avoid the path mismatch warning of uv
+        unset VIRTUAL_ENV
+        uv run python -m src.cli parse -snapshot -source "$KINDLE_CLIPPINGS_PATH" -archive .sync
+        SYNC_RESULT=$?
         
-        cp "$KINDLE_CLIPPINGS_PATH" "$DESTINATION_FILE"
-        
-        if [ $? -eq 0 ]; then
-            log_message "✓ Successfully copied to: $DESTINATION_FILE"
-            
-            LATEST_LINK="$DESTINATION_DIR/My Clippings.txt"
-            ln -sf ".sync/$(basename "$DESTINATION_FILE")" "$LATEST_LINK"
-            log_message "✓ Created/updated symlink: My Clippings.txt -> .sync/$(basename "$DESTINATION_FILE")"
-            
-            log_message "📚 Parsing clippings into individual book files..."
-            
-            # Copy the latest file to the expected location for parse_clippings.py
-            cp "$DESTINATION_FILE" "$DESTINATION_DIR/My Clippings.txt"
-            
-            # Run the parser using uv (unset VIRTUAL_ENV to avoid path mismatch warning)
-            cd "$DESTINATION_DIR"
-            unset VIRTUAL_ENV
-            uv run python parse_clippings.py
-            PARSE_RESULT=$?
-            
-            if [ $PARSE_RESULT -eq 0 ]; then
-                log_message "✓ Successfully parsed clippings into individual book files"
-                log_message "=== Kindle Sync Completed Successfully ==="
-            else
-                log_message "⚠ Warning: Failed to parse clippings (sync was successful though)"
-                log_message "=== Kindle Sync Completed with Warnings ==="
-            fi
-        else
-            log_message "✗ Error: Failed to copy the file"
+        # 3 is the exit status of a snapshot that could not be added
+        if [ $SYNC_RESULT -eq 3 ]; then
+            log_message "✗ Error: Failed to add a snapshot of the file"
             log_message "=== Kindle Sync Failed ==="
             exit 1
+        elif [ $SYNC_RESULT -eq 0 ]; then
+            log_message "✓ Successfully added a snapshot to: $SYNC_DIR"
+            log_message "✓ Successfully parsed clippings into individual book files"
+            log_message "=== Kindle Sync Completed Successfully ==="
+        else
+            log_message "✓ Successfully added a snapshot to: $SYNC_DIR"
+            log_message "⚠ Warning: Failed to parse clippings (sync was successful though)"
+            log_message "=== Kindle Sync Completed with Warnings ==="
         fi
     else
         log_message "✗ Error: My Clippings.txt not found at expected location"
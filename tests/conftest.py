@@ -0,0 +1,24 @@
+from datetime import datetime
+
+import pytest
+
+from src.clippings import Highlight
+
+
+@pytest.fixture
+def make_highlight():
+    """
+    Returns a function that makes a highlight of The Game at the position, by default
+    with the position as text.
+    """
+
+    def make(start: int = 6470, end: int = 6471, text: str | None = None) -> Highlight:
+        return Highlight(
+            position=(start, end),
+            book_title="The Game",
+            created_at=datetime(2023, 9, 25, 22, 42, 15),
+            author="Neil Strauss",
+            text=text if text is not None else f"highlight {start}-{end}",
+        )
+
+    return make
@@ -0,0 +1,81 @@
+from datetime import datetime
+
+import pytest
+
+from benchmarks.generate import generate_clippings
+from src.archive import SnapshotArchive
+from src.cli import SNAPSHOT_FAILED, main as cli_main
+
+
+def write_snapshots(tmp_path):
+    first = "".join(generate_clippings(books=3, clippings_per_book=20, seed=1))
+    second = "".join(generate_clippings(books=2, clippings_per_book=10, seed=2))
+    contents = [first[:1000], first[:3000], first[:3000], second, first]
+    archive = SnapshotArchive(tmp_path / ".sync")
+    source = tmp_path / "My Clippings.txt"
+    for day, content in enumerate(contents, start=1):
+        source.write_text(content, encoding="utf-8")
+        archive.add(source, created_at=datetime(2024, 1, day))
+    return archive, [content.encode("utf-8") for content in contents]
+
+
+def test_archive_stores_deltas(tmp_path):
+    archive, contents = write_snapshots(tmp_path)
+    assert [snapshot.parent for snapshot in archive.snapshots] == [None, 0, 1, None, 1]
+    stored = archive.data_file.stat().st_size
+    assert stored == len(contents[-1]) + len(contents[3])
+
+    archive = SnapshotArchive(tmp_path / ".sync")
+    for snapshot, content in zip(archive.snapshots, contents):
+        assert archive.read(snapshot.name) == content
+    assert archive.snapshots[0].name == "My Clippings_20240101_000000.txt"
+    assert archive.read("latest") == contents[-1]
+
+    archive.restore("My Clippings_20240102_000000.txt", tmp_path / "restored.txt")
+    assert (tmp_path / "restored.txt").read_bytes() == contents[1]
+    assert archive.verify() == []
+
+    with pytest.raises(ValueError):
+        archive.add(tmp_path / "restored.txt", name=archive.snapshots[0].name)
+    with pytest.raises(KeyError):
+        archive.find("missing")
+
+
+def test_archive_detects_damage(tmp_path):
+    archive, _ = write_snapshots(tmp_path)
+    data = bytearray(archive.data_file.read_bytes())
+    data[1500] ^= 1
+    archive.data_file.write_bytes(bytes(data))
+    problems = archive.verify()
+    assert problems == [
+        "My Clippings_20240102_000000.txt: the delta is damaged",
+        "My Clippings_20240103_000000.txt: its parent is invalid",
+        "My Clippings_20240105_000000.txt: its parent is invalid",
+    ]
+    with pytest.raises(ValueError):
+        archive.restore("latest", tmp_path / "restored.txt")
+    assert not (tmp_path / "restored.txt").exists()
+
+    lines = archive.index_file.read_text(encoding="utf-8").splitlines()
+    lines[0] = lines[0].replace("2024-01-01", "2023-01-01")
+    archive.index_file.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    problems = SnapshotArchive(tmp_path / ".sync").verify()
+    assert problems[0] == "My Clippings_20240102_000000.txt: the hash chain is broken"
+
+
+def test_parse_command_adds_a_snapshot(tmp_path, monkeypatch):
+    pytest.importorskip("loguru")
+    monkeypatch.chdir(tmp_path)
+    kindle = tmp_path / "Kindle" / "My Clippings.txt"
+    kindle.parent.mkdir()
+    records = list(generate_clippings(books=3, clippings_per_book=20, seed=6))
+    kindle.write_text("".join(records), encoding="utf-8")
+
+    cli_main(["parse", "-snapshot", "-source", str(kindle)])
+    assert len(SnapshotArchive(tmp_path / ".sync")) == 1
+    assert (tmp_path / "My Clippings.txt").read_bytes() == kindle.read_bytes()
+    assert list(tmp_path.glob("output/*.md"))
+
+    with pytest.raises(SystemExit) as exit_info:
+        cli_main(["parse", "-snapshot", "-source", str(tmp_path / "missing.txt")])
+    assert exit_info.value.code == SNAPSHOT_FAILED
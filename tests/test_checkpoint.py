@@ -0,0 +1,53 @@
+from src.checkpoint import Checkpoint, scan_appended
+from src.reader import iter_file_records, record_title
+
+first_record = """The Game (Neil Strauss)\r
+- Deine Markierung bei Position 6470-6471 | Hinzugefügt am Montag, 25. September 2023 22:42:15\r
+\r
+The secret to making someone think they’re in love with you is to occupy their thoughts,\r
+==========\r
+"""
+
+second_record = """Die 24 Gesetze der Verführung (Robert Greene)\r
+- Deine Notiz auf Seite 139 | bei Position 2128 | Hinzugefügt am Donnerstag, 10. Oktober 2024 08:40:08\r
+\r
+Interessant, vielleicht immer mal wieder oasch sein\r
+==========\r
+"""
+
+
+def test_scan_appended(tmp_path):
+    source_file = tmp_path / "My Clippings.txt"
+    source_file.write_bytes(first_record.encode("utf-8"))
+
+    start, checkpoint = scan_appended(source_file, None)
+    assert start == 0
+    assert checkpoint.offset == len(first_record.encode("utf-8"))
+
+    # nothing new since the checkpoint
+    assert scan_appended(source_file, checkpoint) == (checkpoint.offset, checkpoint)
+
+    with open(source_file, "ab") as f:
+        f.write(second_record.encode("utf-8"))
+    start, new_checkpoint = scan_appended(source_file, checkpoint)
+    assert start == checkpoint.offset
+    assert new_checkpoint.offset == source_file.stat().st_size
+    assert [record_title(r) for r in iter_file_records(source_file, start)] == [
+        "Die 24 Gesetze der Verführung (Robert Greene)"
+    ]
+    # hashing in one go gives the same checkpoint as hashing incrementally
+    assert scan_appended(source_file, None)[1] == new_checkpoint
+
+    # an edited prefix falls back to a full parse
+    source_file.write_bytes((second_record + second_record).encode("utf-8"))
+    start, _ = scan_appended(source_file, new_checkpoint)
+    assert start == 0
+
+
+def test_checkpoint_roundtrip(tmp_path):
+    path = tmp_path / "output" / ".checkpoint.json"
+    assert Checkpoint.load(path) is None
+    Checkpoint(offset=42, digest="abc").save(path)
+    assert Checkpoint.load(path) == Checkpoint(offset=42, digest="abc")
+    path.write_text("not json")
+    assert Checkpoint.load(path) is None
@@ -0,0 +1,38 @@
+from src.dedupe import collapse_near_duplicates
+
+
+def test_collapse_extended_highlights(make_highlight):
+    highlights = [
+        make_highlight(6470, 6471, "The secret to making someone think"),
+        make_highlight(6520, 6520, "Leave her better than you found her."),
+        make_highlight(
+            6470,
+            6473,
+            "The secret to making someone think they’re in love with you is to occupy "
+            "their thoughts,",
+        ),
+        make_highlight(6519, 6520, "you found her."),
+        # overlaps in position, but is a different text
+        make_highlight(6473, 6480, "Something else entirely, on the next page."),
+    ]
+    assert collapse_near_duplicates(highlights) == [
+        highlights[1],
+        highlights[2],
+        highlights[4],
+    ]
+    # far apart positions are never variants of each other
+    moved = [highlights[0], make_highlight(9000, 9001, highlights[0].text)]
+    assert collapse_near_duplicates(moved) == moved
+
+
+def test_collapse_without_positions():
+    texts = [
+        "Leave her better than you found her.",
+        "The secret to making someone think they’re in love with you",
+        "Leave her better than you found her. And yourself.",
+        "Something else entirely.",
+    ]
+    kept = collapse_near_duplicates(
+        texts, text=lambda text: text, position=lambda text: None
+    )
+    assert kept == [texts[1], texts[2], texts[3]]
@@ -0,0 +1,66 @@
+from datetime import datetime
+
+from src.clippings import Highlight, Bookmark, Note, parse_clipping, format_datetime
+
+example_highlights = """The Selfish Gene: 30th Anniversary Edition (Richard Dawkins)
+- Your Highlight on page 92 | location 1406-1407 | Added on Saturday, 26 March 2016 14:59:39
+
+Perhaps consciousness arises when the brain's simulation of the world becomes so complete that it must include a model of itself.(4)
+==========
+Fahrenheit 451 (Ray Bradbury)
+- Your Highlight on page 5 | Location 784-785 | Added on Saturday, March 26, 2016 6:37:26 PM
+
+Who knows who might be the target of the well-read man?
+==========
+"""
+
+example_bookmark = """Fahrenheit 451 (Ray Bradbury)
+- Your Bookmark at location 346 | Added on Saturday, 26 March 2016 15:46:21
+
+
+"""
+
+example_note = """Fahrenheit 451 (Ray Bradbury)
+- Your Note on page 5 | Location 785 | Added on Saturday, March 26, 2016 12:40:08 AM
+
+Read this again
+"""
+
+
+def test_highlights():
+    clippings = example_highlights.split("==========\n")
+    highlights = [parse_clipping(clipping) for clipping in clippings if clipping]
+    assert all(isinstance(highlight, Highlight) for highlight in highlights)
+    assert highlights[0].book_title == "The Selfish Gene: 30th Anniversary Edition"
+    assert highlights[0].author == "Richard Dawkins"
+    assert highlights[0].page == 92
+    assert highlights[0].position == (1406, 1407)
+    assert highlights[0].created_at == datetime(2016, 3, 26, 14, 59, 39)
+
+    assert highlights[1].page == 5
+    assert highlights[1].position == (784, 785)
+    assert highlights[1].created_at == datetime(2016, 3, 26, 18, 37, 26)
+
+
+def test_bookmark():
+    bookmark = parse_clipping(example_bookmark)
+    assert isinstance(bookmark, Bookmark)
+    assert bookmark.page is None
+    assert bookmark.position == 346
+    assert bookmark.created_at == datetime(2016, 3, 26, 15, 46, 21)
+
+
+def test_note():
+    note = parse_clipping(example_note)
+    assert isinstance(note, Note)
+    assert note.page == 5
+    assert note.position == 785
+    assert note.created_at == datetime(2016, 3, 26, 0, 40, 8)
+    assert note.text == "Read this again"
+
+
+def test_format_datetime():
+    created_at = datetime(2023, 9, 25, 22, 42, 15)
+    assert format_datetime(created_at) == "Montag, 25. September 2023 22:42"
+    assert format_datetime(created_at, "en") == "Monday, 25. September 2023 22:42"
+    assert format_datetime(datetime(2024, 3, 1, 8, 5)) == "Freitag, 01. März 2024 08:05"
@@ -0,0 +1,110 @@
+import KindleClippings
+
+example_file = """﻿The Game (Neil Strauss)
+- Deine Markierung bei Position 6470-6471 | Hinzugefügt am Montag, 25. September 2023 22:42:15
+
+The secret to making someone think
+==========
+﻿The Game (Neil Strauss)
+- Deine Markierung bei Position 6470-6475 | Hinzugefügt am Montag, 25. September 2023 22:42:40
+
+The secret to making someone think they’re in love with you is to occupy their thoughts,
+==========
+﻿The Game (Neil Strauss)
+- Deine Notiz bei Position 6475 | Hinzugefügt am Montag, 25. September 2023 22:43:02
+
+occupy their thoughts
+==========
+"""
+
+
+def export(tmp_path, text, collapse_duplicates=True):
+    source = tmp_path / "My Clippings.txt"
+    source.write_text(text, encoding="utf-8")
+    end_directory = str(tmp_path / "KindleClippings") + "/"
+    KindleClippings.parse_clippings(
+        str(source),
+        end_directory,
+        include_clip_meta=False,
+        collapse_duplicates=collapse_duplicates,
+    )
+    return tmp_path / "KindleClippings"
+
+
+def test_export_keeps_a_note_inside_its_highlight(tmp_path):
+    book = export(tmp_path, example_file) / "The Game - Neil Strauss.txt"
+    assert book.read_text(encoding="utf-8").split("\n...\n\n") == [
+        "The secret to making someone think they’re in love with you is to occupy "
+        "their thoughts,\n",
+        "occupy their thoughts\n",
+        "",
+    ]
+
+
+other_book = """Die 24 Gesetze der Verführung (Robert Greene)
+- Deine Markierung auf Seite 139 | bei Position 2120-2127 | Hinzugefügt am Donnerstag, 10. Oktober 2024 08:39:50
+
+Verführung ist ein Spiel.
+==========
+Die 24 Gesetze der Verführung (Robert Greene)
+- Dein Lesezeichen auf Seite 140 | bei Position 2130 | Hinzugefügt am Donnerstag, 10. Oktober 2024 08:41:00
+
+
+==========
+"""
+
+
+def test_export_writes_a_file_per_book(tmp_path):
+    directory = export(tmp_path, example_file + other_book)
+    assert sorted(path.name for path in directory.glob("*.txt")) == [
+        "Die 24 Gesetze der Verführung - Robert Greene.txt",
+        "The Game - Neil Strauss.txt",
+    ]
+    # the bookmark has no body and is not written
+    book = directory / "Die 24 Gesetze der Verführung - Robert Greene.txt"
+    assert book.read_text(encoding="utf-8") == "Verführung ist ein Spiel.\n\n...\n\n"
+
+
+def test_export_skips_repeated_texts(tmp_path):
+    repeated = other_book.split("==========\n")[0] + "==========\n"
+    directory = export(tmp_path, other_book + repeated)
+    book = directory / "Die 24 Gesetze der Verführung - Robert Greene.txt"
+    assert book.read_text(encoding="utf-8") == "Verführung ist ein Spiel.\n\n...\n\n"
+
+    # a later run writes the file again, still with every text once
+    appended = repeated.replace("Verführung ist ein Spiel.", "Neu.")
+    export(tmp_path, other_book + repeated + repeated + appended)
+    assert book.read_text(encoding="utf-8") == (
+        "Verführung ist ein Spiel.\n\n...\n\nNeu.\n\n...\n\n"
+    )
+
+
+def test_export_replaces_a_highlight_extended_in_a_later_run(tmp_path):
+    first = example_file.split("==========\n")[0] + "==========\n"
+    directory = export(tmp_path, first)
+    book = directory / "The Game - Neil Strauss.txt"
+    assert book.read_text(encoding="utf-8") == (
+        "The secret to making someone think\n\n...\n\n"
+    )
+
+    export(tmp_path, example_file)
+    assert book.read_text(encoding="utf-8").split("\n...\n\n") == [
+        "The secret to making someone think they’re in love with you is to occupy "
+        "their thoughts,\n",
+        "occupy their thoughts\n",
+        "",
+    ]
+
+
+def test_export_writes_missing_book_files_again(tmp_path):
+    directory = export(tmp_path, example_file + other_book)
+    game = directory / "The Game - Neil Strauss.txt"
+    greene = directory / "Die 24 Gesetze der Verführung - Robert Greene.txt"
+    expected = game.read_text(encoding="utf-8")
+    game.unlink()
+    greene.write_text("edited\n", encoding="utf-8")
+
+    # no clippings were added, only the book without a file is read again
+    export(tmp_path, example_file + other_book)
+    assert game.read_text(encoding="utf-8") == expected
+    assert greene.read_text(encoding="utf-8") == "edited\n"
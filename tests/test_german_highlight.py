@@ -1,4 +1,12 @@
-from src.clippings import Highlight, Bookmark, Note, parse_clipping
+import pickle
+
+from src.clippings import (
+    Highlight,
+    Bookmark,
+    Note,
+    parse_clipping,
+    group_clippings_by_book,
+)
 
 example_highlights = """==========
 ﻿The Game (Neil Strauss)
@@ -87,6 +95,10 @@ def test_notes():
     assert notes[2].position == 2268
     assert notes[2].page == 148
     assert notes[2].created_at.strftime("%Y-%m-%d %H:%M:%S") == "2024-10-10 09:17:20"
+    assert (
+        repr(notes[0])
+        == "Note(text=Interessant, vielleicht immer mal wieder oasch sein, book_title=Die 24 Gesetze der Verführung, created_at=2024-10-10 08:40:08, position=2128, page=139, author=Robert Greene)"
+    )
 
 
 def test_bookmarks():
@@ -160,3 +172,31 @@ def test_highlights():
         repr(highlights[0])
         == "Highlight(book_title=The Game, created_at=2023-09-25 22:42:15, position=(6470, 6471), page=None, author=Neil Strauss, text=The secret to making someone think they’re in love with you is to occupy their thoughts,)"
     )
+
+
+def test_group_clippings_by_book():
+    examples = "==========\n".join(
+        [example_notes, example_highlights, example_bookmarks]
+    )
+    clippings = [
+        parse_clipping(clipping)
+        for clipping in examples.split("==========\n")
+        if clipping.strip()
+    ]
+    clippings_by_book = group_clippings_by_book(clippings)
+    assert list(clippings_by_book) == [
+        ("Die 24 Gesetze der Verführung", "Robert Greene"),
+        ("The Game", "Neil Strauss"),
+        ("Permanent Record · Meine Geschichte (German Edition)", "Edward Snowden"),
+        ("The 80/20 Principle: The Secret to Achieving More with Less", "Richard Koch"),
+    ]
+    assert [len(book) for book in clippings_by_book.values()] == [3, 2, 1, 3]
+    assert clippings_by_book[("The Game", "Neil Strauss")][1].position == (6520, 6520)
+
+
+def test_clippings_are_slotted():
+    clippings = example_notes.split("==========\n")
+    note = Note.from_clipping(clippings[0])
+    assert isinstance(note, Note)
+    assert not hasattr(note, "__dict__")
+    assert pickle.loads(pickle.dumps(note)).text == note.text
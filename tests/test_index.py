@@ -0,0 +1,134 @@
+from datetime import datetime
+
+import pytest
+
+from benchmarks.generate import generate_clippings
+from src.clippings import Bookmark, Highlight, Note, parse_clipping
+from src.index import ClippingIndex
+from src.reader import iter_file_records, record_title
+from src.scanner import RecordScanner
+
+
+def test_index_save_load_and_append(tmp_path):
+    source = tmp_path / "My Clippings.txt"
+    index_file = tmp_path / "output" / ".index"
+    records = list(generate_clippings(books=4, clippings_per_book=25))
+    source.write_text("".join(records[:60]), encoding="utf-8")
+
+    index = ClippingIndex()
+    assert index.update(source) == 0
+    assert len(index) == 60
+    index.save(index_file)
+
+    with open(source, "a", encoding="utf-8") as f:
+        f.write("".join(records[60:]))
+    index = ClippingIndex.load(index_file)
+    assert len(index) == 60
+    assert index.update(source) == 60
+    assert len(index) == 100
+    index.save(index_file)
+
+    rebuilt = ClippingIndex()
+    rebuilt.update(source)
+    assert ClippingIndex.load(index_file).columns() == rebuilt.columns()
+    assert rebuilt.titles == index.titles
+
+
+def test_index_find(tmp_path):
+    source = tmp_path / "My Clippings.txt"
+    source.write_text(
+        "".join(generate_clippings(books=3, clippings_per_book=30)), encoding="utf-8"
+    )
+    clippings = [parse_clipping(record) for record in iter_file_records(source)]
+    titles = [record_title(record) for record in iter_file_records(source)]
+    index = ClippingIndex()
+    index.update(source)
+
+    with RecordScanner(source) as scanner:
+        book = index.book_id(titles[5])
+        found = [scanner.parse(record) for record in index.find(books=[book])]
+        assert [repr(clipping) for clipping in found] == [
+            repr(clipping)
+            for clipping, title in zip(clippings, titles)
+            if title == titles[5]
+        ]
+
+        since = clippings[40].created_at
+        until = clippings[70].created_at
+        found = index.find(kinds=[Highlight, Bookmark], since=since, until=until)
+        assert [repr(scanner.parse(record)) for record in found] == [
+            repr(clipping)
+            for clipping in clippings[40:70]
+            if not isinstance(clipping, Note)
+        ]
+    assert index.find(since=datetime(2100, 1, 1)) == []
+
+
+def test_index_skips_unfinished_record_and_rebuilds(tmp_path):
+    source = tmp_path / "My Clippings.txt"
+    records = list(generate_clippings(books=1, clippings_per_book=3))
+    source.write_text("".join(records) + records[0][:30], encoding="utf-8")
+    index = ClippingIndex()
+    index.update(source)
+    assert len(index) == 3
+
+    # a replaced file is indexed again
+    source.write_text(records[1], encoding="utf-8")
+    assert index.update(source) == 0
+    assert len(index) == 1
+
+    (tmp_path / "broken").write_bytes(b"KCINDEX1")
+    assert ClippingIndex.load(tmp_path / "broken") is None
+    assert ClippingIndex.load(tmp_path / "missing") is None
+
+
+def test_incremental_run_hashes_the_file_once(tmp_path, monkeypatch):
+    pytest.importorskip("loguru")
+    monkeypatch.chdir(tmp_path)
+    import parse_clippings
+    import src.checkpoint
+
+    records = list(generate_clippings(books=4, clippings_per_book=25, seed=8))
+    source = tmp_path / "My Clippings.txt"
+    source.write_text("".join(records[:60]), encoding="utf-8")
+    parse_clippings.main()
+
+    scans = []
+    scan_appended = src.checkpoint.scan_appended
+
+    def counted_scan(*args):
+        scans.append(args)
+        return scan_appended(*args)
+
+    monkeypatch.setattr("src.index.scan_appended", counted_scan)
+    monkeypatch.setattr(parse_clippings, "scan_appended", counted_scan)
+    with open(source, "a", encoding="utf-8") as f:
+        f.write("".join(records[60:]))
+    clippings_by_book, checkpoint = parse_clippings.parse_changed_books(source)
+    assert len(scans) == 1
+    new_books = {record_title(record) for record in records[60:]}
+    assert len(clippings_by_book) == len(new_books)
+    assert checkpoint.offset == source.stat().st_size
+
+
+def test_unchanged_file_is_not_scanned_again(tmp_path, monkeypatch):
+    pytest.importorskip("loguru")
+    monkeypatch.chdir(tmp_path)
+    import parse_clippings
+
+    records = list(generate_clippings(books=4, clippings_per_book=25, seed=8))
+    source = tmp_path / "My Clippings.txt"
+    source.write_text("".join(records), encoding="utf-8")
+    parse_clippings.main()
+
+    def no_scan(*args):
+        raise AssertionError("the file was scanned again")
+
+    monkeypatch.setattr(parse_clippings, "scan_appended", no_scan)
+    # also when the index is rebuilt and no longer ends at the checkpoint
+    for remove_index in [False, True]:
+        if remove_index:
+            parse_clippings.INDEX_FILE.unlink()
+        clippings_by_book, checkpoint = parse_clippings.parse_changed_books(source)
+        assert clippings_by_book == {}
+        assert checkpoint.offset == source.stat().st_size
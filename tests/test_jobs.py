@@ -0,0 +1,56 @@
+import shutil
+
+import pytest
+
+from benchmarks.generate import generate_clippings
+from src.clippings import parse_clipping
+from src.jobs import run_jobs
+
+
+def invert(number: int) -> float:
+    return 1 / number
+
+
+def test_run_jobs_in_order():
+    arguments = [(number,) for number in [1, 2, 4, 5, 8]]
+    expected = [(1 / number, None) for (number,) in arguments]
+    assert run_jobs(invert, arguments) == expected
+    assert run_jobs(invert, arguments, jobs=3) == expected
+
+
+def test_run_jobs_collects_errors():
+    for jobs in [1, 2]:
+        results = run_jobs(invert, [(1,), (0,), (2,)], jobs=jobs)
+        assert [result for result, _ in results] == [1.0, None, 0.5]
+        assert results[0][1] is None and results[2][1] is None
+        assert isinstance(results[1][1], ZeroDivisionError)
+
+
+@pytest.mark.parametrize("jobs, store", [(1, False), (2, False), (2, True)])
+def test_failed_books_are_rendered_on_the_next_run(tmp_path, monkeypatch, jobs, store):
+    pytest.importorskip("loguru")
+    monkeypatch.chdir(tmp_path)
+    import parse_clippings
+
+    records = list(generate_clippings(books=3, clippings_per_book=20, seed=6))
+    (tmp_path / "My Clippings.txt").write_text("".join(records), encoding="utf-8")
+    store_path = tmp_path / "clippings.db" if store else None
+    parse_clippings.main(jobs, store_path)
+    rendered = {path.name: path.read_bytes() for path in tmp_path.glob("output/*.md")}
+    shutil.rmtree(tmp_path / "output")
+    if store_path is not None:
+        store_path.unlink()
+
+    # a directory in place of the file makes the book fail, also in a worker process
+    failing = parse_clippings.book_file_path(parse_clipping(records[0]).book_title)
+    failing.mkdir(parents=True)
+    parse_clippings.main(jobs, store_path)
+    assert sum(path.is_file() for path in tmp_path.glob("output/*.md")) == (
+        len(rendered) - 1
+    )
+
+    failing.rmdir()
+    parse_clippings.main(jobs, store_path)
+    assert {
+        path.name: path.read_bytes() for path in tmp_path.glob("output/*.md")
+    } == rendered
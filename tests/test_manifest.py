@@ -0,0 +1,71 @@
+import pytest
+
+from benchmarks.generate import generate_clippings
+from src.manifest import Manifest, digest_clippings, digest_text
+
+
+def test_digest_clippings(make_highlight):
+    digest = digest_clippings([make_highlight(text="Leave her better.")], format="md")
+    highlight = make_highlight(text="Leave her better.")
+    assert digest == digest_clippings([highlight], format="md")
+    assert digest != digest_clippings([make_highlight(text="Leave her.")], format="md")
+    assert digest != digest_clippings([highlight], format="pdf")
+
+
+def test_digest_text():
+    assert digest_text("text", format="pdf") != digest_text("text", format="docx")
+
+
+def test_manifest(tmp_path):
+    manifest_file = tmp_path / ".manifest.json"
+    output_file = tmp_path / "The Game.md"
+    manifest = Manifest.load(manifest_file)
+    assert not manifest.is_current(output_file, "abc")
+
+    manifest.update(output_file, "abc")
+    manifest.save(manifest_file)
+    manifest = Manifest.load(manifest_file)
+    # the output file has to exist as well
+    assert not manifest.is_current(output_file, "abc")
+    output_file.write_text("---")
+    assert manifest.is_current(output_file, "abc")
+    assert not manifest.is_current(output_file, "def")
+
+
+def test_manifest_records_empty_books(tmp_path):
+    manifest_file = tmp_path / ".manifest.json"
+    output_file = tmp_path / "The Game.md"
+    manifest = Manifest()
+    manifest.update(output_file, "abc", empty=True)
+    manifest.save(manifest_file)
+    manifest = Manifest.load(manifest_file)
+    # an empty book is current as long as it has no file
+    assert manifest.is_current(output_file, "abc")
+    assert not manifest.is_current(output_file, "def")
+    output_file.write_text("---")
+    assert not manifest.is_current(output_file, "abc")
+
+
+def test_empty_books_are_not_rendered_again(tmp_path, monkeypatch):
+    pytest.importorskip("loguru")
+    monkeypatch.chdir(tmp_path)
+    import parse_clippings
+
+    # highlights without notes give no file
+    records = generate_clippings(books=2, clippings_per_book=10, notes=0, seed=3)
+    (tmp_path / "My Clippings.txt").write_text("".join(records), encoding="utf-8")
+    parse_clippings.main()
+    assert not list(tmp_path.glob("output/*.md"))
+
+    rendered = []
+    save_book = parse_clippings.save_book_clippings_to_file
+
+    def count_renders(clippings, collapse_duplicates=True):
+        rendered.append(clippings[0].book_title)
+        return save_book(clippings, collapse_duplicates)
+
+    monkeypatch.setattr(parse_clippings, "save_book_clippings_to_file", count_renders)
+    # without a checkpoint all books are parsed again, the manifest skips them
+    parse_clippings.CHECKPOINT_FILE.unlink()
+    parse_clippings.main()
+    assert rendered == []
@@ -0,0 +1,32 @@
+import pytest
+
+from benchmarks.generate import generate_clippings
+from src.clippings import group_clippings_by_book, parse_clipping
+
+
+def test_markdown_matches_mdutils(tmp_path, monkeypatch):
+    for module in ["loguru", "mdutils"]:
+        pytest.importorskip(module)
+    monkeypatch.chdir(tmp_path)
+    import parse_clippings
+    from benchmarks.legacy_markdown import save_book_with_mdutils
+
+    clippings_by_book = group_clippings_by_book(
+        parse_clipping(record)
+        for record in generate_clippings(books=20, clippings_per_book=30, notes=0.4)
+    )
+    for name, save_book in [
+        ("single_write", parse_clippings.save_book_clippings_to_file),
+        ("mdutils", save_book_with_mdutils),
+    ]:
+        monkeypatch.setattr(parse_clippings, "OUTOUT_DIR", tmp_path / name)
+        (tmp_path / name).mkdir()
+        for book_clippings in clippings_by_book.values():
+            save_book(book_clippings)
+
+    files = sorted(path.name for path in (tmp_path / "mdutils").iterdir())
+    assert len(files) == 20
+    assert sorted(path.name for path in (tmp_path / "single_write").iterdir()) == files
+    for name in files:
+        expected = (tmp_path / "mdutils" / name).read_bytes()
+        assert (tmp_path / "single_write" / name).read_bytes() == expected
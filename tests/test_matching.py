@@ -0,0 +1,71 @@
+from datetime import datetime
+
+from src.clippings import Note
+from src.matching import match_notes_and_highlights
+
+
+def make_note(position: int) -> Note:
+    return Note(
+        book_title="The Game",
+        created_at=datetime(2023, 9, 25, 22, 42, 15),
+        text=f"note {position}",
+        position=position,
+        author="Neil Strauss",
+    )
+
+
+def test_match_on_end_position(make_highlight):
+    highlights = [make_highlight(2120, 2128), make_highlight(2260, 2268)]
+    notes = [make_note(2128), make_note(2268), make_note(2268), make_note(5000)]
+    matched, unmatched_notes, unmatched_highlights = match_notes_and_highlights(
+        notes, highlights
+    )
+    assert matched == [
+        (notes[0], highlights[0]),
+        (notes[1], highlights[1]),
+        (notes[2], highlights[1]),
+    ]
+    assert unmatched_notes == [notes[3]]
+    assert unmatched_highlights == set()
+
+
+def test_match_inside_highlight(make_highlight):
+    highlights = [make_highlight(100, 120), make_highlight(110, 115)]
+    notes = [make_note(112), make_note(118)]
+    matched, unmatched_notes, _ = match_notes_and_highlights(notes, highlights)
+    assert matched == [(notes[0], highlights[1]), (notes[1], highlights[0])]
+    assert unmatched_notes == []
+
+    matched, unmatched_notes, unmatched_highlights = match_notes_and_highlights(
+        notes, highlights, match_inside=False
+    )
+    assert matched == []
+    assert unmatched_notes == notes
+    assert unmatched_highlights == set(highlights)
+
+
+def test_match_with_tolerance(make_highlight):
+    highlights = [make_highlight(100, 120)]
+    notes = [make_note(122)]
+    matched, unmatched_notes, _ = match_notes_and_highlights(notes, highlights)
+    assert unmatched_notes == notes
+
+    matched, unmatched_notes, _ = match_notes_and_highlights(
+        notes, highlights, tolerance=2
+    )
+    assert matched == [(notes[0], highlights[0])]
+
+
+def test_match_inside_a_long_highlight(make_highlight):
+    # a highlight over the whole book does not hide the shorter ones inside it
+    highlights = [make_highlight(0, 100000)] + [
+        make_highlight(start, start + 10) for start in range(100, 100000, 100)
+    ]
+    notes = [make_note(205), make_note(250), make_note(99905)]
+    matched, unmatched_notes, _ = match_notes_and_highlights(notes, highlights)
+    assert [highlight.position for _, highlight in matched] == [
+        (200, 210),
+        (0, 100000),
+        (99900, 99910),
+    ]
+    assert unmatched_notes == []
@@ -0,0 +1,72 @@
+from benchmarks.generate import generate_clippings
+from src.archive import SnapshotArchive
+from src.cli import main
+from src.clippings import parse_clipping
+from src.merge import latest_snapshots, merge_sources
+from src.reader import iter_file_records
+from src.store import ClippingStore
+
+
+def write_devices(tmp_path):
+    first = list(generate_clippings(books=3, clippings_per_book=20, seed=1))
+    second = list(generate_clippings(books=2, clippings_per_book=20, seed=2))
+    paths = {
+        "a_old": first[:25],
+        "a_new": first,
+        "b_old": second[:10],
+        "b_new": second + first[:5],
+    }
+    for name, records in paths.items():
+        (tmp_path / f"{name}.txt").write_text("".join(records), encoding="utf-8")
+    return [tmp_path / f"{name}.txt" for name in paths], first, second
+
+
+def test_latest_snapshots(tmp_path):
+    paths, _, _ = write_devices(tmp_path)
+    assert latest_snapshots(paths) == [paths[1], paths[3]]
+
+
+def test_merge_sources(tmp_path):
+    paths, first, second = write_devices(tmp_path)
+    merged = list(merge_sources(paths))
+
+    expected = {repr(parse_clipping(record)) for record in first + second}
+    assert len(merged) == len(expected) == 100
+    assert {repr(clipping) for clipping, _ in merged} == expected
+    created_at = [clipping.created_at for clipping, _ in merged]
+    assert created_at == sorted(created_at)
+    assert all(
+        repr(parse_clipping(text)) == repr(clipping) for clipping, text in merged
+    )
+
+
+def test_merge_command(tmp_path, capsys):
+    paths, _, _ = write_devices(tmp_path)
+    output = tmp_path / "My Clippings.txt"
+    main(["merge", *map(str, paths), "-output", str(output)])
+    assert len(list(iter_file_records(output))) == 100
+
+    main(["merge", *map(str, paths), "-store", str(tmp_path / "clippings.db")])
+    with ClippingStore(tmp_path / "clippings.db") as store:
+        assert len(store.clippings()) == 100
+
+
+def test_merge_command_reads_the_archive(tmp_path):
+    paths, _, _ = write_devices(tmp_path)
+    archive = SnapshotArchive(tmp_path / ".sync")
+    for path in paths[:3]:
+        archive.add(path, name=path.name)
+    assert archive.heads() == [1, 2]
+
+    output = tmp_path / "My Clippings.txt"
+    main(
+        [
+            "merge",
+            str(paths[3]),
+            "-archive",
+            str(archive.directory),
+            "-output",
+            str(output),
+        ]
+    )
+    assert len(list(iter_file_records(output))) == 100
@@ -0,0 +1,89 @@
+import stat
+
+from src.cli import main as cli_main
+from src.obsidian import default_mode, export_notes
+
+
+def write_notes(directory, count):
+    directory.mkdir(exist_ok=True)
+    paths = []
+    for i in range(count):
+        path = directory / f"Book {i}.md"
+        path.write_text(f"---\nauthor: Author {i}\n---\n\n*highlight {i}*\n")
+        paths.append(path)
+    return paths
+
+
+def test_export_notes_only_writes_changed_notes(tmp_path):
+    notes = write_notes(tmp_path / "output", 20)
+    vault = tmp_path / "vault"
+
+    report = export_notes(notes, vault, folder="Books", workers=4)
+    assert (report.written, report.unchanged, report.failed) == (20, 0, [])
+    for note in notes:
+        assert (vault / "Books" / note.name).read_bytes() == note.read_bytes()
+
+    notes[3].write_text("changed", encoding="utf-8")
+    mtimes = {
+        path.name: path.stat().st_mtime_ns for path in (vault / "Books").iterdir()
+    }
+    report = export_notes(notes, vault, folder="Books", workers=4)
+    assert (report.written, report.unchanged) == (1, 19)
+    assert report.bytes_written == len("changed")
+    assert (vault / "Books" / notes[3].name).read_text() == "changed"
+    for path in (vault / "Books").iterdir():
+        if path.name != notes[3].name:
+            assert path.stat().st_mtime_ns == mtimes[path.name]
+    # no temporary files are left in the vault
+    assert sorted(path.name for path in (vault / "Books").iterdir()) == sorted(
+        note.name for note in notes
+    )
+
+
+def test_export_notes_continues_after_a_failure(tmp_path):
+    notes = write_notes(tmp_path / "output", 3)
+    missing = tmp_path / "output" / "Missing.md"
+
+    report = export_notes([notes[0], missing, *notes[1:]], tmp_path / "vault")
+    assert report.written == 3
+    assert [source for source, _ in report.failed] == [missing]
+    assert isinstance(report.failed[0][1], FileNotFoundError)
+    assert "3 written" in report.summary()
+
+
+def test_export_notes_with_the_same_name(tmp_path):
+    first = write_notes(tmp_path / "first", 3)
+    second = write_notes(tmp_path / "second", 3)
+    for note in second:
+        note.write_text("newer", encoding="utf-8")
+    vault = tmp_path / "vault"
+
+    report = export_notes(first + second, vault, workers=4)
+    assert (report.written, report.unchanged, report.failed) == (3, 0, [])
+    assert sorted(path.name for path in vault.iterdir()) == [
+        note.name for note in second
+    ]
+    assert all((vault / note.name).read_text() == "newer" for note in second)
+
+
+def test_obsidian_command_exports_output(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    notes = write_notes(tmp_path / "output", 2)
+
+    cli_main(["obsidian", "-vault", str(tmp_path / "vault")])
+    assert sorted(path.name for path in (tmp_path / "vault").iterdir()) == [
+        note.name for note in notes
+    ]
+    assert "2 written" in capsys.readouterr().out
+
+
+def test_export_notes_keeps_the_file_modes(tmp_path):
+    notes = write_notes(tmp_path / "output", 2)
+    vault = tmp_path / "vault"
+    export_notes(notes, vault)
+    assert stat.S_IMODE((vault / notes[0].name).stat().st_mode) == default_mode()
+
+    (vault / notes[1].name).chmod(0o640)
+    notes[1].write_text("changed", encoding="utf-8")
+    export_notes(notes, vault)
+    assert stat.S_IMODE((vault / notes[1].name).stat().st_mode) == 0o640
@@ -0,0 +1,80 @@
+import re
+
+import pytest
+
+pytest.importorskip("fpdf")
+
+from src.pdf import FONT_FILE, StreamingPDF, font_subset, write_pdf  # noqa: E402
+
+BOOKS = [
+    (
+        f"Book {book}",
+        [
+            f"Highlight {i} of book {book}, with some umlauts: äöü ß and – dashes"
+            for i in range(80)
+        ],
+    )
+    for book in range(3)
+]
+
+
+def check_structure(data: bytes) -> int:
+    """
+    Checks that every object of the cross reference table is at its offset and
+    returns the number of objects.
+    """
+    assert data.startswith(b"%PDF-")
+    assert data.rstrip().endswith(b"%%EOF")
+    xref = int(re.search(rb"startxref\n(\d+)\n", data).group(1))
+    assert data[xref:].startswith(b"xref\n")
+    count = int(data[xref:].split(b"\n")[1].split()[1])
+    for number, line in enumerate(data[xref:].split(b"\n")[3 : 2 + count], start=1):
+        offset = int(line.split()[0])
+        assert data[offset:].startswith(f"{number} 0 obj\n".encode())
+    return count
+
+
+def test_write_pdf(tmp_path, monkeypatch):
+    # the font is found in any working directory and nothing is cached next to it
+    monkeypatch.chdir(tmp_path)
+    write_pdf(tmp_path / "book.pdf", BOOKS[:1])
+
+    data = (tmp_path / "book.pdf").read_bytes()
+    check_structure(data)
+    assert not (tmp_path / "book.pdf.tmp").exists()
+    assert not list(FONT_FILE.parent.glob("*.pkl"))
+    assert data.count(b"/Type /Page\n") >= 2
+    assert data.count(b"/Title ") == 1
+    assert b"/PageMode /UseOutlines" not in data
+
+
+def test_combined_pdf_outline(tmp_path):
+    write_pdf(tmp_path / "all.pdf", BOOKS)
+
+    data = (tmp_path / "all.pdf").read_bytes()
+    check_structure(data)
+    assert data.count(b"/Title ") == len(BOOKS)
+    assert b"/PageMode /UseOutlines" in data
+    kids = re.search(rb"/Kids \[([^\]]*)\]", data).group(1).split(b" 0 R")
+    pages = [int(kid) for kid in kids if kid.strip()]
+    destinations = [int(page) for page in re.findall(rb"/Dest \[(\d+) 0 R", data)]
+    assert destinations[0] == pages[0]
+    assert destinations == sorted(destinations)
+    assert set(destinations) <= set(pages)
+
+
+def test_font_subset_is_shared(tmp_path):
+    font_subset.cache_clear()
+    for number, book in enumerate(BOOKS):
+        write_pdf(tmp_path / f"{number}.pdf", [book])
+    assert font_subset.cache_info().misses == 1
+    assert font_subset.cache_info().hits == len(BOOKS) - 1
+
+
+def test_output_in_memory():
+    pdf_file = StreamingPDF()
+    pdf_file.add_page()
+    pdf_file.add_font("lisboa", "", str(FONT_FILE), uni=True)
+    pdf_file.set_font("lisboa", "", 12)
+    pdf_file.multi_cell(0, 5, "Some text")
+    check_structure(pdf_file.output(dest="S").encode("latin1"))
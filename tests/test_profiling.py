@@ -0,0 +1,81 @@
+import json
+import pstats
+
+import pytest
+
+from benchmarks.generate import generate_clippings
+from src.profiling import NULL_PROFILER, active, profiling, run_profiled_jobs
+
+
+def count_letters(text):
+    active().count("letters", len(text))
+    with active().stage("upper"):
+        return text.upper()
+
+
+def test_profiling_is_off_by_default():
+    assert active() is NULL_PROFILER
+    records = iter([1, 2])
+    assert active().timed("read", records) is records
+    assert active().timed_function("parse", count_letters) is count_letters
+
+
+def test_profiler_stages_and_timed():
+    with profiling() as profiler:
+        assert active() is profiler
+        with profiler.stage("read"):
+            pass
+        parse = profiler.timed_function("parse", str.upper)
+        assert [parse(item) for item in profiler.timed("read", "ab")] == ["A", "B"]
+        profiler.count("records", 2)
+    assert active() is NULL_PROFILER
+
+    report = profiler.report()
+    assert report["stages"]["read"]["calls"] == 3
+    assert report["stages"]["parse"]["calls"] == 2
+    assert report["counters"] == {"records": 2}
+    json.dumps(report)
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_run_profiled_jobs_merges_the_jobs(jobs):
+    with profiling() as profiler:
+        results = run_profiled_jobs(
+            count_letters, [("ab",), ("cde",), (None,)], jobs, ["x", "y", "z"]
+        )
+    assert [result for result, _ in results] == ["AB", "CDE", None]
+    assert isinstance(results[2][1], TypeError)
+
+    report = profiler.report()
+    assert report["counters"] == {"letters": 5}
+    assert report["stages"]["render"]["calls"] == 2
+    assert report["stages"]["upper"]["calls"] == 2
+    assert sorted(book["name"] for book in report["books"]) == ["x", "y"]
+
+
+def test_parse_command_profile(tmp_path, monkeypatch, capsys):
+    pytest.importorskip("loguru")
+    monkeypatch.chdir(tmp_path)
+    from src.cli import main as cli_main
+
+    records = list(generate_clippings(books=3, clippings_per_book=10, seed=5))
+    source = tmp_path / "My Clippings.txt"
+    source.write_text("".join(records), encoding="utf-8")
+
+    cli_main(["parse", "-profile", "report.json", "-profile_stats", "parse.pstats"])
+    report = json.loads((tmp_path / "report.json").read_text(encoding="utf-8"))
+    for stage in ["index", "read", "parse", "digest", "render", "match"]:
+        assert report["stages"][stage]["seconds"] >= 0
+    assert report["stages"]["parse"]["calls"] == len(records)
+    assert report["counters"]["records_parsed"] == len(records)
+    assert report["counters"]["bytes_read"] == source.stat().st_size
+    assert report["counters"]["manifest_misses"] == len(report["books"]) > 0
+    assert report["rates"]["records_per_second"] > 0
+    assert pstats.Stats(str(tmp_path / "parse.pstats")).total_calls > 0
+
+    # without a file the report is printed, the second run finds nothing new
+    capsys.readouterr()
+    cli_main(["parse", "-profile"])
+    report = json.loads(capsys.readouterr().out)
+    assert report["counters"]["checkpoint_hits"] == 1
+    assert report["counters"]["records_parsed"] == 0
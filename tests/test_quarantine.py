@@ -0,0 +1,123 @@
+import json
+
+import pytest
+
+from benchmarks.generate import generate_clippings
+from src.clippings import parse_clipping
+from src.quarantine import Quarantine, parse_records
+from src.scanner import RecordScanner
+
+
+def write_clippings(path, records):
+    path.write_text("".join(records), encoding="utf-8")
+    return path
+
+
+def break_record(record):
+    # a clipping type the parser does not know
+    return record.replace("Deine Markierung", "Your Clip")
+
+
+def fix_record(text):
+    return parse_clipping(text.replace("Your Clip", "Deine Markierung"))
+
+
+def highlights(**kwargs):
+    return [
+        record
+        for record in generate_clippings(**kwargs)
+        if "Deine Markierung" in record
+    ]
+
+
+def test_parse_records_quarantines_bad_records(tmp_path):
+    records = highlights(books=2, clippings_per_book=10, seed=1)
+    records[3] = break_record(records[3])
+    records[5] = records[5].replace("März", "Brumaire")
+    path = write_clippings(tmp_path / "My Clippings.txt", records)
+
+    with RecordScanner(path) as scanner:
+        with pytest.raises(ValueError):
+            parse_records(scanner, scanner.records())
+
+        quarantine = Quarantine()
+        clippings = parse_records(scanner, scanner.records(), quarantine)
+    assert len(clippings) == len(records) - 2
+    assert quarantine.error_counts() == {"ValueError": 2}
+
+    data = path.read_bytes()
+    for index in [3, 5]:
+        offset = len("".join(records[:index]).encode("utf-8"))
+        quarantined = quarantine.records[offset]
+        assert data[offset : offset + quarantined.length].decode("utf-8") == (
+            quarantined.text
+        )
+        assert records[index].startswith(quarantined.text)
+
+
+def test_quarantine_save_load_and_reparse(tmp_path, monkeypatch):
+    records = highlights(books=1, clippings_per_book=6, seed=2)
+    records[1] = break_record(records[1])
+    path = write_clippings(tmp_path / "My Clippings.txt", records)
+    with RecordScanner(path) as scanner:
+        quarantine = Quarantine()
+        parse_records(scanner, scanner.records(), quarantine)
+
+    quarantine.save(tmp_path / "quarantine.jsonl")
+    loaded = Quarantine.load(tmp_path / "quarantine.jsonl")
+    assert len(loaded) == 1
+    [record] = loaded.records.values()
+    assert record.text == quarantine.records[record.offset].text
+    assert record.error.startswith("ValueError: ")
+
+    assert loaded.reparse() == []
+    monkeypatch.setattr("src.quarantine.parse_clipping", fix_record)
+    [(recovered, clipping)] = loaded.reparse()
+    assert recovered.offset == record.offset
+    assert clipping.text in records[1]
+    assert len(loaded) == 0
+
+
+def test_tolerant_profile_report_is_valid_json(tmp_path, monkeypatch, capsys):
+    pytest.importorskip("loguru")
+    monkeypatch.chdir(tmp_path)
+    from src.cli import main as cli_main
+
+    records = list(generate_clippings(books=2, clippings_per_book=10, seed=4))
+    records[3] = break_record(records[3]).replace("Deine Notiz", "Your Clip")
+    write_clippings(tmp_path / "My Clippings.txt", records)
+
+    cli_main(["parse", "-tolerant", "-profile"])
+    report = json.loads(capsys.readouterr().out)
+    assert report["counters"]["records_quarantined"] == 1
+
+
+def test_tolerant_parse_and_reparse_quarantine(tmp_path, monkeypatch):
+    pytest.importorskip("loguru")
+    monkeypatch.chdir(tmp_path)
+    import parse_clippings
+
+    records = list(generate_clippings(books=3, clippings_per_book=20, seed=4))
+    broken = [i for i, record in enumerate(records) if "Deine Markierung" in record][5]
+    broken_text = records[broken].split("\n")[3]
+    records[broken] = break_record(records[broken])
+    write_clippings(tmp_path / "My Clippings.txt", records)
+
+    with pytest.raises(ValueError):
+        parse_clippings.main()
+    parse_clippings.main(tolerant=True)
+    quarantine = Quarantine.load(parse_clippings.QUARANTINE_FILE)
+    assert len(quarantine) == 1
+    book_files = list((tmp_path / "output").glob("*.md"))
+    assert len(book_files) == 3
+    assert not any(broken_text in path.read_text("utf-8") for path in book_files)
+
+    # nothing changed, the quarantined record stays in the quarantine
+    parse_clippings.main(tolerant=True)
+    assert len(Quarantine.load(parse_clippings.QUARANTINE_FILE)) == 1
+
+    assert parse_clippings.reparse_quarantine() == 0
+    monkeypatch.setattr("src.quarantine.parse_clipping", fix_record)
+    assert parse_clippings.reparse_quarantine() == 1
+    assert len(Quarantine.load(parse_clippings.QUARANTINE_FILE)) == 0
+    assert any(broken_text in path.read_text("utf-8") for path in book_files)
@@ -0,0 +1,28 @@
+import io
+
+from src.reader import iter_records
+
+example_file = """﻿The Game (Neil Strauss)
+- Deine Markierung bei Position 6470-6471 | Hinzugefügt am Montag, 25. September 2023 22:42:15
+
+The secret to making someone think they’re in love with you is to occupy their thoughts,
+==========
+﻿The Game (Neil Strauss)
+- Deine Markierung bei Position 6520-6520 | Hinzugefügt am Montag, 25. September 2023 22:48:35
+
+Leave her better than you found her.
+==========
+"""
+
+
+def test_records_match_split():
+    for separator in ["==========", "==========\n"]:
+        for chunk_size in [1, 3, 7, 10, 64, 1 << 16]:
+            records = list(
+                iter_records(io.StringIO(example_file), separator, chunk_size)
+            )
+            assert records == example_file.split(separator)
+
+
+def test_empty_file():
+    assert list(iter_records(io.StringIO(""))) == [""]
@@ -0,0 +1,50 @@
+from benchmarks.generate import write_clippings_file
+from src.clippings import Bookmark, Highlight, Note, parse_clipping
+from src.reader import iter_file_records, record_title
+from src.scanner import Record, RecordScanner
+
+
+def test_scanner_matches_iter_file_records(tmp_path):
+    path = tmp_path / "My Clippings.txt"
+    write_clippings_file(path, books=3, clippings_per_book=30, language="en")
+
+    for data in [path.read_bytes(), path.read_bytes().replace(b"\n", b"\r\n")]:
+        path.write_bytes(data)
+        records = list(iter_file_records(path))
+        with RecordScanner(path) as scanner:
+            scanned = list(scanner.records())
+            assert [scanner.text(record) for record in scanned] == records
+            assert [scanner.title(record) for record in scanned] == [
+                record_title(record) for record in records
+            ]
+            assert [record.kind for record in scanned] == [
+                type(parse_clipping(record)) for record in records
+            ]
+            # the offsets can be used to start in the middle of the file
+            assert list(scanner.records(scanned[10].offset)) == scanned[10:]
+            assert data[scanned[1].end :].startswith(b"==========")
+
+
+def test_scanner_filters_kinds(tmp_path):
+    path = tmp_path / "My Clippings.txt"
+    write_clippings_file(path, books=2, clippings_per_book=50)
+
+    with RecordScanner(path) as scanner:
+        kinds = [record.kind for record in scanner.records()]
+        notes = list(scanner.records(kinds=[Note]))
+        assert len(notes) == kinds.count(Note)
+        assert all(isinstance(scanner.parse(record), Note) for record in notes)
+        assert len(list(scanner.records(kinds=[Highlight, Bookmark]))) == len(
+            kinds
+        ) - len(notes)
+
+
+def test_scanner_empty_and_unknown(tmp_path):
+    path = tmp_path / "My Clippings.txt"
+    path.write_bytes(b"")
+    with RecordScanner(path) as scanner:
+        assert list(scanner.records()) == []
+
+    path.write_bytes(b"Book (Author)\n- Something else\n\ntext\n==========\n")
+    with RecordScanner(path) as scanner:
+        assert list(scanner.records()) == [Record(0, 37, None)]
@@ -0,0 +1,35 @@
+from benchmarks.generate import write_clippings_file
+from src.clippings import Clipping, parse_clipping
+from src.reader import iter_file_records
+from src.sharding import parse_file_parallel, shard_ranges
+
+
+def test_shard_ranges(tmp_path):
+    path = tmp_path / "My Clippings.txt"
+    write_clippings_file(path, books=3, clippings_per_book=20)
+    data = path.read_bytes()
+    ranges = shard_ranges(path, 7)
+    assert ranges[0][0] == 0
+    assert ranges[-1][1] == len(data)
+    for (_, end), (start, _) in zip(ranges, ranges[1:]):
+        assert end == start
+        assert data[:end].endswith(b"==========\n")
+
+    assert shard_ranges(tmp_path / "My Clippings.txt", 1) == [(0, len(data))]
+    (tmp_path / "empty.txt").write_bytes(b"")
+    assert shard_ranges(tmp_path / "empty.txt", 4) == []
+
+
+def test_parse_file_parallel_matches_serial(tmp_path):
+    path = tmp_path / "My Clippings.txt"
+    write_clippings_file(path, books=5, clippings_per_book=40, language="en")
+    # Kindle writes windows line breaks
+    path.write_bytes(path.read_bytes().replace(b"\n", b"\r\n"))
+
+    def rows(clippings: list[Clipping]):
+        return [(type(clipping), repr(clipping)) for clipping in clippings]
+
+    serial = [parse_clipping(record) for record in iter_file_records(path)]
+    assert len(serial) == 200
+    assert rows(parse_file_parallel(path, jobs=1)) == rows(serial)
+    assert rows(parse_file_parallel(path, jobs=3)) == rows(serial)
@@ -0,0 +1,50 @@
+import os
+import subprocess
+import sys
+
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+# the budgets leave room for slower machines, IMPORT_TIME_BUDGET_SCALE scales them
+BUDGET_SCALE = float(os.environ.get("IMPORT_TIME_BUDGET_SCALE", "1"))
+HEAVY_MODULES = ["fpdf", "docx", "loguru", "sqlite3", "concurrent.futures", "ctypes"]
+
+
+def import_times(module: str) -> dict[str, int]:
+    """
+    Returns the cumulative import time in microseconds of every module imported by
+    importing module in a new interpreter, from python -X importtime.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+@pytest.mark.parametrize(
+    "module, budget_ms, allowed",
+    [
+        ("src.cli", 100, []),
+        ("KindleClippings", 150, []),
+        # the markdown pipeline logs with loguru on every run, which imports asyncio
+        # and with it concurrent.futures
+        ("parse_clippings", 400, ["loguru", "concurrent.futures"]),
+    ],
+)
+def test_import_time(module, budget_ms, allowed):
+    times = import_times(module)
+    imported = [name for name in HEAVY_MODULES if name in times]
+    assert [name for name in imported if name not in allowed] == []
+    assert times[module] / 1000 < budget_ms * BUDGET_SCALE
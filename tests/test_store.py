@@ -0,0 +1,169 @@
+import shutil
+
+from datetime import datetime
+
+import pytest
+
+from benchmarks.generate import generate_clippings
+from src.cli import main
+from src.clippings import Bookmark, Highlight, Note, parse_clipping
+from src.store import ClippingStore
+
+example_file = """The Game (Neil Strauss)
+- Deine Markierung bei Position 6470-6471 | Hinzugefügt am Montag, 25. September 2023 22:42:15
+
+The secret to making someone think they’re in love with you is to occupy their thoughts,
+==========
+Die 24 Gesetze der Verführung (Robert Greene)
+- Deine Notiz auf Seite 139 | bei Position 2128 | Hinzugefügt am Donnerstag, 10. Oktober 2024 08:40:08
+
+Interessant, vielleicht immer mal wieder oasch sein
+==========
+The 80/20 Principle: The Secret to Achieving More with Less (Richard Koch)
+- Dein Lesezeichen bei Position 2993 | Hinzugefügt am Mittwoch, 11. Oktober 2023 08:02:00
+
+
+==========
+"""
+
+appended_record = """The Game (Neil Strauss)
+- Deine Markierung bei Position 6520-6520 | Hinzugefügt am Montag, 25. September 2023 22:48:35
+
+Leave her better than you found her.
+==========
+"""
+
+
+def test_ingest_file(tmp_path):
+    source_file = tmp_path / "My Clippings.txt"
+    source_file.write_text(example_file, encoding="utf-8")
+
+    with ClippingStore(tmp_path / "clippings.db") as store:
+        assert store.ingest_file(source_file) == {
+            ("The Game", "Neil Strauss"),
+            ("Die 24 Gesetze der Verführung", "Robert Greene"),
+            (
+                "The 80/20 Principle: The Secret to Achieving More with Less",
+                "Richard Koch",
+            ),
+        }
+        # nothing new
+        assert store.ingest_file(source_file) == set()
+
+    with open(source_file, "a", encoding="utf-8") as f:
+        f.write(appended_record)
+
+    with ClippingStore(tmp_path / "clippings.db") as store:
+        assert store.ingest_file(source_file) == {("The Game", "Neil Strauss")}
+        # a replaced file is parsed again, but the clippings are not duplicated
+        source_file.write_text(appended_record + example_file, encoding="utf-8")
+        assert store.ingest_file(source_file) == set()
+
+        highlights = store.clippings(book_title="The Game", author="Neil Strauss")
+        assert [highlight.position for highlight in highlights] == [
+            (6470, 6471),
+            (6520, 6520),
+        ]
+        assert all(isinstance(highlight, Highlight) for highlight in highlights)
+        assert highlights[1].text == "Leave her better than you found her."
+
+        [note] = store.clippings(kind=Note)
+        assert note.position == 2128
+        assert note.page == 139
+        assert note.created_at == datetime(2024, 10, 10, 8, 40, 8)
+
+        [bookmark] = store.clippings(kind=Bookmark)
+        assert bookmark.text is None
+
+        assert len(store.clippings(since=datetime(2024, 1, 1))) == 1
+        assert len(store.clippings(until=datetime(2024, 1, 1))) == 3
+        assert store.books(author="Neil Strauss") == [("The Game", "Neil Strauss", 2)]
+        assert [book[0] for book in store.books()] == [
+            "The Game",
+            "Die 24 Gesetze der Verführung",
+            "The 80/20 Principle: The Secret to Achieving More with Less",
+        ]
+
+
+def test_search(tmp_path):
+    source_file = tmp_path / "My Clippings.txt"
+    source_file.write_text(example_file, encoding="utf-8")
+
+    with ClippingStore(tmp_path / "clippings.db") as store:
+        store.ingest_file(source_file)
+        [(highlight, snippet)] = store.search("love")
+        assert highlight.book_title == "The Game"
+        assert "[love]" in snippet
+        assert store.search('"in love with you"')[0][0].text == highlight.text
+        assert store.search('"love in"') == []
+        # umlauts and case do not matter
+        assert store.search("INTERESSANT")[0][0].book_title == (
+            "Die 24 Gesetze der Verführung"
+        )
+        assert store.search("love", book_title="Die 24 Gesetze der Verführung") == []
+        # invalid FTS5 syntax is searched as plain words
+        assert store.search("they’re in-love")[0][0].text == highlight.text
+
+    # the index is updated with the new clippings
+    with open(source_file, "a", encoding="utf-8") as f:
+        f.write(appended_record)
+    with ClippingStore(tmp_path / "clippings.db") as store:
+        store.ingest_file(source_file)
+        assert [clipping.position for clipping, _ in store.search("better")] == [
+            (6520, 6520)
+        ]
+
+
+def test_search_limit_scan(make_highlight):
+    with ClippingStore() as store:
+        store.add(
+            make_highlight(position, position + 1, text=f"love {position}")
+            for position in range(10)
+        )
+        assert len(store.search("love")) == 10
+        found = store.search("love", limit_scan=3)
+        assert sorted(clipping.position for clipping, _ in found) == [
+            (7, 8),
+            (8, 9),
+            (9, 10),
+        ]
+        assert len(store.search("love 2", limit_scan=3)) == 1
+
+
+def test_search_command_shows_the_limit_scan(tmp_path, capsys):
+    source_file = tmp_path / "My Clippings.txt"
+    source_file.write_text(example_file, encoding="utf-8")
+    store = str(tmp_path / "clippings.db")
+
+    main(["search", "love", "-store", store, "-source", str(source_file)])
+    assert "Only the newest" not in capsys.readouterr().out
+    main(["search", "love", "-store", store, "-limit_scan", "5"])
+    assert "Only the newest 5 matches were ranked" in capsys.readouterr().out
+
+
+def test_books_that_failed_are_rendered_from_the_store(tmp_path, monkeypatch):
+    pytest.importorskip("loguru")
+    monkeypatch.chdir(tmp_path)
+    import parse_clippings
+
+    records = list(generate_clippings(books=3, clippings_per_book=20, seed=6))
+    (tmp_path / "My Clippings.txt").write_text("".join(records), encoding="utf-8")
+    store_path = tmp_path / "clippings.db"
+    parse_clippings.main(store_path=store_path)
+    rendered = {path.name: path.read_bytes() for path in tmp_path.glob("output/*.md")}
+    shutil.rmtree(tmp_path / "output")
+    store_path.unlink()
+
+    # a directory in place of the file makes the book fail to render
+    failing = parse_clippings.book_file_path(parse_clipping(records[0]).book_title)
+    failing.mkdir(parents=True)
+    parse_clippings.main(store_path=store_path)
+    assert len(list(tmp_path.glob("output/*.md"))) == len(rendered)
+    assert failing.is_dir()
+
+    failing.rmdir()
+    parse_clippings.main(store_path=store_path)
+    assert {
+        path.name: path.read_bytes() for path in tmp_path.glob("output/*.md")
+    } == rendered
+    assert not parse_clippings.FAILED_FILE.exists()
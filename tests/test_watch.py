@@ -0,0 +1,153 @@
+import sys
+import threading
+import time
+
+import pytest
+
+from benchmarks.generate import generate_clippings
+from src.watch import InotifyWatcher, PollingWatcher, open_watcher, watch
+
+inotify = pytest.mark.skipif(
+    not sys.platform.startswith("linux"), reason="inotify is only available on Linux"
+)
+
+
+def append(path, text):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(text)
+
+
+@pytest.mark.parametrize(
+    "watcher_class", [PollingWatcher, pytest.param(InotifyWatcher, marks=inotify)]
+)
+def test_watcher_notices_mount_and_append(tmp_path, watcher_class):
+    # the file is in a directory that does not exist yet, like on an unmounted Kindle
+    path = tmp_path / "Kindle" / "documents" / "My Clippings.txt"
+    with watcher_class(path, interval=0.01) as watcher:
+        assert not watcher.wait(0.05)
+
+        path.parent.mkdir(parents=True)
+        path.write_text("first", encoding="utf-8")
+        assert watcher.wait(1)
+        assert not watcher.wait(0.05)
+
+        append(path, " second")
+        assert watcher.wait(1)
+        assert watcher.signature[2] == len("first second")
+
+
+@inotify
+def test_inotify_wakes_up_before_the_interval(tmp_path):
+    path = tmp_path / "My Clippings.txt"
+    path.write_text("first", encoding="utf-8")
+    with InotifyWatcher(path, interval=10) as watcher:
+        timer = threading.Timer(0.05, append, (path, " second"))
+        timer.start()
+        start = time.monotonic()
+        assert watcher.wait(5)
+        assert time.monotonic() - start < 1
+        timer.join()
+
+
+def test_open_watcher_polling(tmp_path):
+    with open_watcher(tmp_path / "file", polling=True) as watcher:
+        assert type(watcher) is PollingWatcher
+
+
+def test_watch_debounces_bursts(tmp_path):
+    path = tmp_path / "My Clippings.txt"
+    path.write_text("", encoding="utf-8")
+    sizes = []
+    stop = threading.Event()
+
+    def callback(changed_path):
+        sizes.append(changed_path.stat().st_size)
+        if len(sizes) == 2:
+            stop.set()
+
+    def write_burst():
+        time.sleep(0.1)
+        for i in range(5):
+            append(path, f"record {i}\n")
+            time.sleep(0.01)
+
+    writer = threading.Thread(target=write_burst)
+    writer.start()
+    watch(path, callback, debounce=0.2, interval=0.01, stop=stop)
+    writer.join()
+    # once at the start and once for the whole burst
+    assert sizes == [0, len("record 0\n") * 5]
+
+
+def test_incremental_sync(tmp_path, monkeypatch):
+    pytest.importorskip("loguru")
+    monkeypatch.chdir(tmp_path)
+    import parse_clippings
+
+    records = list(generate_clippings(books=4, clippings_per_book=10, seed=3))
+    source = tmp_path / "My Clippings.txt"
+    source.write_text("".join(records[:30]), encoding="utf-8")
+
+    sync = parse_clippings.IncrementalSync(source)
+    assert sync.run() > 0
+    assert sync.run() == 0
+
+    append(source, "".join(records[30:]))
+    changed = sync.run()
+    assert 0 < changed <= 4
+    warm = {path.name: path.read_bytes() for path in (tmp_path / "output").glob("*.md")}
+
+    # a cold run over everything renders the same files
+    for path in (tmp_path / "output").iterdir():
+        path.unlink()
+    parse_clippings.main()
+    cold = {path.name: path.read_bytes() for path in (tmp_path / "output").glob("*.md")}
+    assert warm == cold
+
+
+def test_incremental_sync_retries_failures(tmp_path, monkeypatch):
+    pytest.importorskip("loguru")
+    monkeypatch.chdir(tmp_path)
+    import parse_clippings
+
+    records = list(generate_clippings(books=4, clippings_per_book=10, seed=3))
+    source = tmp_path / "My Clippings.txt"
+    source.write_text("".join(records[:30]), encoding="utf-8")
+    sync = parse_clippings.IncrementalSync(source)
+    sync.run()
+
+    save_book = parse_clippings.save_book_clippings_to_file
+    failing = set()
+
+    def save_or_fail(clippings, collapse_duplicates=True):
+        if clippings[0].book_title in failing:
+            raise OSError("disk full")
+        return save_book(clippings, collapse_duplicates)
+
+    monkeypatch.setattr(parse_clippings, "save_book_clippings_to_file", save_or_fail)
+    append(source, "".join(records[30:]))
+    failing.add(parse_clippings.parse_clipping(records[-1]).book_title)
+    sync.run()
+    assert sync.failed
+    failing.clear()
+    # the file did not change, the failed book is rendered anyway
+    assert sync.run() == 1
+    assert not sync.failed
+
+    # a run that raises is synced again by the next one
+    def raise_error(*args):
+        raise OSError("disk full")
+
+    append(source, records[0])
+    with monkeypatch.context() as patch:
+        patch.setattr(parse_clippings, "save_books", raise_error)
+        with pytest.raises(OSError):
+            sync.run()
+    assert sync.run() > 0
+    warm = {path.name: path.read_bytes() for path in (tmp_path / "output").glob("*.md")}
+
+    for path in (tmp_path / "output").iterdir():
+        path.unlink()
+    parse_clippings.main()
+    cold = {path.name: path.read_bytes() for path in (tmp_path / "output").glob("*.md")}
+    assert warm == cold
@@ -1,19 +1,28 @@
 #!/bin/bash
 
-VAULT="SyncedVault"
+# the directory of the vault, the notes are written into it directly
+VAULT="${OBSIDIAN_VAULT:-$HOME/Documents/SyncedVault}"
+PROJECT_DIR="$(cd "$(dirname "$0")" && pwd)"
 
 if [ $# -eq 0 ]; then
     echo "Usage: $0 <file.md> [file2.md ...]"
     exit 1
 fi
 
-for filepath in "$@"; do
-    if [ ! -f "$filepath" ]; then
-        echo "File not found: $filepath"
-        continue
-    fi
-
-    name="$(basename "$filepath" .md)"
-    echo "Sending '$name' to Obsidian..."
-    obsidian create name="$name" content="$(cat "$filepath")" vault="$VAULT"
+# the command runs in the project directory, so relative paths are made absolute
+absolute_path() {
+    case "$1" in
+        /*) echo "$1" ;;
+        *) echo "$PWD/$1" ;;
+    esac
+}
+FILES=()
+for file in "$@"; do
+    FILES+=("$(absolute_path "$file")")
 done
+VAULT="$(absolute_path "$VAULT")"
+
+# only the files that changed since the last export are written
+cd "$PROJECT_DIR" || exit 1
+unset VIRTUAL_ENV
+uv run python -m src.cli obsidian "${FILES[@]}" -vault "$VAULT"